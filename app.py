@@ -3,27 +3,36 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import json
+import logging
 from decimal import Decimal
 import os
 from werkzeug.utils import secure_filename
-from sqlalchemy import func, text
+from sqlalchemy import func, text, insert, select
+from sqlalchemy.dialects import mysql as mysql_dialect, sqlite as sqlite_dialect
+from sqlalchemy.exc import IntegrityError
 from utils import (
-    find_prev_balance,
-    calculate_profit_from_orders,
+    calculate_profit_from_orders_batch,
+    get_order_profits,
+    get_report_profits,
     calculate_report_profit,
     calculate_account_last_balance,
+    get_balance_timeline,
     group_reports_by_day_net_profit
 )
-import re
+import math
+import multiprocessing
+import base64
+import copy
+import uuid
+import hashlib
+import threading
+import click
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import wraps
 from config import config
-
-# Опциональный импорт pandas
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
-    pd = None
+from app_logging import get_logger, debug_sampled
+from parsers import parse_orders_file, parse_file_job, record_rejects
 
 app = Flask(__name__)
 
@@ -34,6 +43,13 @@ app.config.from_object(config[config_name])
 db = SQLAlchemy(app)
 CORS(app)
 
+# Логгеры подсистем (уровни - см. app_logging)
+app_log = get_logger('app')
+parse_log = get_logger('parse')
+orders_log = get_logger('orders')
+shift_log = get_logger('shift')
+stats_log = get_logger('stats')
+
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
@@ -65,820 +81,164 @@ def validate_admin_password(data):
     admin_password = os.environ.get('ADMIN_PASSWORD', 'Blalala2')
     return data['password'] == admin_password
 
-def convert_to_moscow_time(datetime_obj, platform):
+# --- КЭШ РЕЗУЛЬТАТОВ РАЗБОРА ---
+# Одна и та же выгрузка разбирается при проверке смены (/api/validate-shift),
+# при создании отчета и для каждого аккаунта площадки. Результат разбора
+# запоминается по хешу содержимого файла, площадке и окну смены, поэтому
+# каждый физический файл разбирается один раз. Размер кэша ограничен
+# числом записей и суммарным числом ордеров; вытесняются самые старые.
+
+PARSE_CACHE_MAX_ENTRIES = 32
+PARSE_CACHE_MAX_ORDERS = 200000
+
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+_parse_cache_stats = {'hits': 0, 'misses': 0, 'orders': 0}
+
+def file_content_hash(filepath, block_size=1024 * 1024):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _parse_cache_key(filepath, platform, start_date, end_date):
+    return (file_content_hash(filepath), platform.lower(), start_date, end_date)
+
+def _parse_cache_get(key):
+    with _parse_cache_lock:
+        cached = _parse_cache.get(key)
+        if cached is not None:
+            _parse_cache.move_to_end(key)
+            _parse_cache_stats['hits'] += 1
+        else:
+            _parse_cache_stats['misses'] += 1
+    return cached
+
+def _parse_cache_put(key, orders_data, info):
+    with _parse_cache_lock:
+        if key not in _parse_cache:
+            _parse_cache[key] = (orders_data, info)
+            _parse_cache_stats['orders'] += len(orders_data)
+        while _parse_cache and (len(_parse_cache) > PARSE_CACHE_MAX_ENTRIES
+                                or _parse_cache_stats['orders'] > PARSE_CACHE_MAX_ORDERS):
+            _, (evicted, _) = _parse_cache.popitem(last=False)
+            _parse_cache_stats['orders'] -= len(evicted)
+
+def parse_orders_file_cached(filepath, platform, start_date=None, end_date=None, original_filename=None, parse_info=None):
     """
-    Конвертирует время из часового пояса платформы в московское время
-    
-    Args:
-        datetime_obj: объект datetime
-        platform: название платформы ('bybit', 'htx', 'bliss')
-    
-    Returns:
-        datetime объект в московском времени
+    parse_orders_file с кэшем по содержимому файла.
+
+    Возвращает новый список ордеров (сами словари общие с кэшем и не должны изменяться).
+    В parse_info копируется диагностика исходного разбора и признак cache_hit.
     """
-    if not datetime_obj:
-        print(f"DEBUG TIMEZONE: Получен пустой datetime_obj для {platform}")
-        return datetime_obj
-    
-    # Определяем смещение для каждой платформы относительно Москвы
-    timezone_offsets = {
-        'bybit': 3,   # Bybit время в UTC+0, МСК это UTC+3 → добавляем 3 часа
-        'htx': -5,    # HTX время в UTC+8, МСК это UTC+3 → вычитаем 5 часов
-        'bliss': 3,   # Bliss время в UTC+0, МСК это UTC+3 → добавляем 3 часа
-        'gate': 0     # Gate.io: пока без смещения (можно настроить позже)
-    }
-    
-    offset_hours = timezone_offsets.get(platform.lower(), 0)
-    
-    # Применяем смещение
-    if offset_hours != 0:
-        print(f"DEBUG TIMEZONE: Конвертируем {datetime_obj} для {platform}")
-        print(f"DEBUG TIMEZONE: Смещение {offset_hours} часов")
-        datetime_obj = datetime_obj + timedelta(hours=offset_hours)
-        print(f"DEBUG TIMEZONE: Результат -> {datetime_obj}")
-    else:
-        print(f"DEBUG TIMEZONE: Нет смещения для платформы {platform}")
-    
-    return datetime_obj
+    if not os.path.exists(filepath):
+        return parse_orders_file(filepath, platform, start_date, end_date, original_filename, parse_info)
 
-def parse_orders_file(filepath, platform, start_date=None, end_date=None, original_filename=None):
-    """Парсит файл с ордерами в зависимости от платформы"""
-    try:
-        # Проверяем, что файл существует
-        if not os.path.exists(filepath):
-            print(f"Ошибка: файл {filepath} не существует")
-            return []
-        
-        # Определяем тип файла по расширению
-        ext = os.path.splitext(filepath)[1].lower()
-        
-        if platform.lower() == 'bliss':
-            try:
-                # Пробуем разные разделители
-                separators = [';', ',', '\t']
-                df = None
-                
-                print(f"\nBLISS DEBUG: Пытаемся прочитать файл {filepath}")
-                print(f"BLISS DEBUG: Размер файла: {os.path.getsize(filepath)} байт")
-                
-                # Читаем первые несколько строк файла для отладки
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    print("BLISS DEBUG: Первые строки файла:")
-                    for i, line in enumerate(f):
-                        if i < 5:  # Показываем первые 5 строк
-                            print(f"BLISS DEBUG: Строка {i+1}: {line.strip()}")
-                
-                for sep in separators:
-                    try:
-                        print(f"\nBLISS DEBUG: Пробуем разделитель '{sep}'")
-                        print(f"BLISS DEBUG: Путь к файлу: {filepath}")
-                        
-                        # Читаем первые несколько строк для отладки
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            print("BLISS DEBUG: Первые 3 строки файла:")
-                            for i, line in enumerate(f):
-                                if i < 3:
-                                    print(f"BLISS DEBUG: {line.strip()}")
-                        
-                        df = pd.read_csv(filepath, sep=sep, encoding='utf-8', quotechar='"', header=0)
-                        print(f"BLISS DEBUG: Успешно прочитали файл")
-                        print(f"BLISS DEBUG: Найдены колонки: {list(df.columns)}")
-                        print(f"BLISS DEBUG: Количество строк: {len(df)}")
-                        
-                        # Проверяем, что нашли нужные колонки
-                        required_columns = ['Creation date', 'Internal id', 'Organization user', 'Amount', 'Crypto amount', 'Status', 'Method']
-                        missing_columns = [col for col in required_columns if col not in df.columns]
-                        
-                        if missing_columns:
-                            print(f"BLISS DEBUG: Отсутствуют колонки: {missing_columns}")
-                            continue
-                        else:
-                            print(f"BLISS DEBUG: Успешно прочитали файл с разделителем '{sep}'")
-                            break
-                    except Exception as e:
-                        print(f"BLISS DEBUG: Не удалось прочитать файл с разделителем '{sep}': {str(e)}")
-                        continue
-                
-                if df is None:
-                    print("BLISS DEBUG: Не удалось прочитать файл ни с одним разделителем")
-                    return []
-                
-                orders_data = []
-                for _, row in df.iterrows():
-                    try:
-                        # Получаем необходимые поля
-                        order_id = str(row['Internal id']).strip()
-                        account_name = str(row['Organization user']).strip()
-                        amount = str(row['Amount']).strip().replace(' ', '').replace(',', '.')
-                        crypto_amount = str(row['Crypto amount']).strip().replace(' ', '').replace(',', '.')
-                        status = str(row['Status']).strip()
-                        method = str(row['Method']).strip()  # Добавляем поле Method
-                        
-                        print(f"\nBLISS DEBUG: Обрабатываем строку:")
-                        print(f"BLISS DEBUG: order_id = {order_id}")
-                        print(f"BLISS DEBUG: account_name = {account_name}")
-                        print(f"BLISS DEBUG: amount = {amount}")
-                        print(f"BLISS DEBUG: crypto_amount = {crypto_amount}")
-                        print(f"BLISS DEBUG: status = {status}")
-                        print(f"BLISS DEBUG: method = {method}")
-                        
-                        # Определяем сторону ордера на основе метода
-                        if method.lower() in ['sell', 'продажа', 'продать']:
-                            side = 'sell'
-                        else:
-                            side = 'buy'
-                        
-                        # Получаем время создания
-                        creation_date = str(row['Creation date']).strip()
-                        if creation_date:
-                            try:
-                                print(f"BLISS DEBUG: Исходная строка даты: '{creation_date}'")
-                                executed_at = datetime.strptime(creation_date, '%d.%m.%Y %H:%M:%S')
-                                print(f"BLISS DEBUG: Распарсенная дата: {executed_at}")
-                                
-                                # Конвертируем время в московское
-                                executed_at = convert_to_moscow_time(executed_at, platform)
-                                print(f"BLISS DEBUG: Дата в МСК: {executed_at}")
-                                
-                                # Фильтруем по времени, если указаны границы
-                                if start_date and executed_at < start_date:
-                                    print(f"BLISS DEBUG: Ордер {order_id} раньше начальной даты")
-                                    continue
-                                if end_date and executed_at > end_date:
-                                    print(f"BLISS DEBUG: Ордер {order_id} позже конечной даты")
-                                    continue
-                                
-                            except Exception as e:
-                                print(f"BLISS DEBUG: Ошибка обработки даты: '{creation_date}', ошибка: {str(e)}")
-                                executed_at = datetime.now()
-                        else:
-                            print(f"BLISS DEBUG: Пустая дата в строке")
-                            executed_at = datetime.now()
-                        
-                        # Конвертируем числовые значения
-                        try:
-                            total_usdt = float(amount)
-                            quantity = float(crypto_amount)
-                            print(f"BLISS DEBUG: total_usdt = {total_usdt}, quantity = {quantity}")
-                        except:
-                            print(f"BLISS DEBUG: Ошибка конвертации чисел: amount={amount}, crypto_amount={crypto_amount}")
-                            continue
-                        
-                        # Проверяем обязательные поля
-                        if not order_id:
-                            print(f"BLISS DEBUG: Пропускаем строку - не найден ID ордера")
-                            continue
-                        
-                        if not account_name:
-                            print(f"BLISS DEBUG: Пропускаем строку - не найдено имя аккаунта")
-                            continue
-                        
-                        # Вычисляем цену
-                        price = total_usdt / quantity if quantity > 0 else 0
-                        print(f"BLISS DEBUG: Вычисленная цена: {price}")
-                        
-                        # Определяем статус
-                        if status.lower() in ['success', 'completed', 'done']:
-                            order_status = 'filled'
-                        elif status.lower() in ['cancelled', 'canceled']:
-                            order_status = 'canceled'
-                        elif status.lower() in ['expired']:
-                            order_status = 'expired'
-                        elif status.lower() in ['failed']:
-                            order_status = 'failed'
-                        else:
-                            order_status = 'pending'
-                        
-                        order_data = {
-                            'order_id': order_id,
-                            'symbol': 'USDT',
-                            'side': side,
-                            'quantity': quantity,
-                            'price': price,
-                            'total_usdt': total_usdt,
-                            'fees_usdt': 0,
-                            'status': order_status,
-                            'executed_at': executed_at
-                        }
-                        
-                        print(f"BLISS DEBUG: Создан order_data:")
-                        for key, value in order_data.items():
-                            print(f"BLISS DEBUG: {key} = {value}")
-                        
-                        orders_data.append(order_data)
-                        print(f"BLISS DEBUG: Ордер {order_id} добавлен в список")
-                        
-                    except Exception as e:
-                        print(f"BLISS DEBUG: Ошибка парсинга строки: {str(e)}")
-                        continue
-                
-                print(f"BLISS DEBUG: Всего обработано {len(orders_data)} ордеров")
-                return orders_data
-                
-            except Exception as e:
-                print(f"BLISS: Ошибка чтения файла: {str(e)}")
-                return []
-                
-        elif ext in ['.csv']:
-            df = pd.read_csv(filepath)
-        elif ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(filepath)
-        else:
-            raise Exception(f"Неподдерживаемый формат файла: {ext}")
-        
-        orders_data = []
-        
-        if platform.lower() == 'bybit':
-            # Парсинг файла Bybit
-            for _, row in df.iterrows():
-                try:
-                    # Извлекаем данные из строки
-                    order_data = parse_bybit_order(row)
-                    if order_data:
-                        # Конвертируем время в московское
-                        order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], 'bybit')
-                        
-                        # Фильтруем по времени, если указаны границы
-                        if start_date or end_date:
-                            order_time = order_data['executed_at']
-                            
-                            # Проверяем начальную дату
-                            if start_date and order_time < start_date:
-                                continue
-                            
-                            # Проверяем конечную дату
-                            if end_date and order_time > end_date:
-                                continue
-                        
-                        orders_data.append(order_data)
-                except Exception as e:
-                    print(f"Ошибка парсинга ордера Bybit: {str(e)}")
-                    continue
-        elif platform.lower() == 'bybit_btc':
-            # Парсинг BTC файла Bybit (CSV с данными в первом столбце)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                
-                # Пропускаем заголовок
-                for line in lines[1:]:
-                    try:
-                        # Парсим строку BTC файла
-                        order_data = parse_bybit_btc_csv_line(line)
-                        if order_data:
-                            # Конвертируем время в московское (+3 часа)
-                            order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], 'bybit')
-                            
-                            # Фильтруем по времени, если указаны границы
-                            if start_date or end_date:
-                                order_time = order_data['executed_at']
-                                
-                                # Проверяем начальную дату
-                                if start_date and order_time < start_date:
-                                    continue
-                                
-                                # Проверяем конечную дату
-                                if end_date and order_time > end_date:
-                                    continue
-                            
-                            orders_data.append(order_data)
-                    except Exception as e:
-                        print(f"Ошибка парсинга BTC строки: {str(e)}")
-                        continue
-                        
-            except Exception as e:
-                print(f"Ошибка чтения BTC файла: {str(e)}")
-                return []
-                
-        elif platform.lower() == 'htx':
-            # Парсинг файла HTX
-            for _, row in df.iterrows():
-                try:
-                    # Извлекаем данные из строки
-                    order_data = parse_htx_order(row)
-                    if order_data:
-                        # Конвертируем время в московское
-                        order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], platform)
-                        
-                        # Фильтруем по времени, если указаны границы
-                        if start_date or end_date:
-                            order_time = order_data['executed_at']
-                            
-                            # Проверяем начальную дату
-                            if start_date and order_time < start_date:
-                                continue
-                            
-                            # Проверяем конечную дату
-                            if end_date and order_time > end_date:
-                                continue
-                        
-                        orders_data.append(order_data)
-                except Exception as e:
-                    print(f"Ошибка парсинга ордера HTX: {str(e)}")
-                    continue
-                
-        elif platform.lower() == 'gate':
-            # Парсинг файла Gate
-            for _, row in df.iterrows():
-                try:
-                    # Извлекаем данные из строки
-                    order_data = parse_gate_order(row)
-                    if order_data:
-                        # Конвертируем время в московское
-                        order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], platform)
-                        
-                        # Фильтруем по времени, если указаны границы
-                        if start_date or end_date:
-                            order_time = order_data['executed_at']
-                            
-                            # Проверяем начальную дату
-                            if start_date and order_time < start_date:
-                                continue
-                            
-                            # Проверяем конечную дату
-                            if end_date and order_time > end_date:
-                                continue
-                        
-                        orders_data.append(order_data)
-                except Exception as e:
-                    print(f"Ошибка парсинга ордера Gate: {str(e)}")
-                    continue
-        
-        return orders_data
-        
-    except Exception as e:
-        print(f"Ошибка парсинга файла: {str(e)}")
-        return []
+    key = _parse_cache_key(filepath, platform, start_date, end_date)
+    cached = _parse_cache_get(key)
+    if cached is not None:
+        orders_data, info = cached
+        parse_log.debug("Результат разбора %s взят из кэша (%s ордеров)", platform, len(orders_data))
+    else:
+        info = {}
+        orders_data = parse_orders_file(filepath, platform, start_date, end_date, original_filename, info)
+        _parse_cache_put(key, orders_data, info)
 
-def parse_bybit_btc_csv_line(line):
-    """Парсит строку из BTC CSV файла Bybit (разделяет по запятой, все строки попадают в таблицу, пустые поля заменяются на числовые значения или None)"""
-    try:
-        # Разделяем строку по запятой
-        parts = line.strip().split(',')
-        # Гарантируем, что parts всегда длины 14
-        while len(parts) < 14:
-            parts.append('')
-        
-        currency = parts[0].strip() if parts[0].strip() else ''
-        contract = parts[1].strip() if parts[1].strip() else ''
-        transaction_type = parts[2].strip() if parts[2].strip() else ''
-        direction = parts[3].strip() if parts[3].strip() else ''
-        quantity = parts[4].strip() if parts[4].strip() else ''
-        position = parts[5].strip() if parts[5].strip() else ''
-        filled_price = parts[6].strip() if parts[6].strip() else ''
-        funding = parts[7].strip() if parts[7].strip() else ''
-        fee_paid = parts[8].strip() if parts[8].strip() else ''
-        cash_flow = parts[9].strip() if parts[9].strip() else ''
-        change = parts[10].strip() if parts[10].strip() else ''
-        wallet_balance = parts[11].strip() if parts[11].strip() else ''
-        action = parts[12].strip() if parts[12].strip() else ''
-        time_str = parts[13].strip() if parts[13].strip() else ''
-
-        # Символ (Contract - Пара)
-        symbol = contract if contract else (currency if currency else 'USDT')
-        # Сторона
-        side = direction if direction else '--'
-        # Количество (USDT) - числовое значение или 0
-        try:
-            quantity_val = float(quantity) if quantity and quantity not in ('', None) else 0.0
-        except Exception:
-            quantity_val = 0.0
-        # Цена - числовое значение или 0
-        try:
-            price_val = float(filled_price) if filled_price and filled_price not in ('', None) else 0.0
-        except Exception:
-            price_val = 0.0
-        # Дата
-        if not time_str or time_str == '':
-            executed_at = datetime.now()
-        else:
-            try:
-                executed_at = datetime.strptime(time_str, '%d.%m.%Y %H:%M')
-            except Exception:
-                try:
-                    executed_at = datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S')
-                except Exception:
-                    executed_at = datetime.now()
-        # order_id основан на содержимом строки для предотвращения дубликатов
-        # Используем более стабильный хеш от ключевых полей
-        import hashlib
-        key_fields = f"{currency}_{contract}_{direction}_{quantity}_{filled_price}_{time_str}"
-        # Создаем MD5 хеш для стабильности
-        hash_object = hashlib.md5(key_fields.encode('utf-8'))
-        order_id = f"btc_{hash_object.hexdigest()[:16]}"
-        return {
-            'order_id': order_id,
-            'symbol': symbol,
-            'side': side,
-            'quantity': quantity_val,
-            'price': price_val,
-            'total_usdt': 0.0,  # Для BTC ордеров всегда 0
-            'fees_usdt': 0.0,   # Для BTC ордеров всегда 0
-            'status': 'Завершен',
-            'executed_at': executed_at
-        }
-    except Exception as e:
-        print(f"Ошибка парсинга BTC строки: {e}")
-        return None
+    if parse_info is not None:
+        parse_info.update(copy.deepcopy(info))
+        parse_info['cache_hit'] = cached is not None
+    return list(orders_data)
 
-def parse_bybit_order(row):
-    """Парсит строку ордера Bybit"""
-    try:
-        # Ищем нужные столбцы в строке
-        order_id = None
-        symbol = None
-        side = None
-        coin_amount = None  # Объем (USDT) - из Coin Amount
-        price = None        # Цена - из Price
-        fiat_amount = None  # Объем (RUB) - из Fiat Amount
-        status = 'filled'   # Статус по умолчанию
-        executed_at = None
-        
-        # Проверяем разные варианты названий столбцов
-        for col in row.index:
-            col_lower = str(col).lower().strip()
-            col_value = str(row[col]).strip()
-            
-            # Order ID - различные варианты
-            if any(x in col_lower for x in ['order no', 'order id', 'orderid', 'order_id', 'номер']):
-                order_id = col_value
-            
-            # Symbol/Pair - торговая пара (из Cryptocurrency)
-            elif any(x in col_lower for x in ['cryptocurrency', 'symbol', 'pair', 'пара', 'инструмент', 'currency', 'валюта']):
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    symbol = col_value.upper()  # Приводим к верхнему регистру
-            
-            # Side/Type - направление сделки
-            elif any(x in col_lower for x in ['side', 'type', 'тип', 'направление']):
-                side_value = col_value.lower()
-                if any(x in side_value for x in ['buy', 'покупка', 'long']):
-                    side = 'buy'
-                elif any(x in side_value for x in ['sell', 'продажа', 'short']):
-                    side = 'sell'
-            
-            # Coin Amount - количество криптовалюты (идет в колонку Объем USDT)
-            elif any(x in col_lower for x in ['coin amount', 'coinamount', 'coin_amount']):
-                try:
-                    clean_value = re.sub(r'[^\d.,]', '', col_value)
-                    if clean_value:
-                        coin_amount = float(clean_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Price - цена (идет в колонку Цена)
-            elif any(x in col_lower for x in ['price', 'цена', 'курс']):
-                try:
-                    clean_value = re.sub(r'[^\d.,]', '', col_value)
-                    if clean_value:
-                        price = float(clean_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Fiat Amount - сумма в фиатной валюте (идет в колонку Объем RUB)
-            elif any(x in col_lower for x in ['fiat amount', 'fiatamount', 'fiat_amount']):
-                try:
-                    clean_value = re.sub(r'[^\d.,]', '', col_value)
-                    if clean_value:
-                        fiat_amount = float(clean_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Status - статус
-            elif any(x in col_lower for x in ['status', 'статус']):
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    status = col_value.lower()
-                    if 'completed' in status or 'завершен' in status:
-                        status = 'filled'
-                    elif 'canceled' in status or 'отменен' in status:
-                        status = 'canceled'
-                    elif 'pending' in status or 'ожидание' in status:
-                        status = 'pending'
-                    elif 'Оформление жалоб' in status or 'оформление жалоб' in status:
-                        status = 'appealed'  # Новый статус - как апелляция
-                    else:
-                        status = 'filled'  # По умолчанию
-            
-            # Time - время
-            elif any(x in col_lower for x in ['time', 'date', 'время', 'дата', 'created']):
-                try:
-                    if col_value and col_value != 'nan':
-                        if PANDAS_AVAILABLE:
-                            executed_at = pd.to_datetime(col_value)
-                        else:
-                            # Простой парсинг даты без pandas
-                            executed_at = datetime.strptime(col_value, '%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-        
-        # Попытка автоматически вычислить недостающие значения
-        # Вычисляем price, если есть coin_amount и fiat_amount
-        if price is None and coin_amount not in [None, 0] and fiat_amount not in [None, 0]:
-            try:
-                price = fiat_amount / coin_amount if coin_amount else None
-            except Exception as _:
-                pass
-        # Вычисляем fiat_amount, если есть price и coin_amount
-        if fiat_amount is None and price not in [None, 0] and coin_amount not in [None, 0]:
-            try:
-                fiat_amount = price * coin_amount
-            except Exception as _:
-                pass
+# --- ПАРАЛЛЕЛЬНЫЙ РАЗБОР ФАЙЛОВ СМЕНЫ ---
+# Файлы разных площадок одной смены разбираются одновременно в пуле процессов
+# (разбор pandas упирается в CPU и GIL). Результаты кладутся в кэш разбора,
+# а запись в БД затем идет по порядку в потоке запроса.
+# Процессы пула импортируют только модуль parsers (без Flask и БД): задача
+# пула parse_file_job объявлена там, а не в app.py.
 
-        # Установка значения по умолчанию для symbol
-        if not symbol or str(symbol).lower() in ['nan', 'none', '']:
-            symbol = 'USDT'
+PARSE_POOL_WORKERS = min(4, os.cpu_count() or 1)
+PARSE_FILE_TIMEOUT = 120  # секунд на файл; не дождавшиеся файлы разбираются в своем процессе
 
-        # Проверяем, что все необходимые данные есть после попыток вычисления
-        if not order_id or coin_amount is None or (price is None and fiat_amount is None):
-            print(f"Пропускаем строку - недостаточно данных: order_id={order_id}, coin_amount={coin_amount}, price={price}, fiat_amount={fiat_amount}")
-            return None
-        
-        # Дополнительная проверка на корректность symbol
-        if symbol.lower() in ['nan', 'none', '']:
-            print(f"Пропускаем строку - некорректный символ: {symbol}")
-            return None
-        
-        # Если нет времени, используем текущее
-        if not executed_at:
-            executed_at = datetime.now()
-        
-        return {
-            'order_id': order_id,
-            'symbol': symbol,
-            'side': side,
-            'quantity': coin_amount,    # Объем (USDT) - из Coin Amount
-            'price': price,            # Цена - из Price
-            'total_usdt': fiat_amount, # Объем (RUB) - из Fiat Amount
-            'fees_usdt': 0,
-            'status': status,          # Статус - из Status
-            'executed_at': executed_at
-        }
-        
-    except Exception as e:
-        print(f"Ошибка парсинга ордера Bybit: {e}")
-        return None
+# Пул создается один раз на процесс. Процессы пула запускаются через forkserver
+# (где его нет - spawn), а не fork: разбор идет в потоке задачи импорта, и fork
+# многопоточного процесса скопировал бы блокировки (кэша разбора, выборки логов),
+# захваченные другими потоками, - дочерний процесс завис бы на них навсегда.
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
 
-def parse_htx_order(row):
-    """Парсит строку ордера HTX с учетом специфики формата HTX"""
-    try:
-        # Инициализируем переменные
-        order_id = None
-        symbol = None
-        side = None
-        quantity = None     # Объем (USDT) - из Количество
-        price = None        # Цена - из Цена за ед.
-        total_usdt = None   # Объем (RUB) - из Общая цена
-        status = 'filled'   # Статус по умолчанию
-        executed_at = None
-        
-        # Прямой маппинг колонок HTX
-        for col in row.index:
-            col_str = str(col).strip()
-            col_value = str(row[col]).strip()
-            
-            # Order ID - Номер:
-            if col_str == 'Номер:':
-                order_id = col_value
-            
-            # Symbol/Pair - Монета (USDT + RUB = USDT)
-            elif col_str == 'Монета':
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    symbol = col_value.upper()  # USDT
-            
-            # Side/Type - Тип (Продать/Купить)
-            elif col_str == 'Тип':
-                if 'Продать' in col_value or 'продать' in col_value:
-                    side = 'sell'
-                elif 'Купить' in col_value or 'купить' in col_value:
-                    side = 'buy'
-            
-            # Quantity - Количество
-            elif col_str == 'Количество':
-                try:
-                    if col_value and col_value != 'nan':
-                        quantity = float(col_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Price - Цена за ед.
-            elif col_str == 'Цена за ед.':
-                try:
-                    if col_value and col_value != 'nan':
-                        price = float(col_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Total - Общая цена
-            elif col_str == 'Общая цена':
-                try:
-                    if col_value and col_value != 'nan':
-                        total_usdt = float(col_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Status - Статус
-            elif col_str == 'Статус':
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    if 'Завершено' in col_value or 'завершено' in col_value:
-                        status = 'filled'
-                    elif 'Отменено' in col_value or 'отменено' in col_value:
-                        status = 'canceled'
-                    elif 'Ожидание' in col_value or 'ожидание' in col_value:
-                        status = 'pending'
-                    elif 'Оформление жалоб' in col_value or 'оформление жалоб' in col_value:
-                        status = 'appealed'  # Новый статус - как апелляция
-                    else:
-                        status = 'filled'  # По умолчанию
-            
-            # Time - Время
-            elif col_str == 'Время':
-                try:
-                    if col_value and col_value != 'nan':
-                        if PANDAS_AVAILABLE:
-                            executed_at = pd.to_datetime(col_value)
-                        else:
-                            # Простой парсинг даты без pandas
-                            executed_at = datetime.strptime(col_value, '%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-        
-        # Попытка автоматически вычислить недостающие значения
-        if price is None and quantity not in [None, 0] and total_usdt not in [None, 0]:
-            try:
-                price = total_usdt / quantity if quantity else None
-            except Exception:
-                pass
-        if total_usdt is None and price not in [None, 0] and quantity not in [None, 0]:
-            try:
-                total_usdt = price * quantity
-            except Exception:
-                pass
+def _get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_POOL_WORKERS, mp_context=multiprocessing.get_context(method)
+            )
+        return _parse_pool
 
-        # Устанавливаем значение символа по умолчанию, если не удалось прочитать
-        if not symbol or str(symbol).lower() in ['nan', 'none', '']:
-            symbol = 'USDT'
+def _discard_parse_pool(pool):
+    """Убирает сломанный или зависший пул; следующий разбор создаст новый"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
 
-        # Проверяем, что все необходимые данные есть после вычислений
-        if not order_id or quantity is None or (price is None and total_usdt is None):
-            print(f"HTX: Пропускаем строку - недостаточно данных: order_id={order_id}, quantity={quantity}, price={price}, total_usdt={total_usdt}")
-            return None
-        
-        # Дополнительная проверка на корректность symbol
-        if symbol.lower() in ['nan', 'none', '']:
-            print(f"HTX: Пропускаем строку - некорректный символ: {symbol}")
-            return None
-        
-        # Если нет времени, используем текущее
-        if not executed_at:
-            executed_at = datetime.now()
-        
-        return {
-            'order_id': order_id,
-            'symbol': symbol,
-            'side': side,
-            'quantity': quantity,      # Объем (USDT) - из Количество
-            'price': price,           # Цена - из Цена за ед.
-            'total_usdt': total_usdt, # Объем (RUB) - из Общая цена
-            'fees_usdt': 0,
-            'status': status,         # Статус - из Статус
-            'executed_at': executed_at
-        }
-        
-    except Exception as e:
-        print(f"Ошибка парсинга ордера HTX: {e}")
-        return None
+def prefetch_parsed_files(files, start_date=None, end_date=None):
+    """
+    Разбирает файлы [(путь, площадка), ...] параллельно и кладет результаты в кэш разбора.
 
-def parse_gate_order(row):
-    """Парсит строку ордера Gate.io"""
-    # Аналогично Bybit, но с учетом специфики Gate
-    return parse_bybit_order(row)  # Пока используем тот же парсер
+    Уже закэшированные и повторяющиеся файлы пропускаются. При одном файле или одном
+    ядре разбор идет последовательно по мере обработки. Файлы, на которых пул упал
+    или не уложился в PARSE_FILE_TIMEOUT, разбираются здесь же в текущем процессе.
+    """
+    jobs = {}
+    for filepath, platform in files:
+        if not filepath or not os.path.exists(filepath):
+            continue
+        key = _parse_cache_key(filepath, platform, start_date, end_date)
+        with _parse_cache_lock:
+            cached = key in _parse_cache
+        if not cached and key not in jobs:
+            jobs[key] = (filepath, platform, start_date, end_date)
+    workers = min(PARSE_POOL_WORKERS, len(jobs))
+    if workers < 2:
+        return
 
-def parse_bliss_order(row):
-    """Парсит строку ордера Bliss с учетом специфики формата Bliss"""
+    pending = dict(jobs)
+    pool = None
     try:
-        # Инициализируем переменные
-        order_id = None
-        symbol = 'USDT'  # Всегда USDT для Bliss
-        side = 'buy'     # Всегда покупка согласно описанию
-        quantity = None  # Объем (USDT) - из Crypto amount
-        price = None     # Цена - пропускается поле
-        total_usdt = None  # Объем (RUB) - из Amount
-        status = 'filled'  # Статус по умолчанию
-        executed_at = None
-        
-        # Отладка: выводим все колонки
-        print(f"BLISS DEBUG: Все колонки в строке: {list(row.index)}")
-        
-        for col in row.index:
-            col_str = str(col).strip()
-            col_value = str(row[col]).strip()
-            
-            print(f"BLISS DEBUG: Обрабатываем колонку '{col_str}' со значением '{col_value}'")
-            
-            # Order ID - Internal id
-            if col_str == 'Internal id':
-                order_id = col_value
-                print(f"BLISS DEBUG: Найден order_id: {order_id}")
-            
-            # Quantity - Crypto amount
-            elif col_str == 'Crypto amount':
-                try:
-                    if col_value and col_value != 'nan':
-                        # Убираем запятые и конвертируем в float
-                        quantity = float(col_value.replace(',', '.'))
-                        print(f"BLISS DEBUG: Найден quantity: {quantity}")
-                except:
-                    pass
-            
-            # Total USDT - Amount
-            elif col_str == 'Amount':
-                try:
-                    if col_value and col_value != 'nan':
-                        # Убираем запятые и конвертируем в float
-                        total_usdt = float(col_value.replace(',', '.'))
-                        print(f"BLISS DEBUG: Найден total_usdt: {total_usdt}")
-                except:
-                    pass
-            
-            # Status - Status
-            elif col_str == 'Status':
-                if col_value and col_value != 'nan':
-                    status_value = col_value.lower()
-                    if status_value in ['success', 'completed', 'done']:
-                        status = 'filled'
-                    elif status_value in ['cancelled', 'canceled']:
-                        status = 'canceled'
-                    elif status_value in ['expired']:
-                        status = 'expired'
-                    elif status_value in ['failed']:
-                        status = 'failed'
-                    else:
-                        status = 'pending'
-                    print(f"BLISS DEBUG: Найден status: {status}")
-            
-            # Time - пробуем разные варианты названий колонок с датой
-            elif col_str in ['Finish date', 'Creation date', 'Date', 'Time', 'Timestamp', 'Дата завершения', 'Время']:
-                print(f"BLISS DEBUG: Найдена колонка с датой '{col_str}' со значением '{col_value}'")
-                try:
-                    if col_value and col_value != 'nan':
-                        # Пробуем разные форматы даты
-                        date_formats = [
-                            '%d.%m.%Y %H:%M',
-                            '%d.%m.%Y %H:%M:%S',
-                            '%Y-%m-%d %H:%M:%S',
-                            '%Y-%m-%d %H:%M',
-                            '%d/%m/%Y %H:%M',
-                            '%d-%m-%Y %H:%M'
-                        ]
-                        
-                        for date_format in date_formats:
-                            try:
-                                if PANDAS_AVAILABLE:
-                                    executed_at = pd.to_datetime(col_value, format=date_format)
-                                else:
-                                    executed_at = datetime.strptime(col_value, date_format)
-                                print(f"BLISS DEBUG: Успешно распарсили дату '{col_value}' в формате '{date_format}' -> {executed_at}")
-                                break
-                            except:
-                                continue
-                        else:
-                            print(f"BLISS DEBUG: Не удалось распарсить дату '{col_value}' ни в одном формате")
-                except Exception as e:
-                    print(f"BLISS DEBUG: Ошибка парсинга даты '{col_value}': {e}")
-        
-        # Вычисляем цену на основе имеющихся данных
-        price = None
-        if quantity is not None and total_usdt is not None and quantity > 0:
-            price = total_usdt / quantity
-        
-        # Проверяем, что все необходимые данные есть
-        if not order_id or quantity is None or total_usdt is None or price is None:
-            print(f"BLISS: Пропускаем строку - недостаточно данных: order_id={order_id}, symbol={symbol}, side={side}, quantity={quantity}, price={price}, total_usdt={total_usdt}")
-            return None
-        
-        # Если нет времени, используем текущее
-        if not executed_at:
-            executed_at = datetime.now()
-        
-        # Время будет конвертировано позже в process_platform_file
-        # executed_at остаётся в исходном часовом поясе
-        
-        return {
-            'order_id': order_id,
-            'account_name': None,  # Не используем имя аккаунта из файла
-            'symbol': symbol,
-            'side': side,              # Всегда 'buy'
-            'quantity': quantity,      # Объем (USDT) - из Crypto amount
-            'price': price,            # Цена - вычисляется
-            'total_usdt': total_usdt,  # Объем (RUB) - из Amount
-            'fees_usdt': 0,
-            'status': status,          # Статус - из Status
-            'executed_at': executed_at
-        }
-        
+        pool = _get_parse_pool()
+        futures = {pool.submit(parse_file_job, job): key for key, job in jobs.items()}
+        # Файлы идут в пул волнами по workers штук, на каждую волну - PARSE_FILE_TIMEOUT
+        timeout = PARSE_FILE_TIMEOUT * math.ceil(len(jobs) / workers)
+        for future in as_completed(futures, timeout=timeout):
+            key = futures[future]
+            try:
+                orders_data, info = future.result()
+            except Exception as e:
+                parse_log.warning("Параллельный разбор %s не удался: %s", jobs[key][1], e)
+                continue
+            _parse_cache_put(key, orders_data, info)
+            del pending[key]
     except Exception as e:
-        print(f"BLISS: Ошибка парсинга строки: {str(e)}")
-        return None
+        parse_log.warning("Параллельный разбор прерван: %s", e)
+    if pending and pool is not None:
+        # Зависшие процессы или упавший пул не переиспользуем
+        _discard_parse_pool(pool)
+    parse_log.info("Параллельно разобрано %s из %s файлов в %s процессах",
+                   len(jobs) - len(pending), len(jobs), workers)
+
+    for key, job in pending.items():
+        try:
+            orders_data, info = parse_file_job(job)
+        except Exception as e:
+            # Ошибка повторится и будет обработана в process_platform_file
+            parse_log.warning("Разбор %s не удался: %s", job[1], e)
+            continue
+        _parse_cache_put(key, orders_data, info)
 
 # Модели данных
 class Employee(db.Model):
@@ -899,7 +259,8 @@ class Account(db.Model):
 class ShiftReport(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
-    shift_date = db.Column(db.Date, nullable=False)
+    # active_history: прежняя дата нужна сбросу снимков прибыли при переносе отчета
+    shift_date = db.column_property(db.Column(db.Date, nullable=False), active_history=True)
     shift_type = db.Column(db.String(20), nullable=False)  # 'morning' или 'evening'
     department = db.Column(db.String(20), nullable=False, default='first')  # 'first' или 'second' - отдел
     # Новые поля для диапазона дат
@@ -966,6 +327,41 @@ class ShiftReport(db.Model):
     shift_start_time = db.Column(db.DateTime, default=None)  # Время начала смены
     shift_end_time = db.Column(db.DateTime, default=None)    # Время окончания смены
 
+class ShiftReportBalance(db.Model):
+    """Баланс аккаунта в отчете смены - нормализованная копия balances_json (строка на отчет, аккаунт и площадку).
+
+    Пишется вместе с balances_json слушателями _sync_shift_report_balances.
+    """
+    __tablename__ = 'shift_report_balance'
+    __table_args__ = (
+        db.Index('ix_shift_report_balance_account_shift', 'account_id', 'shift_date', 'shift_type'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    shift_report_id = db.Column(db.Integer, db.ForeignKey('shift_report.id'), nullable=False, index=True)
+    employee_id = db.Column(db.Integer, nullable=True)
+    platform = db.Column(db.String(20), nullable=False)
+    account_id = db.Column(db.Integer, nullable=True)  # None, если в balances_json нет числового id
+    account_name = db.Column(db.String(100), nullable=True)
+    shift_date = db.Column(db.Date, nullable=False)
+    shift_type = db.Column(db.String(20), nullable=False)
+    start_balance = db.Column(db.Numeric(15, 2), nullable=True)
+    end_balance = db.Column(db.Numeric(15, 2), nullable=True)
+    balance = db.Column(db.Numeric(15, 2), nullable=True)  # текущий баланс ('balance' в balances_json)
+
+class ShiftProfitSnapshot(db.Model):
+    """Сохраненная прибыль смены: результаты calculate_profit_from_orders и calculate_report_profit.
+
+    Строка создается вместе с отчетом. При изменении ордеров в окне смены, полей
+    отчета или балансов значения сбрасываются в NULL, а version увеличивается
+    (см. invalidate_shift_profit_snapshots); чтение пересчитывает только сброшенные.
+    """
+    __tablename__ = 'shift_profit_snapshot'
+    shift_report_id = db.Column(db.Integer, db.ForeignKey('shift_report.id'), primary_key=True)
+    order_profit_json = db.Column(db.Text, nullable=True)  # calculate_profit_from_orders
+    report_profit_json = db.Column(db.Text, nullable=True)  # calculate_report_profit
+    version = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, nullable=True)
+
 class OrderDetail(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     shift_report_id = db.Column(db.Integer, db.ForeignKey('shift_report.id'), nullable=False)
@@ -1002,7 +398,9 @@ class Order(db.Model):
     """Модель для хранения ордеров от расширения Bybit"""
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.String(100), nullable=False, unique=True)
-    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    # Старые сотрудник и время нужны сбросу снимков прибыли и пересчету сводок прежнего
+    # дня (история изменения): active_history подгружает их при присваивании после commit
+    employee_id = db.column_property(db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False), active_history=True)
     platform = db.Column(db.String(20), nullable=False, default='bybit')
     account_name = db.Column(db.String(100), nullable=False)
     symbol = db.Column(db.String(20), nullable=False)
@@ -1014,13 +412,436 @@ class Order(db.Model):
     status = db.Column(db.String(20), nullable=False)  # 'filled', 'canceled', 'pending', 'appealed', 'dokidka', 'internal_transfer', 'scam'
     count_in_sales = db.Column(db.Boolean, default=False)  # Учитывать в продажах
     count_in_purchases = db.Column(db.Boolean, default=False)  # Учитывать в покупках
-    executed_at = db.Column(db.DateTime, nullable=False)
+    executed_at = db.column_property(db.Column(db.DateTime, nullable=False), active_history=True)
+    # Отпечаток содержимого для ордеров без надежного order_id (Bybit BTC), см. order_content_fingerprint
+    content_fingerprint = db.Column(db.String(40), nullable=True, unique=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Связь с сотрудником
     employee = db.relationship('Employee', backref='orders')
 
+class OrderDailyRollup(db.Model):
+    """Дневная сводка ордеров: число и суммы USDT/RUB за день в разрезе сотрудника,
+    площадки, стороны, статуса и флагов учета.
+
+    Пересчитывается из order в той же транзакции, что и запись ордеров (см. refresh_order_daily_rollups).
+    """
+    __tablename__ = 'order_daily_rollup'
+    __table_args__ = (
+        db.Index('ix_order_daily_rollup_key', 'day', 'employee_id', 'platform', 'side', 'status',
+                 'count_in_sales', 'count_in_purchases', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # дата executed_at
+    employee_id = db.Column(db.Integer, nullable=False)
+    platform = db.Column(db.String(20), nullable=False)
+    side = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    count_in_sales = db.Column(db.Boolean, nullable=False, default=False)
+    count_in_purchases = db.Column(db.Boolean, nullable=False, default=False)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity_sum = db.Column(db.Numeric(20, 8), nullable=False, default=0)  # USDT
+    total_usdt_sum = db.Column(db.Numeric(20, 2), nullable=False, default=0)  # RUB (поле total_usdt)
+
+class OrderBatchRequest(db.Model):
+    """Результат пакетной загрузки ордеров по ключу идемпотентности (повтор запроса получает тот же ответ)"""
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(100), nullable=False, unique=True)
+    request_hash = db.Column(db.String(64), nullable=False)  # sha256 тела запроса
+    response_json = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ImportJob(db.Model):
+    """Фоновая задача импорта (загрузка файла ордеров, файлы отчета смены) и ее прогресс"""
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(30), nullable=False)  # 'orders_upload', 'shift_files'
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    stage = db.Column(db.String(20), nullable=False, default='saved')  # 'saved', 'parsed', 'deduped', 'inserted'
+    counters_json = db.Column(db.Text, default='{}')
+    result_json = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Поля ордера, из которых строится order_content_fingerprint
+ORDER_FINGERPRINT_FIELDS = ('symbol', 'side', 'quantity', 'price', 'executed_at')
+
+def _set_order_content_fingerprint(order):
+    order.content_fingerprint = order_content_fingerprint(
+        order.symbol, order.side, order.quantity, order.price, order.executed_at
+    )
+
+@db.event.listens_for(Order, 'before_insert')
+def _insert_order_content_fingerprint(mapper, connection, order):
+    """Отпечаток нового BTC ордера"""
+    if order.platform == 'bybit_btc':
+        _set_order_content_fingerprint(order)
+
+@db.event.listens_for(Order, 'before_update')
+def _update_order_content_fingerprint(mapper, connection, order):
+    """Пересчитывает отпечаток BTC ордера, только если изменилось его содержимое.
+
+    Ордера без отпечатка (поздние копии дублей, оставленные миграцией
+    add_order_content_fingerprint) не трогаем: иначе они получили бы отпечаток
+    ранней копии и нарушили уникальный индекс.
+    """
+    if order.platform != 'bybit_btc' or order.content_fingerprint is None:
+        return
+    state = db.inspect(order)
+    if any(state.attrs[field].history.has_changes() for field in ORDER_FINGERPRINT_FIELDS):
+        _set_order_content_fingerprint(order)
+
+# Значения вне диапазона Numeric(15, 2) в нормализованную таблицу не пишем
+SHIFT_REPORT_BALANCE_LIMIT = 10 ** 13
+
+def _balance_number(value):
+    """Число из balances_json или None для пустых, нечисловых и вне диапазона значений"""
+    if value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number) or abs(number) >= SHIFT_REPORT_BALANCE_LIMIT:
+        return None
+    return number
+
+def shift_report_balance_rows(report_id, employee_id, shift_date, shift_type, balances_json):
+    """Строки shift_report_balance для balances_json отчета.
+
+    Повтор аккаунта на площадке в одном отчете пропускается - учитывается первая запись,
+    как при поиске по balances_json.
+    """
+    try:
+        balances = json.loads(balances_json or '{}')
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(balances, dict):
+        return []
+    rows = []
+    seen = set()
+    for platform, accounts in balances.items():
+        if not isinstance(accounts, list):
+            continue
+        for acc in accounts:
+            if not isinstance(acc, dict):
+                continue
+            try:
+                account_id = int(acc.get('account_id') or acc.get('id'))
+            except (TypeError, ValueError):
+                account_id = None
+            account_name = acc.get('account_name')
+            account_name = str(account_name)[:100] if account_name not in (None, '') else None
+            key = (platform, account_id if account_id is not None else account_name)
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append({
+                'shift_report_id': report_id,
+                'employee_id': employee_id,
+                'platform': str(platform)[:20],
+                'account_id': account_id,
+                'account_name': account_name,
+                'shift_date': shift_date,
+                'shift_type': shift_type,
+                'start_balance': _balance_number(acc.get('start_balance')),
+                'end_balance': _balance_number(acc.get('end_balance')),
+                'balance': _balance_number(acc.get('balance'))
+            })
+    return rows
+
+SHIFT_REPORT_BALANCE_SOURCE_FIELDS = ('balances_json', 'employee_id', 'shift_date', 'shift_type')
+
+def _write_shift_report_balances(connection, report):
+    """Переписывает строки shift_report_balance отчета в той же транзакции, что и balances_json"""
+    table = ShiftReportBalance.__table__
+    connection.execute(table.delete().where(table.c.shift_report_id == report.id))
+    rows = shift_report_balance_rows(
+        report.id, report.employee_id, report.shift_date, report.shift_type, report.balances_json
+    )
+    if rows:
+        connection.execute(table.insert(), rows)
+
+@db.event.listens_for(ShiftReport, 'after_insert')
+def _insert_shift_report_balances(mapper, connection, report):
+    _write_shift_report_balances(connection, report)
+
+@db.event.listens_for(ShiftReport, 'after_update')
+def _update_shift_report_balances(mapper, connection, report):
+    state = db.inspect(report)
+    if any(state.attrs[field].history.has_changes() for field in SHIFT_REPORT_BALANCE_SOURCE_FIELDS):
+        _write_shift_report_balances(connection, report)
+
+@db.event.listens_for(ShiftReport, 'before_delete')
+def _delete_shift_report_balances(mapper, connection, report):
+    table = ShiftReportBalance.__table__
+    connection.execute(table.delete().where(table.c.shift_report_id == report.id))
+
+# --- СНИМКИ ПРИБЫЛИ СМЕН ---
+# Строка shift_profit_snapshot есть у каждого отчета. После flush сессии
+# _invalidate_shift_profit_snapshots сбрасывает снимки, на которые повлияли
+# изменения: ордера в окне смены (по старым и новым employee_id/executed_at),
+# поля самого отчета, балансы более ранних отчетов и начальные балансы.
+# Пакетная запись ордеров мимо ORM (bulk_write_orders) вызывает сброс явно.
+
+# Поля ордера, от которых зависит прибыль смены
+SHIFT_PROFIT_ORDER_FIELDS = ('employee_id', 'executed_at', 'status', 'side', 'quantity', 'count_in_sales', 'count_in_purchases')
+# Поля отчета, от которых зависит прибыль по балансам следующих смен (find_prev_balance)
+SHIFT_PROFIT_BALANCE_FIELDS = ('balances_json', 'shift_date', 'shift_type')
+
+@db.event.listens_for(ShiftReport, 'after_insert')
+def _insert_shift_profit_snapshot(mapper, connection, report):
+    connection.execute(ShiftProfitSnapshot.__table__.insert().values(shift_report_id=report.id, version=0))
+
+@db.event.listens_for(ShiftReport, 'before_delete')
+def _delete_shift_profit_snapshot(mapper, connection, report):
+    table = ShiftProfitSnapshot.__table__
+    connection.execute(table.delete().where(table.c.shift_report_id == report.id))
+
+def invalidate_shift_profit_snapshots(connection, order_points=(), report_ids=(), report_profit_from=None,
+                                      all_report_profit=False):
+    """Сбрасывает снимки прибыли в текущей транзакции.
+
+    order_points: пары (employee_id, executed_at) измененных ордеров - сбрасываются
+    оба снимка смен этого сотрудника, чье окно пересекает диапазон времени ордеров;
+    report_ids: отчеты, у которых сбрасываются оба снимка;
+    report_profit_from: дата, начиная с которой сбрасывается прибыль по балансам;
+    all_report_profit: сбросить прибыль по балансам у всех отчетов.
+    """
+    table = ShiftProfitSnapshot.__table__
+    reports = ShiftReport.__table__
+    reset_all = {'order_profit_json': None, 'report_profit_json': None, 'version': table.c.version + 1}
+    reset_report_profit = {'report_profit_json': None, 'version': table.c.version + 1}
+    
+    # Диапазон времени ордеров по каждому сотруднику - один UPDATE на сотрудника
+    ranges = {}
+    for employee_id, executed_at in order_points:
+        if employee_id is None or executed_at is None:
+            continue
+        low, high = ranges.get(employee_id, (executed_at, executed_at))
+        ranges[employee_id] = (min(low, executed_at), max(high, executed_at))
+    for employee_id, (low, high) in ranges.items():
+        connection.execute(table.update().where(table.c.shift_report_id.in_(
+            select(reports.c.id).where(
+                reports.c.employee_id == employee_id,
+                reports.c.shift_start_time <= high,
+                reports.c.shift_end_time >= low
+            )
+        )).values(**reset_all))
+    
+    report_ids = [report_id for report_id in set(report_ids) if report_id is not None]
+    if report_ids:
+        connection.execute(table.update().where(table.c.shift_report_id.in_(report_ids)).values(**reset_all))
+    
+    if all_report_profit:
+        connection.execute(table.update().values(**reset_report_profit))
+    elif report_profit_from is not None:
+        connection.execute(table.update().where(table.c.shift_report_id.in_(
+            select(reports.c.id).where(reports.c.shift_date >= report_profit_from)
+        )).values(**reset_report_profit))
+
+def _changed_values(state, fields):
+    """Старые и новые значения измененных полей: {поле: [значения]}"""
+    changed = {}
+    for field in fields:
+        history = state.attrs[field].history
+        if history.has_changes():
+            changed[field] = list(history.added) + list(history.deleted)
+    return changed
+
+@db.event.listens_for(db.session, 'after_flush')
+def _invalidate_shift_profit_snapshots(session, flush_context):
+    """Сбрасывает снимки прибыли смен, на которые повлиял flush"""
+    order_points = []
+    report_ids = []
+    report_dates = []
+    all_report_profit = False
+    
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Order):
+            order_points.append((obj.employee_id, obj.executed_at))
+        elif isinstance(obj, ShiftReport):
+            # Новый или удаленный отчет меняет предыдущие балансы последующих смен
+            report_dates.append(obj.shift_date)
+        elif isinstance(obj, (InitialBalance, Account)):
+            all_report_profit = True
+    
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            state = db.inspect(obj)
+            changed = _changed_values(state, SHIFT_PROFIT_ORDER_FIELDS)
+            if not changed:
+                continue
+            employee_ids = set(changed.get('employee_id') or [obj.employee_id])
+            executed_ats = set(changed.get('executed_at') or [obj.executed_at])
+            order_points.extend((employee_id, executed_at) for employee_id in employee_ids for executed_at in executed_ats)
+        elif isinstance(obj, ShiftReport):
+            state = db.inspect(obj)
+            if not session.is_modified(obj, include_collections=False):
+                continue
+            report_ids.append(obj.id)
+            changed = _changed_values(state, SHIFT_PROFIT_BALANCE_FIELDS)
+            if changed:
+                report_dates.extend(changed.get('shift_date') or [obj.shift_date])
+        elif isinstance(obj, (InitialBalance, Account)):
+            if session.is_modified(obj, include_collections=False):
+                all_report_profit = True
+    
+    report_dates = [shift_date for shift_date in report_dates if shift_date is not None]
+    if order_points or report_ids or report_dates or all_report_profit:
+        invalidate_shift_profit_snapshots(
+            session.connection(),
+            order_points=order_points,
+            report_ids=report_ids,
+            report_profit_from=min(report_dates) if report_dates else None,
+            all_report_profit=all_report_profit
+        )
+
+# --- ДНЕВНЫЕ СВОДКИ ОРДЕРОВ ---
+# order_daily_rollup пересчитывается по затронутым парам (сотрудник, день) из
+# самих ордеров: после flush сессии (_refresh_order_daily_rollups) и в
+# bulk_write_orders. Полная перестройка - команда `flask rebuild-order-rollups`.
+
+# Поля ордера, от которых зависит дневная сводка
+ORDER_ROLLUP_FIELDS = ('employee_id', 'executed_at', 'platform', 'side', 'status', 'count_in_sales',
+                       'count_in_purchases', 'quantity', 'total_usdt')
+ORDER_ROLLUP_COLUMNS = ('day', 'employee_id', 'platform', 'side', 'status', 'count_in_sales',
+                        'count_in_purchases', 'order_count', 'quantity_sum', 'total_usdt_sum')
+
+def order_rollup_query(start=None, end=None, employee_ids=None, by_day=True):
+    """SELECT агрегатов по ордерам с executed_at в [start, end).
+
+    by_day=True группирует как order_daily_rollup (колонки ORDER_ROLLUP_COLUMNS),
+    by_day=False - только по площадке, стороне, статусу и флагам учета.
+    """
+    orders = Order.__table__
+    dimensions = [
+        orders.c.platform,
+        orders.c.side,
+        orders.c.status,
+        func.coalesce(orders.c.count_in_sales, False),
+        func.coalesce(orders.c.count_in_purchases, False)
+    ]
+    if by_day:
+        dimensions = [func.date(orders.c.executed_at), orders.c.employee_id] + dimensions
+    query = select(
+        *dimensions,
+        func.count(orders.c.id),
+        func.coalesce(func.sum(orders.c.quantity), 0),
+        func.coalesce(func.sum(orders.c.total_usdt), 0)
+    ).group_by(*dimensions)
+    if start is not None:
+        query = query.where(orders.c.executed_at >= start)
+    if end is not None:
+        query = query.where(orders.c.executed_at < end)
+    if employee_ids is not None:
+        query = query.where(orders.c.employee_id.in_(employee_ids))
+    return query
+
+def refresh_order_daily_rollups(connection, order_points):
+    """Пересчитывает сводки дней и сотрудников из order_points - пар (employee_id, executed_at)
+    ордеров до и после изменения - в текущей транзакции"""
+    days = {}
+    for employee_id, executed_at in order_points:
+        if employee_id is None or executed_at is None:
+            continue
+        days.setdefault(executed_at.date(), set()).add(employee_id)
+    table = OrderDailyRollup.__table__
+    for day, employee_ids in days.items():
+        start = datetime(day.year, day.month, day.day)
+        connection.execute(table.delete().where(table.c.day == day, table.c.employee_id.in_(employee_ids)))
+        connection.execute(table.insert().from_select(
+            ORDER_ROLLUP_COLUMNS, order_rollup_query(start, start + timedelta(days=1), employee_ids)
+        ))
+
+def rebuild_order_daily_rollups(connection):
+    """Перестраивает order_daily_rollup по всем ордерам; возвращает число строк сводки"""
+    table = OrderDailyRollup.__table__
+    connection.execute(table.delete())
+    connection.execute(table.insert().from_select(ORDER_ROLLUP_COLUMNS, order_rollup_query()))
+    return connection.execute(select(func.count()).select_from(table)).scalar()
+
+@db.event.listens_for(db.session, 'after_flush')
+def _refresh_order_daily_rollups(session, flush_context):
+    """Пересчитывает дневные сводки ордеров, измененных во flush"""
+    order_points = []
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Order):
+            order_points.append((obj.employee_id, obj.executed_at))
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            changed = _changed_values(db.inspect(obj), ORDER_ROLLUP_FIELDS)
+            if not changed:
+                continue
+            employee_ids = set(changed.get('employee_id') or [obj.employee_id])
+            executed_ats = set(changed.get('executed_at') or [obj.executed_at])
+            order_points.extend((employee_id, executed_at) for employee_id in employee_ids for executed_at in executed_ats)
+    if order_points:
+        refresh_order_daily_rollups(session.connection(), order_points)
+
+@app.cli.command('rebuild-order-rollups')
+def rebuild_order_rollups_command():
+    """Перестраивает дневные сводки ордеров (order_daily_rollup) с нуля"""
+    rows = rebuild_order_daily_rollups(db.session.connection())
+    db.session.commit()
+    click.echo(f'order_daily_rollup: {rows} строк')
+
+def order_statistics_totals(start=None, end=None, employee_id=None):
+    """Число ордеров и суммы за [start, end) в разрезе площадки, стороны, статуса и флагов учета.
+
+    Целые дни берутся из order_daily_rollup, сырые ордера читаются только для
+    неполных дней на краях интервала.
+    Возвращает {(platform, side, status, count_in_sales, count_in_purchases): [count, quantity, total_usdt]}.
+    """
+    first_day = last_day = None  # целые дни сводки: [first_day, last_day)
+    edges = []
+    if start is not None:
+        first_day = start.date()
+        if start != datetime(first_day.year, first_day.month, first_day.day):
+            first_day += timedelta(days=1)
+            edges.append((start, datetime(first_day.year, first_day.month, first_day.day)))
+    if end is not None:
+        last_day = end.date()
+        day_start = datetime(last_day.year, last_day.month, last_day.day)
+        if end != day_start:
+            edges.append((day_start, end))
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        # Интервал внутри одних суток - только сырые ордера
+        edges = [(start, end)] if start < end else []
+        use_rollup = False
+    else:
+        use_rollup = True
+
+    employee_ids = [employee_id] if employee_id is not None else None
+    queries = [order_rollup_query(edge_start, edge_end, employee_ids, by_day=False) for edge_start, edge_end in edges]
+    if use_rollup:
+        table = OrderDailyRollup.__table__
+        dimensions = [table.c.platform, table.c.side, table.c.status, table.c.count_in_sales, table.c.count_in_purchases]
+        query = select(
+            *dimensions,
+            func.sum(table.c.order_count),
+            func.sum(table.c.quantity_sum),
+            func.sum(table.c.total_usdt_sum)
+        ).group_by(*dimensions)
+        if first_day is not None:
+            query = query.where(table.c.day >= first_day)
+        if last_day is not None:
+            query = query.where(table.c.day < last_day)
+        if employee_id is not None:
+            query = query.where(table.c.employee_id == employee_id)
+        queries.append(query)
+
+    totals = {}
+    for query in queries:
+        for platform, side, status, count_in_sales, count_in_purchases, count, quantity, total_usdt in db.session.execute(query):
+            key = (platform, side, status, bool(count_in_sales), bool(count_in_purchases))
+            values = totals.setdefault(key, [0, 0.0, 0.0])
+            values[0] += int(count or 0)
+            values[1] += float(quantity or 0)
+            values[2] += float(total_usdt or 0)
+    return totals
+
 class EmployeeScamHistory(db.Model):
     """Модель для хранения истории скамов сотрудников"""
     id = db.Column(db.Integer, primary_key=True)
@@ -1044,6 +865,114 @@ class SalarySettings(db.Model):
     bonus_profit_threshold = db.Column(db.Float, nullable=False, default=150.0)  # Порог прибыли для получения бонуса (USDT)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+# --- КЭШ РЕЗУЛЬТАТОВ ОТЧЕТНЫХ ЭНДПОИНТОВ ---
+# Дашборд, статистика и профиль сотрудника - функции параметров запроса и
+# данных. Для каждой таблицы ведется счетчик поколения: после commit
+# транзакции, изменившей таблицу, счетчик увеличивается. Ответ кэшируется по
+# параметрам, текущей дате и поколениям таблиц, от которых зависит эндпоинт,
+# так что любое изменение этих таблиц делает старые записи недостижимыми.
+# Счетчики живут в памяти процесса (как кэш разбора и пул задач импорта),
+# поэтому при нескольких процессах gunicorn кэш нужно отключить:
+# RESULT_CACHE_MAX_ENTRIES=0. Вытесняются давно не использованные записи.
+
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 256))
+# shift_profit_snapshot: сами снимки сбрасываются вместе с изменением ордеров и отчетов,
+# но администратор может переписать их значения (/api/admin/profit-snapshots/recompute)
+RESULT_CACHE_TABLES = ('order', 'shift_report', 'employee', 'account', 'initial_balance', 'shift_profit_snapshot')
+
+_table_generations = dict.fromkeys(RESULT_CACHE_TABLES, 0)
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+_result_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def mark_tables_changed(session, *tables):
+    """Отмечает таблицы, измененные в транзакции сессии; поколения увеличатся после commit.
+
+    ORM изменения отмечаются сами (_collect_changed_tables), вызывать нужно
+    только для записи мимо ORM.
+    """
+    session.info.setdefault('changed_tables', set()).update(tables)
+
+@db.event.listens_for(db.session, 'after_flush')
+def _collect_changed_tables(session, flush_context):
+    changed = set()
+    for obj in list(session.new) + list(session.deleted):
+        changed.add(obj.__table__.name)
+    for obj in session.dirty:
+        if obj.__table__.name not in changed and session.is_modified(obj, include_collections=False):
+            changed.add(obj.__table__.name)
+    changed.intersection_update(RESULT_CACHE_TABLES)
+    if changed:
+        mark_tables_changed(session, *changed)
+
+@db.event.listens_for(db.session, 'after_commit')
+def _bump_table_generations(session):
+    changed = session.info.pop('changed_tables', None)
+    if changed:
+        with _result_cache_lock:
+            for table in changed:
+                _table_generations[table] += 1
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_changed_tables(session):
+    session.info.pop('changed_tables', None)
+
+def _result_cache_get(key):
+    with _result_cache_lock:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            _result_cache.move_to_end(key)
+            _result_cache_stats['hits'] += 1
+        else:
+            _result_cache_stats['misses'] += 1
+    return cached
+
+def _result_cache_put(key, value):
+    with _result_cache_lock:
+        _result_cache[key] = value
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > RESULT_CACHE_MAX_ENTRIES:
+            _result_cache.popitem(last=False)
+            _result_cache_stats['evictions'] += 1
+
+def result_cache_info():
+    """Счетчики кэша результатов и текущие поколения таблиц"""
+    with _result_cache_lock:
+        return dict(_result_cache_stats, entries=len(_result_cache), max_entries=RESULT_CACHE_MAX_ENTRIES,
+                    generations=dict(_table_generations))
+
+def cached_result(*tables):
+    """Кэширует успешный ответ эндпоинта до изменения любой из таблиц tables"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if RESULT_CACHE_MAX_ENTRIES <= 0:
+                return view(*args, **kwargs)
+            # Поколения читаются до запроса к БД: запись, закоммиченная во время
+            # расчета, увеличит их, и результат не будет выдан следующим запросам
+            with _result_cache_lock:
+                generations = tuple(_table_generations[table] for table in tables)
+            key = (
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+                datetime.now().date(),  # периоды по умолчанию считаются от сегодняшней даты
+                generations
+            )
+            cached = _result_cache_get(key)
+            if cached is not None:
+                body, mimetype = cached
+                response = app.response_class(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _result_cache_put(key, (response.get_data(), response.mimetype))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
 # API Endpoints
 @app.route('/')
 def index():
@@ -1273,8 +1202,8 @@ def save_report_file(file, platform, report_id):
     if not file or not file.filename:
         return None
         
-    # Создаем безопасное имя файла
-    filename = secure_filename(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}")
+    # Создаем безопасное и уникальное имя файла (в одной смене файлы сохраняются подряд)
+    filename = secure_filename(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{file.filename}")
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     
     # Сохраняем файл
@@ -1630,7 +1559,7 @@ def calculate_employee_stats(reports, employees, db):
                 emp_profit += report_profit
                 
             except Exception as e:
-                print(f"[EMPLOYEE_STATS] Ошибка расчета прибыли для отчета {r.id}: {e}")
+                stats_log.error("[EMPLOYEE_STATS] Ошибка расчета прибыли для отчета %s: %s", r.id, e)
                 continue
         
         emp_shifts = len(emp_reports)
@@ -1715,7 +1644,7 @@ def calculate_employee_stats_by_department(reports, employees, db):
                     emp_profit += report_profit
                     
                 except Exception as e:
-                    print(f"[EMPLOYEE_STATS_DEPT] Ошибка расчета прибыли для отчета {r.id}: {e}")
+                    stats_log.error("[EMPLOYEE_STATS_DEPT] Ошибка расчета прибыли для отчета %s: %s", r.id, e)
                     continue
             
             emp_shifts = len(first_dept_reports)
@@ -1789,7 +1718,7 @@ def calculate_employee_stats_by_department(reports, employees, db):
                     emp_profit += report_profit
                     
                 except Exception as e:
-                    print(f"[EMPLOYEE_STATS_DEPT] Ошибка расчета прибыли для отчета {r.id}: {e}")
+                    stats_log.error("[EMPLOYEE_STATS_DEPT] Ошибка расчета прибыли для отчета %s: %s", r.id, e)
                     continue
             
             emp_shifts = len(second_dept_reports)
@@ -1812,8 +1741,9 @@ def calculate_employee_stats_by_department(reports, employees, db):
 def calculate_last_reports(db, last_reports_query):
     """Формирует список последних смен с расчетом прибыли и балансов по площадкам для дашборда."""
     last_reports = []
+    last_reports_query = list(last_reports_query)
+    timeline = get_balance_timeline(db.session)
     for r in last_reports_query:
-        profit_data = calculate_profit_from_orders(db.session, r)
         try:
             balances = json.loads(r.balances_json or '{}')
         except json.JSONDecodeError:
@@ -1826,7 +1756,7 @@ def calculate_last_reports(db, last_reports_query):
             count = len(accounts_list)
             sum_delta = 0
             for acc in accounts_list:
-                prev = find_prev_balance(db.session, acc.get('account_id') or acc.get('id'), platform, r)
+                prev = timeline.prev_balance(acc.get('account_id') or acc.get('id'), platform, r)
                 cur = float(acc.get('balance', 0)) if acc.get('balance') not in (None, '') else 0
                 sum_delta += cur - prev
             platform_stats[platform] = {'count': count, 'delta': round(sum_delta,2)}
@@ -1860,6 +1790,7 @@ def calculate_account_balances(accounts, reports, db):
     return account_balances
 
 @app.route('/api/dashboard', methods=['GET'])
+@cached_result('order', 'shift_report', 'employee', 'account', 'initial_balance', 'shift_profit_snapshot')
 def get_dashboard_data():
     """Возвращает агрегированные данные для дашборда с поддержкой фильтрации по дате. Топ-3 сотрудников и общая прибыль всегда за текущий месяц."""
     from datetime import datetime, timedelta
@@ -1876,27 +1807,30 @@ def get_dashboard_data():
         ShiftReport.shift_date <= end_date
     ).all()
     # --- Общая прибыль за выбранный период (используем логику ордеров) ---
-    total_profit = sum(calculate_profit_from_orders(db.session, r)['project_profit'] for r in reports)
+    # Прибыль всех смен периода берется из снимков (недостающие - одной агрегацией) и переиспользуется ниже
+    order_profits = get_order_profits(db.session, reports)
+    total_profit = sum(order_profits[r.id]['project_profit'] for r in reports)
     # --- Общий объем: сумма всех end_balance по всем аккаунтам на конец последней смены ---
     accounts = Account.query.filter_by(is_active=True).all()
     last_report = max(reports, key=lambda r: (r.shift_date, 0 if r.shift_type=='morning' else 1), default=None)
     total_volume = 0.0
     if last_report:
+        # Считаем по balances_json одного отчета: в shift_report_balance нет повторов
+        # аккаунта и значений вне диапазона колонки, а в сумму входят все записи
         try:
             balances = json.loads(last_report.balances_json or '{}')
-        except:
+        except (TypeError, ValueError):
             balances = {}
         for platform in ['bybit','htx','bliss','gate']:
             if balances.get(platform):
                 for acc in balances[platform]:
-                    end = float(acc.get('end_balance', 0) or 0)
-                    total_volume += end
+                    total_volume += float(acc.get('end_balance', 0) or 0)
     total_requests = sum((r.bybit_requests or 0) + (r.htx_requests or 0) + (r.bliss_requests or 0) for r in reports)
     morning_profit = 0
     evening_profit = 0
     reports_with_net = []
     for r in reports:
-        profit_data = calculate_profit_from_orders(db.session, r)
+        profit_data = order_profits[r.id]
         net_profit = profit_data['project_profit']
         if r.shift_type == 'morning':
             morning_profit += net_profit
@@ -1998,7 +1932,7 @@ def get_dashboard_data():
 
             
         except Exception as e:
-            print(f"[DASHBOARD] Ошибка расчета прибыли для отчета {r.id}: {e}")
+            stats_log.error("[DASHBOARD] Ошибка расчета прибыли для отчета %s: %s", r.id, e)
             report_profit = 0
             
         month_total_profit += report_profit
@@ -2023,6 +1957,71 @@ def get_dashboard_data():
     }
     return jsonify(dashboard)
 
+@app.route('/api/admin/profit-snapshots/recompute', methods=['POST'])
+def recompute_profit_snapshots():
+    """Пересчитывает снимки прибыли смен для аудита. Требует пароль администратора в JSON.
+
+    Необязательные фильтры: report_ids, start_date и end_date (YYYY-MM-DD).
+    Возвращает число пересчитанных отчетов и расхождения сохраненных снимков с пересчетом.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not validate_admin_password(data):
+            return jsonify({'error': 'Неверный пароль'}), 403
+        
+        query = ShiftReport.query
+        if data.get('report_ids'):
+            query = query.filter(ShiftReport.id.in_([int(report_id) for report_id in data['report_ids']]))
+        if data.get('start_date'):
+            query = query.filter(ShiftReport.shift_date >= datetime.strptime(data['start_date'], '%Y-%m-%d').date())
+        if data.get('end_date'):
+            query = query.filter(ShiftReport.shift_date <= datetime.strptime(data['end_date'], '%Y-%m-%d').date())
+        reports = query.order_by(ShiftReport.id).all()
+        
+        snapshots = {
+            snapshot.shift_report_id: snapshot
+            for snapshot in ShiftProfitSnapshot.query.filter(
+                ShiftProfitSnapshot.shift_report_id.in_(query.with_entities(ShiftReport.id))
+            )
+        }
+        order_profits = calculate_profit_from_orders_batch(db.session, reports)
+        now = datetime.utcnow()
+        mismatches = []
+        for report in reports:
+            snapshot = snapshots.get(report.id)
+            if snapshot is None:
+                snapshot = ShiftProfitSnapshot(shift_report_id=report.id, version=0)
+                db.session.add(snapshot)
+            actual = {
+                'order_profit_json': order_profits[report.id],
+                'report_profit_json': calculate_report_profit(db.session, report)
+            }
+            for field, value in actual.items():
+                stored = getattr(snapshot, field)
+                if stored and json.loads(stored) != value:
+                    mismatches.append({'report_id': report.id, 'field': field, 'stored': json.loads(stored), 'actual': value})
+                setattr(snapshot, field, json.dumps(value))
+            snapshot.computed_at = now
+        db.session.commit()
+        
+        if mismatches:
+            stats_log.warning("Пересчет снимков прибыли: расхождения у %s из %s отчетов", len({m['report_id'] for m in mismatches}), len(reports))
+        return jsonify({
+            'recomputed': len(reports),
+            'mismatches': mismatches
+        })
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка валидации данных: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка пересчета снимков прибыли: {str(e)}'}), 500
+
+@app.route('/api/result-cache/stats', methods=['GET'])
+def get_result_cache_stats():
+    """Попадания, промахи и вытеснения кэша результатов, текущие поколения таблиц"""
+    return jsonify(result_cache_info())
+
 @app.route('/api/settings/balances', methods=['GET', 'POST'])
 def settings_balances():
     """Получение и сохранение начальных балансов. POST требует пароль администратора."""
@@ -2268,9 +2267,16 @@ def get_btc_orders():
 
 @app.route('/api/orders', methods=['POST'])
 def create_order():
-    """Создает новый ордер от расширения Bybit"""
+    """Создает новый ордер от расширения Bybit.
+
+    Массив ордеров, {"orders": [...]} или NDJSON обрабатываются как пакет (см. create_orders_batch).
+    """
     try:
-        data = request.json
+        if request.mimetype in NDJSON_MIMETYPES:
+            return create_orders_batch()
+        data = request.get_json(silent=True)
+        if isinstance(data, list) or (isinstance(data, dict) and 'orders' in data):
+            return create_orders_batch()
         if not data:
             return jsonify({'error': 'Нет данных'}), 400
         
@@ -2320,100 +2326,443 @@ def create_order():
         db.session.rollback()
         return jsonify({'error': f'Ошибка создания ордера: {str(e)}'}), 500
 
+# --- ПАКЕТНАЯ ЗАГРУЗКА ОРДЕРОВ ОТ РАСШИРЕНИЯ ---
+
+ORDER_BATCH_MAX_ITEMS = 1000
+ORDER_BATCH_KEY_TTL_DAYS = 7
+ORDER_REQUIRED_FIELDS = ['order_id', 'employee_id', 'symbol', 'side', 'quantity', 'price']
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+def read_order_batch_body():
+    """Разбирает тело пакетного запроса: JSON массив, {"orders": [...]} или NDJSON.
+
+    Возвращает (items, idempotency_key); строки NDJSON, которые не удалось
+    разобрать, попадают в items как исключения и дают ошибку элемента.
+    """
+    idempotency_key = request.headers.get('Idempotency-Key')
+    raw = request.get_data(as_text=True) or ''
+    
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        for line in raw.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(e)
+        return items, idempotency_key
+    
+    data = json.loads(raw) if raw.strip() else None
+    if isinstance(data, dict):
+        idempotency_key = idempotency_key or data.get('idempotency_key')
+        data = data.get('orders')
+    if not isinstance(data, list):
+        raise ValueError('Ожидается массив ордеров')
+    return data, idempotency_key
+
+def normalize_batch_order(item):
+    """Проверяет ордер из пакета так же, как create_order, и приводит типы; при ошибке бросает ValueError"""
+    if isinstance(item, Exception):
+        raise ValueError(f'Некорректный JSON: {item}')
+    if not isinstance(item, dict):
+        raise ValueError('Ордер должен быть объектом')
+    for field in ORDER_REQUIRED_FIELDS:
+        if not item.get(field):
+            raise ValueError(f'Отсутствует обязательное поле: {field}')
+    if item.get('total_usdt') in (None, ''):
+        raise ValueError('Отсутствует обязательное поле: total_usdt')
+    try:
+        return {
+            'order_id': str(item['order_id']),
+            'employee_id': int(item['employee_id']),
+            'platform': item.get('platform', 'bybit'),
+            'account_name': item.get('account_name', ''),
+            'symbol': item['symbol'],
+            'side': item['side'],
+            'quantity': float(item['quantity']),
+            'price': float(item['price']),
+            'total_usdt': float(item['total_usdt']),  # Значение, введенное пользователем, без автовычислений
+            'fees_usdt': float(item.get('fees_usdt', 0)),
+            'status': item.get('status', 'filled'),
+            'count_in_sales': bool(item.get('count_in_sales', False)),
+            'count_in_purchases': bool(item.get('count_in_purchases', False)),
+            'executed_at': datetime.fromisoformat(item['executed_at']) if item.get('executed_at') else datetime.utcnow()
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Некорректное значение: {e}')
+
+def ingest_order_batch(items):
+    """Сохраняет пакет ордеров в текущей транзакции и возвращает ответ с результатом по каждому элементу.
+
+    Сотрудники проверяются одним запросом на пакет. Ордера пишет bulk_write_orders,
+    и created/duplicate берутся из ее результата. Коммит делает вызывающий код.
+    """
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        order_id = item.get('order_id') if isinstance(item, dict) else None
+        try:
+            valid.append((index, normalize_batch_order(item)))
+        except ValueError as e:
+            results.append({'index': index, 'order_id': order_id, 'status': 'error', 'error': str(e)})
+    
+    employee_ids = {order['employee_id'] for _, order in valid}
+    known_employees = {
+        employee_id for (employee_id,) in db.session.query(Employee.id).filter(Employee.id.in_(employee_ids))
+    } if employee_ids else set()
+    
+    new_rows = []
+    new_items = []
+    seen_ids = set()
+    for index, order in valid:
+        if order['employee_id'] not in known_employees:
+            results.append({'index': index, 'order_id': order['order_id'], 'status': 'error', 'error': 'Сотрудник не найден'})
+            continue
+        try:
+            row = order_insert_row(order, order['employee_id'], order['platform'], order['account_name'])
+        except ValueError as e:
+            results.append({'index': index, 'order_id': order['order_id'], 'status': 'error', 'error': str(e)})
+            continue
+        # Повтор order_id выше в этом же пакете
+        if order['order_id'] in seen_ids:
+            results.append({'index': index, 'order_id': order['order_id'], 'status': 'duplicate'})
+            continue
+        seen_ids.add(order['order_id'])
+        row['count_in_sales'] = order['count_in_sales']
+        row['count_in_purchases'] = order['count_in_purchases']
+        new_rows.append(row)
+        new_items.append((index, order['order_id'], order['platform']))
+    
+    # Дубли по order_id и по отпечатку BTC ордеров отсеивает сама запись: созданы
+    # только ордера, которые она вставила (inserted_ids), остальные - дубли
+    inserted_ids = bulk_write_orders(new_rows)['inserted_ids']
+    
+    # Идентификаторы созданных ордеров для ответа
+    created_ids = {}
+    new_order_ids = [order_id for _, order_id, _ in new_items if order_id in inserted_ids]
+    for i in range(0, len(new_order_ids), DEDUP_IN_CHUNK_SIZE):
+        chunk = new_order_ids[i:i + DEDUP_IN_CHUNK_SIZE]
+        created_ids.update(
+            ((order_id, platform), pk) for pk, order_id, platform in db.session.query(
+                Order.id, Order.order_id, Order.platform
+            ).filter(Order.order_id.in_(chunk))
+        )
+    for index, order_id, platform in new_items:
+        if (order_id, platform) in created_ids:
+            results.append({'index': index, 'order_id': order_id, 'status': 'created', 'id': created_ids[(order_id, platform)]})
+        else:
+            results.append({'index': index, 'order_id': order_id, 'status': 'duplicate'})
+    
+    results.sort(key=lambda result: result['index'])
+    statuses = Counter(result['status'] for result in results)
+    return {
+        'results': results,
+        'total': len(items),
+        'created': statuses['created'],
+        'duplicates': statuses['duplicate'],
+        'errors': statuses['error']
+    }
+
+@app.route('/api/orders/batch', methods=['POST'])
+def create_orders_batch():
+    """Создает пакет ордеров от расширения: JSON массив или NDJSON, одна транзакция.
+
+    Повтор запроса с тем же заголовком Idempotency-Key (или полем idempotency_key)
+    возвращает сохраненный ответ и ничего не пишет повторно.
+    """
+    try:
+        try:
+            items, idempotency_key = read_order_batch_body()
+        except ValueError as e:
+            return jsonify({'error': f'Некорректное тело запроса: {str(e)}'}), 400
+        
+        if not items:
+            return jsonify({'error': 'Нет данных'}), 400
+        if len(items) > ORDER_BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Слишком много ордеров в пакете (максимум {ORDER_BATCH_MAX_ITEMS})'}), 413
+        
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        if idempotency_key:
+            idempotency_key = str(idempotency_key)[:100]
+            stored = OrderBatchRequest.query.filter_by(idempotency_key=idempotency_key).first()
+            if stored:
+                if stored.request_hash != request_hash:
+                    return jsonify({'error': 'Ключ идемпотентности уже использован с другим телом запроса'}), 422
+                response = json.loads(stored.response_json)
+                response['replayed'] = True
+                return jsonify(response)
+        
+        response = ingest_order_batch(items)
+        response['idempotency_key'] = idempotency_key
+        
+        if idempotency_key:
+            # Ответ сохраняется в той же транзакции, что и ордера
+            OrderBatchRequest.query.filter(
+                OrderBatchRequest.created_at < datetime.utcnow() - timedelta(days=ORDER_BATCH_KEY_TTL_DAYS)
+            ).delete(synchronize_session=False)
+            db.session.add(OrderBatchRequest(
+                idempotency_key=idempotency_key,
+                request_hash=request_hash,
+                response_json=json.dumps(response, ensure_ascii=False)
+            ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Параллельный запрос с тем же ключом успел сохраниться первым - отдаем его ответ
+            db.session.rollback()
+            stored = OrderBatchRequest.query.filter_by(idempotency_key=idempotency_key).first() if idempotency_key else None
+            if not stored:
+                raise
+            response = json.loads(stored.response_json)
+            response['replayed'] = True
+            return jsonify(response)
+        
+        orders_log.info(
+            "Пакет ордеров: всего %s, создано %s, дублей %s, ошибок %s",
+            response['total'], response['created'], response['duplicates'], response['errors']
+        )
+        response['replayed'] = False
+        return jsonify(response)
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка пакетного создания ордеров: {str(e)}'}), 500
+
+# --- ФИЛЬТР ИЗВЕСТНЫХ ORDER_ID ДЛЯ РАСШИРЕНИЯ ---
+# Фильтр Блума: бит i выставлен в байте i >> 3 маской 1 << (i & 7). Индексы
+# (h1 + j * h2) % m, j = 0..k-1, где h1 и h2 - 32-битный FNV-1a от UTF-8 order_id
+# с разными начальными значениями. Расширение считает те же хеши (content.js,
+# KnownOrderFilter). Положительный ответ фильтра - только "вероятно есть", его
+# расширение уточняет через /api/orders/known-ids. Отрицательный ответ может
+# пропустить ордер, записанный после последнего обновления фильтра, - такой ордер
+# расширение отправит повторно, и сервер отсеет его как дубль.
+#
+# Инкрементальное обновление идет по updated_at, а не по id: строки получают id при
+# вставке, а видны становятся при коммите, поэтому ордер длинной транзакции (импорт
+# файла) может появиться с id меньше уже выданного курсора. Курсор - время сервера
+# на момент запроса, следующая дельта берет ордера с updated_at не раньше курсора
+# минус KNOWN_FILTER_OVERLAP; повтор ордеров в дельтах для OR безвреден.
+
+BLOOM_DEFAULT_FP_RATE = 0.01
+BLOOM_MIN_BITS = 1024
+BLOOM_MAX_BITS = 8 * 1024 * 1024  # 1 МБ
+BLOOM_MAX_HASHES = 16
+BLOOM_H1_SEED = 0x811c9dc5
+BLOOM_H2_SEED = 0x050c5d1f
+# Запас курсора: дольше этого транзакция записи ордеров не идет (ср. IMPORT_JOB_STALE_SECONDS)
+KNOWN_FILTER_OVERLAP = timedelta(minutes=15)
+# Полный фильтр строится с запасом на рост выборки, чтобы дельты не переполняли его сразу
+KNOWN_FILTER_GROWTH = 2
+
+def _fnv1a32(data, seed):
+    value = seed
+    for byte in data:
+        value ^= byte
+        value = (value * 0x01000193) & 0xffffffff
+    return value
+
+def bloom_size(count, fp_rate=BLOOM_DEFAULT_FP_RATE):
+    """Размер фильтра (m бит, k хешей) для count элементов с долей ложных срабатываний fp_rate"""
+    count = max(count, 1)
+    bits = math.ceil(-count * math.log(fp_rate) / (math.log(2) ** 2))
+    bits = min(max(bits, BLOOM_MIN_BITS), BLOOM_MAX_BITS)
+    bits = (bits + 7) // 8 * 8
+    hashes = min(max(round(bits / count * math.log(2)), 1), BLOOM_MAX_HASHES)
+    return bits, hashes
+
+def bloom_capacity(bits, fp_rate=BLOOM_DEFAULT_FP_RATE):
+    """Сколько элементов вмещает фильтр из bits бит без превышения доли ложных срабатываний fp_rate"""
+    return math.floor(bits * (math.log(2) ** 2) / -math.log(fp_rate))
+
+def build_bloom_filter(values, bits, hashes):
+    """Фильтр Блума из строк values как bytearray длиной bits / 8"""
+    filter_bytes = bytearray(bits // 8)
+    for value in values:
+        data = str(value).encode('utf-8')
+        h1 = _fnv1a32(data, BLOOM_H1_SEED)
+        h2 = _fnv1a32(data, BLOOM_H2_SEED) | 1
+        for j in range(hashes):
+            index = (h1 + j * h2) % bits
+            filter_bytes[index >> 3] |= 1 << (index & 7)
+    return filter_bytes
+
+@app.route('/api/orders/known-filter', methods=['GET'])
+def get_known_orders_filter():
+    """Фильтр Блума по order_id, которые уже есть на сервере (для сотрудника/аккаунта за период).
+
+    Параметры: employee_id (обязателен), account_name, platform, start_date, end_date (YYYY-MM-DD),
+    fp_rate. Для инкрементального обновления расширение передает since (cursor из прошлого
+    ответа) и размер своего фильтра m, k: в ответе будут ордера, записанные или измененные
+    начиная с since минус KNOWN_FILTER_OVERLAP, их биты объединяются с имеющимся фильтром
+    через OR. Если ордеров в выборке стало больше, чем фильтр размера m вмещает при fp_rate,
+    вместо дельты возвращается новый полный фильтр (incremental = false).
+    """
+    try:
+        employee_id = request.args.get('employee_id', type=int)
+        if not employee_id:
+            return jsonify({'error': 'Не указан employee_id'}), 400
+        account_name = request.args.get('account_name')
+        platform = request.args.get('platform')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        since = request.args.get('since')
+        fp_rate = min(max(request.args.get('fp_rate', BLOOM_DEFAULT_FP_RATE, type=float), 0.0001), 0.5)
+        
+        query = db.session.query(Order.order_id).filter(Order.employee_id == employee_id)
+        if account_name:
+            query = query.filter(Order.account_name == account_name)
+        if platform:
+            query = query.filter(Order.platform == platform)
+        if start_date:
+            query = query.filter(Order.executed_at >= datetime.strptime(start_date, '%Y-%m-%d'))
+        if end_date:
+            query = query.filter(Order.executed_at < datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+        
+        # Курсор берем до запроса: ордер, записанный во время построения, попадет в следующую дельту
+        cursor = datetime.utcnow()
+        incremental = since is not None
+        if incremental:
+            since = datetime.fromisoformat(since)
+            # Размер должен совпадать с фильтром расширения, иначе OR невозможен
+            bits = request.args.get('m', type=int)
+            hashes = request.args.get('k', type=int)
+            if not bits or not hashes or bits % 8 or bits > BLOOM_MAX_BITS or hashes > BLOOM_MAX_HASHES:
+                return jsonify({'error': 'Для инкрементального обновления нужны корректные m и k'}), 400
+            # Фильтр, переполненный сверх своего размера, теряет точность - строим заново
+            incremental = query.order_by(None).count() <= bloom_capacity(bits, fp_rate)
+        
+        if incremental:
+            rows = query.filter(Order.updated_at >= since - KNOWN_FILTER_OVERLAP).all()
+        else:
+            rows = query.all()
+            bits, hashes = bloom_size(len(rows) * KNOWN_FILTER_GROWTH, fp_rate)
+        
+        filter_bytes = build_bloom_filter((order_id for (order_id,) in rows), bits, hashes)
+        
+        return jsonify({
+            'm': bits,
+            'k': hashes,
+            'count': len(rows),
+            'capacity': bloom_capacity(bits, fp_rate),
+            'cursor': cursor.isoformat(),
+            'incremental': incremental,
+            'bits': base64.b64encode(bytes(filter_bytes)).decode('ascii'),
+            'generated_at': cursor.isoformat()
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': f'Некорректные параметры: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Ошибка построения фильтра: {str(e)}'}), 500
+
+@app.route('/api/orders/known-ids', methods=['POST'])
+def get_known_order_ids():
+    """Точная проверка: какие из переданных order_id уже есть на сервере (уточнение срабатываний фильтра)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        order_ids = [str(order_id) for order_id in data.get('order_ids', []) if order_id]
+        if len(order_ids) > ORDER_BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Слишком много order_id (максимум {ORDER_BATCH_MAX_ITEMS})'}), 413
+        existing = find_existing_order_ids(order_ids)
+        return jsonify({'known': [order_id for order_id in order_ids if order_id in existing]})
+    except Exception as e:
+        return jsonify({'error': f'Ошибка проверки ордеров: {str(e)}'}), 500
+
 @app.route('/api/orders/<int:order_id>', methods=['PUT'])
 def update_order(order_id):
     """Обновляет ордер"""
     try:
         data = request.json
-        print(f"DEBUG: Обновление ордера {order_id}")
-        print(f"DEBUG: Полученные данные: {data}")
+        orders_log.debug("Обновление ордера %s", order_id)
+        orders_log.debug("Полученные данные: %s", data)
         
         order = db.session.get(Order, order_id)
         
         if not order:
-            print(f"DEBUG: Ордер {order_id} не найден")
+            orders_log.debug("Ордер %s не найден", order_id)
             return jsonify({'error': 'Ордер не найден'}), 404
         
-        print(f"DEBUG: Текущий ордер: order_id={order.order_id}, platform={order.platform}, symbol={order.symbol}")
+        orders_log.debug("Текущий ордер: order_id=%s, platform=%s, symbol=%s", order.order_id, order.platform, order.symbol)
         
         # Обновляем все разрешенные поля
         if 'order_id' in data:
             # Проверяем, что новый order_id не конфликтует с существующим
             existing_order = Order.query.filter_by(order_id=data['order_id']).first()
             if existing_order and existing_order.id != order_id:
-                print(f"DEBUG: Конфликт order_id: {data['order_id']}")
+                orders_log.debug("Конфликт order_id: %s", data['order_id'])
                 return jsonify({'error': 'Ордер с таким ID уже существует'}), 409
-            print(f"DEBUG: Обновляем order_id с '{order.order_id}' на '{data['order_id']}'")
+            orders_log.debug("Обновляем order_id с '%s' на '%s'", order.order_id, data['order_id'])
             order.order_id = data['order_id']
         
         if 'employee_id' in data:
             # Проверяем, что сотрудник существует
             employee = db.session.get(Employee, data['employee_id'])
             if not employee:
-                print(f"DEBUG: Сотрудник {data['employee_id']} не найден")
+                orders_log.debug("Сотрудник %s не найден", data['employee_id'])
                 return jsonify({'error': 'Сотрудник не найден'}), 404
-            print(f"DEBUG: Обновляем employee_id с {order.employee_id} на {data['employee_id']}")
+            orders_log.debug("Обновляем employee_id с %s на %s", order.employee_id, data['employee_id'])
             order.employee_id = data['employee_id']
         
         if 'platform' in data:
-            print(f"DEBUG: Обновляем platform с '{order.platform}' на '{data['platform']}'")
+            orders_log.debug("Обновляем platform с '%s' на '%s'", order.platform, data['platform'])
             order.platform = data['platform']
         
         if 'account_name' in data:
-            print(f"DEBUG: Обновляем account_name с '{order.account_name}' на '{data['account_name']}'")
+            orders_log.debug("Обновляем account_name с '%s' на '%s'", order.account_name, data['account_name'])
             order.account_name = data['account_name']
         
         if 'symbol' in data:
-            print(f"DEBUG: Обновляем symbol с '{order.symbol}' на '{data['symbol']}'")
+            orders_log.debug("Обновляем symbol с '%s' на '%s'", order.symbol, data['symbol'])
             order.symbol = data['symbol']
         
         if 'side' in data:
-            print(f"DEBUG: Обновляем side с '{order.side}' на '{data['side']}'")
+            orders_log.debug("Обновляем side с '%s' на '%s'", order.side, data['side'])
             order.side = data['side']
         
         if 'quantity' in data:
-            print(f"DEBUG: Обновляем quantity с {order.quantity} на {data['quantity']}")
+            orders_log.debug("Обновляем quantity с %s на %s", order.quantity, data['quantity'])
             order.quantity = float(data['quantity'])
         
         if 'price' in data:
-            print(f"DEBUG: Обновляем price с {order.price} на {data['price']}")
+            orders_log.debug("Обновляем price с %s на %s", order.price, data['price'])
             order.price = float(data['price'])
         
         if 'total_usdt' in data:
-            print(f"DEBUG: Обновляем total_usdt с {order.total_usdt} на {data['total_usdt']}")
+            orders_log.debug("Обновляем total_usdt с %s на %s", order.total_usdt, data['total_usdt'])
             order.total_usdt = float(data['total_usdt'])
         
         if 'fees_usdt' in data:
-            print(f"DEBUG: Обновляем fees_usdt с {order.fees_usdt} на {data['fees_usdt']}")
+            orders_log.debug("Обновляем fees_usdt с %s на %s", order.fees_usdt, data['fees_usdt'])
             order.fees_usdt = float(data['fees_usdt'])
         
         if 'status' in data:
-            print(f"DEBUG: Обновляем status с '{order.status}' на '{data['status']}'")
+            orders_log.debug("Обновляем status с '%s' на '%s'", order.status, data['status'])
             order.status = data['status']
         
         if 'executed_at' in data:
-            print(f"DEBUG: Обновляем executed_at с {order.executed_at} на {data['executed_at']}")
+            orders_log.debug("Обновляем executed_at с %s на %s", order.executed_at, data['executed_at'])
             order.executed_at = datetime.fromisoformat(data['executed_at'])
         
         if 'count_in_sales' in data:
-            print(f"DEBUG: Обновляем count_in_sales с {order.count_in_sales} на {data['count_in_sales']}")
+            orders_log.debug("Обновляем count_in_sales с %s на %s", order.count_in_sales, data['count_in_sales'])
             order.count_in_sales = data['count_in_sales']
         
         if 'count_in_purchases' in data:
-            print(f"DEBUG: Обновляем count_in_purchases с {order.count_in_purchases} на {data['count_in_purchases']}")
+            orders_log.debug("Обновляем count_in_purchases с %s на %s", order.count_in_purchases, data['count_in_purchases'])
             order.count_in_purchases = data['count_in_purchases']
         
         # Обновляем время изменения
         order.updated_at = datetime.utcnow()
         
-        print(f"DEBUG: Сохраняем изменения в базу данных...")
+        orders_log.debug("Сохраняем изменения в базу данных...")
         db.session.commit()
         
-        print(f"DEBUG: Ордер успешно обновлен")
+        orders_log.debug("Ордер успешно обновлен")
         return jsonify({'message': 'Ордер успешно обновлен'})
         
     except Exception as e:
-        print(f"DEBUG: Ошибка обновления ордера: {str(e)}")
+        orders_log.error("Ошибка обновления ордера: %s", str(e))
         db.session.rollback()
         return jsonify({'error': f'Ошибка обновления ордера: {str(e)}'}), 500
 
@@ -2475,123 +2824,154 @@ def bulk_delete_orders():
         db.session.rollback()
         return jsonify({'error': f'Ошибка при массовом удалении: {str(e)}'}), 500
 
-@app.route('/api/orders/statistics', methods=['GET'])
-def get_orders_statistics():
-    """Возвращает статистику по ордерам"""
-    employee_id = request.args.get('employee_id')
-    platform = request.args.get('platform')
-    status = request.args.get('status')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    exclude_canceled = request.args.get('exclude_canceled', 'true').lower() == 'true'  # По умолчанию исключаем отмененные
+def _debug_sell_orders(employee_id, start_dt, end_dt, total_sales_rub, total_sales_usdt, scam_amount):
+    """Детальная отладка статистики для выявления удвоения USDT: читает ордера продаж поштучно"""
+    stats_log.debug("=== ДЕТАЛЬНАЯ ОТЛАДКА СТАТИСТИКИ ===")
     
-    query = Order.query
+    # Получаем все ордера продаж с нужными статусами
+    sales_statuses = ['filled', 'dokidka', 'appealed']
+    all_sell_orders_query = Order.query.filter(Order.side == 'sell').filter(Order.status.in_(sales_statuses))
+    
+    # Применяем фильтры по датам
+    if start_dt:
+        all_sell_orders_query = all_sell_orders_query.filter(Order.executed_at >= start_dt)
+    if end_dt:
+        all_sell_orders_query = all_sell_orders_query.filter(Order.executed_at < end_dt)
     
+    # Применяем фильтр по сотруднику
     if employee_id:
-        query = query.filter(Order.employee_id == int(employee_id))
-    if platform:
-        if platform == 'bybit_btc':
-            # Для BTC показываем только BTC-ордера
-            query = query.filter(Order.platform == 'bybit_btc')
-        else:
-            # Для остальных платформ (bybit, gate, bliss, htx) показываем общую статистику
-            # включаем все платформы кроме BTC
-            query = query.filter(Order.platform != 'bybit_btc')
-    else:
-        # Общая статистика: включаем все платформы кроме BTC
-        query = query.filter(Order.platform != 'bybit_btc')
-    if status:
-        query = query.filter(Order.status == status)
-    elif exclude_canceled:
-        # Если статус не указан явно, исключаем отмененные и неуспешные ордера
-        query = query.filter(~Order.status.in_(['canceled', 'expired', 'failed']))
-    if start_date:
-        query = query.filter(Order.executed_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        # Добавляем один день к end_date и используем строгое сравнение для включения всего дня
-        end_date_plus_one = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-        query = query.filter(Order.executed_at < end_date_plus_one)
+        all_sell_orders_query = all_sell_orders_query.filter(Order.employee_id == int(employee_id))
     
-    orders = query.all()
+    all_sell_orders = all_sell_orders_query.all()
+
+    stats_log.debug("Найдено %s ордеров продаж со статусами %s", len(all_sell_orders), sales_statuses)
+    stats_log.debug("Фильтры: employee_id=%s, start=%s, end=%s", employee_id, start_dt, end_dt)
     
-    # Если выбрана вкладка BTC, считаем отдельную сумму USDT по BTC-ордерам
-    btc_total_usdt = None
-    if platform == 'bybit_btc':
-        btc_total_usdt = sum(float(o.quantity) for o in orders)
+    # Проверяем на дубликаты
+    order_ids = [o.order_id for o in all_sell_orders]
+    unique_order_ids = set(order_ids)
+    stats_log.debug("Уникальных order_id: %s из %s", len(unique_order_ids), len(order_ids))
     
-    # Статистика
-    total_orders = len(orders)
-    total_volume_rub = sum(float(o.total_usdt) for o in orders)  # Общий объем RUB
-    total_volume_usdt = sum(float(o.quantity) for o in orders)  # Общий объем USDT
-    total_fees = sum(float(o.fees_usdt) for o in orders)
+    if len(order_ids) != len(unique_order_ids):
+        stats_log.warning("ВНИМАНИЕ! Обнаружены дубликаты ордеров!")
+        from collections import Counter
+        duplicates = Counter(order_ids)
+        for order_id, count in duplicates.items():
+            if count > 1:
+                stats_log.debug("Дубликат order_id=%s встречается %s раз", order_id, count)
     
-    # Статистика по статусам
-    status_stats = {}
-    for order in orders:
+    # Подсчитываем суммы по статусам
+    status_totals = {}
+    for order in all_sell_orders:
         status = order.status
-        if status not in status_stats:
-            status_stats[status] = 0
-        status_stats[status] += 1
-    
-    # Статистика по сторонам (buy/sell) - используем только завершенные ордера
-    completed_orders = [o for o in orders if o.status == 'filled']
-    buy_orders = [o for o in completed_orders if o.side == 'buy']
-    sell_orders = [o for o in completed_orders if o.side == 'sell']
+        if status not in status_totals:
+            status_totals[status] = {'rub': 0, 'usdt': 0, 'count': 0}
+        status_totals[status]['rub'] += float(order.total_usdt or 0)
+        status_totals[status]['usdt'] += float(order.quantity or 0)
+        status_totals[status]['count'] += 1
     
-    # Расчет объемов только для завершенных ордеров
-    buy_volume_rub = sum(float(o.total_usdt) for o in buy_orders)    # Сумма RUB для покупок
-    sell_volume_rub = sum(float(o.total_usdt) for o in sell_orders)  # Сумма RUB для продаж
-    buy_volume_usdt = sum(float(o.quantity) for o in buy_orders)     # Сумма USDT для покупок
-    sell_volume_usdt = sum(float(o.quantity) for o in sell_orders)   # Сумма USDT для продаж
+    stats_log.debug("Суммы по статусам:")
+    for status, totals in status_totals.items():
+        stats_log.debug("%s: RUB=%.2f, USDT=%.2f, count=%s", status, totals['rub'], totals['usdt'], totals['count'])
     
-    # Инициализируем переменную special_orders и заполняем её
-    special_statuses = ['dokidka', 'internal_transfer', 'appealed', 'scam']
-    special_orders_query = Order.query.filter(Order.status.in_(special_statuses))
+    stats_log.debug("Итоговые суммы:")
+    stats_log.debug("total_sales_rub = %.2f", total_sales_rub)
+    stats_log.debug("total_sales_usdt = %.2f", total_sales_usdt)
+    stats_log.debug("scam_amount = %s", scam_amount)
+    stats_log.debug("=== КОНЕЦ ОТЛАДКИ ===")
+
+@app.route('/api/orders/statistics', methods=['GET'])
+@cached_result('order', 'shift_report')
+def get_orders_statistics():
+    """Возвращает статистику по ордерам"""
+    employee_id = request.args.get('employee_id')
+    platform = request.args.get('platform')
+    status = request.args.get('status')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    exclude_canceled = request.args.get('exclude_canceled', 'true').lower() == 'true'  # По умолчанию исключаем отмененные
     
-    # Применяем фильтры по датам только если они указаны
-    if start_date:
-        special_orders_query = special_orders_query.filter(Order.executed_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        # Добавляем один день к end_date и используем строгое сравнение для включения всего дня
-        end_date_plus_one = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-        special_orders_query = special_orders_query.filter(Order.executed_at < end_date_plus_one)
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+    # Добавляем один день к end_date и используем строгое сравнение для включения всего дня
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date else None
     
-    # Если указан employee_id, фильтруем по сотруднику
-    if employee_id:
-        special_orders_query = special_orders_query.filter(Order.employee_id == int(employee_id))
+    # Суммы по дневным сводкам (сырые ордера - только для неполных дней)
+    order_totals = order_statistics_totals(start_dt, end_dt, int(employee_id) if employee_id else None)
     
-    # Применяем те же фильтры по платформе, что и для обычных ордеров
-    if platform:
+    def platform_matches(order_platform):
         if platform == 'bybit_btc':
             # Для BTC показываем только BTC-ордера
-            special_orders_query = special_orders_query.filter(Order.platform == 'bybit_btc')
-        else:
-            # Для остальных платформ (bybit, gate, bliss, htx) показываем общую статистику
-            # включаем все платформы кроме BTC
-            special_orders_query = special_orders_query.filter(Order.platform != 'bybit_btc')
-    else:
-        # Общая статистика: включаем все платформы кроме BTC
-        special_orders_query = special_orders_query.filter(Order.platform != 'bybit_btc')
+            return order_platform == 'bybit_btc'
+        # Для остальных платформ (bybit, gate, bliss, htx) и общей статистики
+        # включаем все платформы кроме BTC
+        return order_platform != 'bybit_btc'
     
-    special_orders = special_orders_query.all()
+    def status_matches(order_status):
+        if status:
+            return order_status == status
+        if exclude_canceled:
+            # Если статус не указан явно, исключаем отмененные и неуспешные ордера
+            return order_status not in ('canceled', 'expired', 'failed')
+        return True
     
-    # Добавляем покупки из специальных ордеров (с учетом чекбоксов)
+    special_statuses = ['dokidka', 'internal_transfer', 'appealed', 'scam']
+    
+    total_orders = 0
+    total_volume_rub = 0  # Общий объем RUB
+    total_volume_usdt = 0  # Общий объем USDT
+    status_stats = {}
+    # Объемы только для завершенных ордеров
+    buy_volume_rub = 0
+    sell_volume_rub = 0
+    buy_volume_usdt = 0
+    sell_volume_usdt = 0
+    # Специальные ордера (с учетом чекбоксов)
     special_buys_rub = 0
     special_buys_usdt = 0
+    special_sales_rub = 0
+    special_sales_usdt = 0
+    # Суммы специальных ордеров по чекбоксам, добавляются к суммам из отчетов
+    order_dokidka = 0
+    order_internal_transfer = 0
+    order_scam = 0
     
-    for order in special_orders:
-        if order.count_in_purchases:
-            order_amount_rub = float(order.total_usdt or 0)
-            order_amount_usdt = float(order.quantity or 0)
-            
-            if order.status == 'scam':
-                # Скам добавляем к покупкам
-                special_buys_rub += order_amount_rub
-                special_buys_usdt += order_amount_usdt
-            else:
-                # Остальные добавляем к покупкам
-                special_buys_rub += order_amount_rub
-                special_buys_usdt += order_amount_usdt
+    for (order_platform, side, order_status, count_in_sales, count_in_purchases), (count, amount_usdt, amount_rub) in order_totals.items():
+        if not platform_matches(order_platform):
+            continue
+        
+        if status_matches(order_status):
+            total_orders += count
+            total_volume_rub += amount_rub
+            total_volume_usdt += amount_usdt
+            status_stats[order_status] = status_stats.get(order_status, 0) + count
+            if order_status == 'filled':
+                if side == 'buy':
+                    buy_volume_rub += amount_rub
+                    buy_volume_usdt += amount_usdt
+                elif side == 'sell':
+                    sell_volume_rub += amount_rub
+                    sell_volume_usdt += amount_usdt
+        
+        if order_status in special_statuses:
+            # Учитываем в покупках если помечено: скам отдельно, остальные как внутренний перевод
+            if count_in_purchases:
+                special_buys_rub += amount_rub
+                special_buys_usdt += amount_usdt
+                if order_status == 'scam':
+                    order_scam += amount_usdt
+                else:
+                    order_internal_transfer += amount_usdt
+            # Учитываем в продажах если помечено: скам отдельно, остальные как докидка
+            if count_in_sales:
+                special_sales_rub += amount_rub
+                special_sales_usdt += amount_usdt
+                if order_status == 'scam':
+                    order_scam += amount_usdt
+                else:
+                    order_dokidka += amount_usdt
+    
+    # Если выбрана вкладка BTC, возвращаем отдельную сумму USDT по BTC-ордерам
+    btc_total_usdt = total_volume_usdt if platform == 'bybit_btc' else None
     
     # Общие покупки по формуле
     total_buys_rub = buy_volume_rub + special_buys_rub
@@ -2601,80 +2981,24 @@ def get_orders_statistics():
     avg_buy_rate = buy_volume_rub / buy_volume_usdt if buy_volume_usdt > 0 else 0
     avg_sell_rate = sell_volume_rub / sell_volume_usdt if sell_volume_usdt > 0 else 0
     
-    # Получаем значения докидки, внутреннего перевода и скама из отчетов
-    dokidka_amount = 0
-    internal_transfer_amount = 0
-    scam_amount = 0
-    
-    # Получаем данные из отчетов за указанный период (всех сотрудников или конкретного)
+    # Докидки, внутренние переводы и скамы из отчетов за период (всех сотрудников или конкретного)
+    report_totals_query = db.session.query(
+        func.sum(ShiftReport.dokidka_amount),
+        func.sum(ShiftReport.internal_transfer_amount),
+        func.sum(ShiftReport.scam_amount)
+    )
     if employee_id:
-        # Если указан employee_id, получаем отчеты только этого сотрудника
-        employee_reports_query = ShiftReport.query.filter(ShiftReport.employee_id == employee_id)
-    else:
-        # Если employee_id не указан, получаем отчеты всех сотрудников за период
-        employee_reports_query = ShiftReport.query
-    
-    # Применяем фильтры по датам только если они указаны
+        report_totals_query = report_totals_query.filter(ShiftReport.employee_id == employee_id)
     if start_date:
-        employee_reports_query = employee_reports_query.filter(ShiftReport.shift_date >= start_date)
+        report_totals_query = report_totals_query.filter(ShiftReport.shift_date >= start_date)
     if end_date:
-        employee_reports_query = employee_reports_query.filter(ShiftReport.shift_date <= end_date)
-    
-    employee_reports = employee_reports_query.all()
-    
-    # Суммируем докидки, внутренние переводы и скамы из отчетов
-    for report in employee_reports:
-        dokidka_amount += float(report.dokidka_amount or 0)
-        internal_transfer_amount += float(report.internal_transfer_amount or 0)
-        scam_amount += float(report.scam_amount or 0)
-    
-    # Суммируем суммы из ордеров с учетом чекбоксов
-    for order in special_orders:
-        order_amount = float(order.quantity or 0)
-        
-        # Учитываем в продажах если помечено
-        if order.count_in_sales:
-            if order.status == 'scam':
-                # Скам добавляем к продажам
-                scam_amount += order_amount
-            else:
-                # Остальные добавляем к продажам
-                dokidka_amount += order_amount
-        
-        # Учитываем в покупках если помечено
-        if order.count_in_purchases:
-            if order.status == 'scam':
-                # Скам добавляем к покупкам
-                scam_amount += order_amount
-            else:
-                # Остальные добавляем к покупкам
-                internal_transfer_amount += order_amount
+        report_totals_query = report_totals_query.filter(ShiftReport.shift_date <= end_date)
+    report_dokidka, report_internal_transfer, report_scam = report_totals_query.one()
     
-    # Добавляем докидки и внутренние переводы к общим продажам, вычитаем скам
-    total_sales_with_transfers = sell_volume_usdt + dokidka_amount + internal_transfer_amount - scam_amount
+    dokidka_amount = float(report_dokidka or 0) + order_dokidka
+    internal_transfer_amount = float(report_internal_transfer or 0) + order_internal_transfer
+    scam_amount = float(report_scam or 0) + order_scam
     
-    # Обычные продажи (завершенные)
-    sell_volume_rub = sum(float(o.total_usdt) for o in sell_orders)
-    sell_volume_usdt = sum(float(o.quantity) for o in sell_orders)
-
-    # Продажи из специальных ордеров (с учетом чекбоксов)
-    special_sales_rub = 0
-    special_sales_usdt = 0
-    
-    for order in special_orders:
-        if order.count_in_sales:
-            order_amount_rub = float(order.total_usdt or 0)
-            order_amount_usdt = float(order.quantity or 0)
-            
-            if order.status == 'scam':
-                # Скам добавляем к продажам
-                special_sales_rub += order_amount_rub
-                special_sales_usdt += order_amount_usdt
-            else:
-                # Остальные добавляем к продажам
-                special_sales_rub += order_amount_rub
-                special_sales_usdt += order_amount_usdt
-
     # Общие продажи по формуле
     total_sales_rub = sell_volume_rub + special_sales_rub
     total_sales_usdt = sell_volume_usdt + special_sales_usdt
@@ -2686,110 +3010,250 @@ def get_orders_statistics():
     profit_rub = total_buys_rub - total_sales_rub
 
     # Отладочная информация
-    print(f"DEBUG STATS: buy_volume_rub={buy_volume_rub}, special_buys_rub={special_buys_rub}")
-    print(f"DEBUG STATS: buy_volume_usdt={buy_volume_usdt}, special_buys_usdt={special_buys_usdt}")
-    print(f"DEBUG STATS: total_buys_rub={total_buys_rub}, total_buys_usdt={total_buys_usdt}")
-    print(f"DEBUG STATS: sell_volume_rub={sell_volume_rub}, special_sales_rub={special_sales_rub}")
-    print(f"DEBUG STATS: sell_volume_usdt={sell_volume_usdt}, special_sales_usdt={special_sales_usdt}")
-    print(f"DEBUG STATS: total_sales_rub={total_sales_rub}, total_sales_usdt={total_sales_usdt}")
-    
-    # --- ДЕТАЛЬНАЯ ОТЛАДКА ДЛЯ ВЫЯВЛЕНИЯ УДВОЕНИЯ USDT ---
-    print("\n=== ДЕТАЛЬНАЯ ОТЛАДКА СТАТИСТИКИ ===")
+    stats_log.debug("buy_volume_rub=%s, special_buys_rub=%s", buy_volume_rub, special_buys_rub)
+    stats_log.debug("buy_volume_usdt=%s, special_buys_usdt=%s", buy_volume_usdt, special_buys_usdt)
+    stats_log.debug("total_buys_rub=%s, total_buys_usdt=%s", total_buys_rub, total_buys_usdt)
+    stats_log.debug("sell_volume_rub=%s, special_sales_rub=%s", sell_volume_rub, special_sales_rub)
+    stats_log.debug("sell_volume_usdt=%s, special_sales_usdt=%s", sell_volume_usdt, special_sales_usdt)
+    stats_log.debug("total_sales_rub=%s, total_sales_usdt=%s", total_sales_rub, total_sales_usdt)
     
-    # Получаем все ордера продаж с нужными статусами
-    sales_statuses = ['filled', 'dokidka', 'appealed']
-    all_sell_orders_query = Order.query.filter(Order.side == 'sell').filter(Order.status.in_(sales_statuses))
+    if stats_log.isEnabledFor(logging.DEBUG):
+        _debug_sell_orders(employee_id, start_dt, end_dt, total_sales_rub, total_sales_usdt, scam_amount)
+
+    return jsonify({
+        'total_orders': total_orders,
+        'status_stats': status_stats,
+        'sell_volume': round(total_sales_rub, 2),
+        'buy_volume': round(total_buys_rub, 2),
+        'sell_volume_usdt': round(total_sales_usdt, 2),
+        'buy_volume_usdt': round(total_buys_usdt, 2),
+        'avg_sell_rate': round(avg_sell_rate, 2),
+        'avg_buy_rate': round(avg_buy_rate, 2),
+        'profit_usdt': round(profit_usdt, 2),
+        'profit_rub': round(profit_rub, 2),
+        'dokidka_amount': round(dokidka_amount, 2),
+        'internal_transfer_amount': round(internal_transfer_amount, 2),
+        'scam_amount': round(scam_amount, 2),
+        'total_volume_rub': round(total_volume_rub, 2),
+        'total_volume_usdt': round(total_volume_usdt, 2),
+        'btc_total_usdt': btc_total_usdt
+    })
+
+# --- ФОНОВЫЕ ЗАДАЧИ ИМПОРТА ---
+# Разбор файлов и запись ордеров выполняются в пуле потоков внутри процесса
+# приложения, HTTP запрос сразу получает job_id. Состояние задачи хранится в
+# таблице import_job и читается через GET /api/jobs/<job_id>. В режиме
+# IMPORT_JOBS_SYNC (тесты) задача выполняется прямо в запросе.
+
+IMPORT_JOB_STAGES = ('saved', 'parsed', 'deduped', 'inserted')
+IMPORT_JOB_STALE_SECONDS = 15 * 60  # Задача без обновлений дольше этого считается прерванной
+
+_import_executor = None
+_import_executor_lock = threading.Lock()
+
+class ImportJobProgress:
+    """Обновляет стадию и счетчики задачи импорта; каждое обновление сразу коммитится"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.counters = {}
+
+    def stage(self, stage, **counters):
+        self.counters.update(counters)
+        job = db.session.get(ImportJob, self.job_id)
+        if job is None:
+            return
+        job.stage = stage
+        job.counters_json = json.dumps(self.counters, ensure_ascii=False, default=str)
+        db.session.commit()
+        app_log.debug("Задача %s: стадия %s, %s", self.job_id, stage, self.counters)
+
+def _get_import_executor():
+    global _import_executor
+    with _import_executor_lock:
+        if _import_executor is None:
+            _import_executor = ThreadPoolExecutor(
+                max_workers=app.config.get('IMPORT_JOB_WORKERS', 2),
+                thread_name_prefix='import-job'
+            )
+        return _import_executor
+
+def _run_import_job(job_id, func, params):
+    """Выполняет задачу в своем контексте приложения и сохраняет результат или ошибку"""
+    with app.app_context():
+        try:
+            job = db.session.get(ImportJob, job_id)
+            job.status = 'running'
+            db.session.commit()
+            
+            result = func(ImportJobProgress(job_id), **params)
+            
+            job = db.session.get(ImportJob, job_id)
+            job.status = 'done'
+            job.result_json = json.dumps(result, ensure_ascii=False, default=str)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app_log.exception("Задача импорта %s завершилась ошибкой", job_id)
+            job = db.session.get(ImportJob, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.error = str(e)
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+def submit_import_job(kind, func, **params):
+    """Создает задачу импорта (стадия saved) и ставит func(progress, **params) в пул; возвращает job_id"""
+    job_id = uuid.uuid4().hex
+    db.session.add(ImportJob(id=job_id, kind=kind, status='queued', stage='saved', counters_json='{}'))
+    db.session.commit()
     
-    # Применяем фильтры по датам
-    if start_date:
-        all_sell_orders_query = all_sell_orders_query.filter(Order.executed_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        end_date_plus_one = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-        all_sell_orders_query = all_sell_orders_query.filter(Order.executed_at < end_date_plus_one)
+    if app.config.get('IMPORT_JOBS_SYNC'):
+        _run_import_job(job_id, func, params)
+    else:
+        _get_import_executor().submit(_run_import_job, job_id, func, params)
+    app_log.info("Задача импорта %s (%s) поставлена в очередь", job_id, kind)
+    return job_id
+
+def import_job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'stage': job.stage,
+        'stages': list(IMPORT_JOB_STAGES),
+        'counters': json.loads(job.counters_json or '{}'),
+        'result': json.loads(job.result_json) if job.result_json else None,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None
+    }
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    """Статус фоновой задачи импорта: стадия, счетчики, результат или ошибка"""
+    try:
+        job = db.session.get(ImportJob, job_id)
+        if not job:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        
+        # Задача, которая давно не обновлялась, прервана (например, перезапуском сервера)
+        if job.status in ('queued', 'running') and job.updated_at and \
+                (datetime.utcnow() - job.updated_at).total_seconds() > IMPORT_JOB_STALE_SECONDS:
+            job.status = 'failed'
+            job.error = 'Задача прервана: нет прогресса дольше допустимого времени'
+            db.session.commit()
+        
+        return jsonify(import_job_to_dict(job))
+    except Exception as e:
+        return jsonify({'error': f'Ошибка получения задачи: {str(e)}'}), 500
+
+def import_orders_file(progress, filepath, platform, start_date, end_date, original_filename,
+                       employee_id, account_name, on_duplicate='skip'):
+    """Разбирает сохраненный файл выгрузки и пишет ордера в БД (тело задачи 'orders_upload').
+
+    progress - ImportJobProgress: задача проходит стадии parsed, deduped, inserted.
+    Возвращает тот же словарь, что раньше возвращал /api/orders/upload.
+    """
+    # Обрабатываем файл с фильтрацией по времени, передаем оригинальное имя для определения типа
+    parse_info = {}
+    orders_data = parse_orders_file(filepath, platform, start_date, end_date, original_filename, parse_info)
+    orders_log.debug("Получено %s ордеров из файла", len(orders_data))
+    summary = parse_info.get('summary') or {}
+    progress.stage('parsed', rows_read=summary.get('rows_read', 0), parsed=len(orders_data))
     
-    # Применяем фильтр по сотруднику
-    if employee_id:
-        all_sell_orders_query = all_sell_orders_query.filter(Order.employee_id == int(employee_id))
+    # Сохраняем ордера в базу данных
+    new_rows = []
+    invalid_rows = []
     
-    all_sell_orders = all_sell_orders_query.all()
-
-    print(f"DEBUG: Найдено {len(all_sell_orders)} ордеров продаж со статусами {sales_statuses}")
-    print(f"DEBUG: Фильтры: employee_id={employee_id}, start_date={start_date}, end_date={end_date}")
+    # Существующие ордера ищем пачками IN-запросов, а не по одному на строку
+    existing_ids = find_existing_order_ids([order_data['order_id'] for order_data in orders_data], platform)
     
-    # Проверяем на дубликаты
-    order_ids = [o.order_id for o in all_sell_orders]
-    unique_order_ids = set(order_ids)
-    print(f"DEBUG: Уникальных order_id: {len(unique_order_ids)} из {len(order_ids)}")
+    for order_data in orders_data:
+        # Проверяем, что ордер еще не существует (в БД или выше в этом же файле)
+        if order_data['order_id'] in existing_ids and on_duplicate != 'update':
+            continue
+        existing_ids.add(order_data['order_id'])
+        
+        # Используем account_name из order_data, если есть
+        try:
+            new_rows.append(order_insert_row(
+                order_data, employee_id, platform, order_data.get('account_name') or account_name
+            ))
+        except ValueError as e:
+            invalid_rows.append({'order_id': order_data['order_id'], 'reason': 'invalid', 'value': str(e)})
+            continue
+        debug_sampled(orders_log, 'upload.created', "Создан ордер %s", order_data['order_id'])
+    if invalid_rows:
+        orders_log.warning("Пропущено %s некорректных ордеров, первый: %s", len(invalid_rows), invalid_rows[0])
+        record_rejects(parse_info, invalid_rows)
+    progress.stage('deduped', to_write=len(new_rows), invalid=len(invalid_rows),
+                   duplicates=len(orders_data) - len(new_rows) - len(invalid_rows))
     
-    if len(order_ids) != len(unique_order_ids):
-        print("DEBUG: ВНИМАНИЕ! Обнаружены дубликаты ордеров!")
-        from collections import Counter
-        duplicates = Counter(order_ids)
-        for order_id, count in duplicates.items():
-            if count > 1:
-                print(f"DEBUG: Дубликат order_id={order_id} встречается {count} раз")
+    # Существующие ордера попадают в пакет только при on_duplicate=update
+    write_counts = bulk_write_orders(new_rows, on_duplicate)
+    db.session.commit()
     
-    # Подсчитываем суммы по статусам
-    status_totals = {}
-    for order in all_sell_orders:
-        status = order.status
-        if status not in status_totals:
-            status_totals[status] = {'rub': 0, 'usdt': 0, 'count': 0}
-        status_totals[status]['rub'] += float(order.total_usdt or 0)
-        status_totals[status]['usdt'] += float(order.quantity or 0)
-        status_totals[status]['count'] += 1
+    created_count = write_counts['inserted']
+    skipped_count = len(orders_data) - len(invalid_rows) - created_count - write_counts['updated']
+    progress.stage('inserted', inserted=created_count, skipped=skipped_count, updated=write_counts['updated'])
     
-    print("DEBUG: Суммы по статусам:")
-    for status, totals in status_totals.items():
-        print(f"DEBUG: {status}: RUB={totals['rub']:.2f}, USDT={totals['usdt']:.2f}, count={totals['count']}")
+    # Формируем сообщение о результате
+    message = f'Загружено {created_count} ордеров, пропущено {skipped_count} дублей'
+    if invalid_rows:
+        message += f', отклонено {len(invalid_rows)} некорректных'
+    if write_counts['updated']:
+        message += f', обновлено {write_counts["updated"]}'
+    if start_date or end_date:
+        total_parsed = len(orders_data)
+        message += f', обработано {total_parsed} ордеров из файла'
+        if start_date:
+            message += f' с {start_date.strftime("%d.%m.%Y %H:%M")}'
+        if end_date:
+            message += f' по {end_date.strftime("%d.%m.%Y %H:%M")}'
     
-    print(f"DEBUG: Итоговые суммы:")
-    print(f"DEBUG: total_sales_rub = {total_sales_rub:.2f}")
-    print(f"DEBUG: total_sales_usdt = {total_sales_usdt:.2f}")
-    print(f"DEBUG: scam_amount = {scam_amount}")
-    print("=== КОНЕЦ ОТЛАДКИ ===\n")
-
-    return jsonify({
-        'total_orders': total_orders,
-        'status_stats': status_stats,
-        'sell_volume': round(total_sales_rub, 2),
-        'buy_volume': round(total_buys_rub, 2),
-        'sell_volume_usdt': round(total_sales_usdt, 2),
-        'buy_volume_usdt': round(total_buys_usdt, 2),
-        'avg_sell_rate': round(avg_sell_rate, 2),
-        'avg_buy_rate': round(avg_buy_rate, 2),
-        'profit_usdt': round(profit_usdt, 2),
-        'profit_rub': round(profit_rub, 2),
-        'dokidka_amount': round(dokidka_amount, 2),
-        'internal_transfer_amount': round(internal_transfer_amount, 2),
-        'scam_amount': round(scam_amount, 2),
-        'total_volume_rub': round(total_volume_rub, 2),
-        'total_volume_usdt': round(total_volume_usdt, 2),
-        'btc_total_usdt': btc_total_usdt
-    })
+    return {
+        'success': True,
+        'count': created_count,
+        'skipped': skipped_count,
+        'updated': write_counts['updated'],
+        'invalid': len(invalid_rows),
+        'total_parsed': len(orders_data),
+        'message': message,
+        'columns': parse_info.get('columns'),
+        'dialect': parse_info.get('dialect'),
+        'parse_summary': parse_info.get('summary'),
+        'rejects': parse_info.get('rejects', [])
+    }
 
 @app.route('/api/orders/upload', methods=['POST'])
 def upload_orders():
-    """Загружает ордера из файла Excel/CSV с фильтрацией по времени"""
+    """Принимает файл Excel/CSV с ордерами и ставит его разбор в очередь фоновых задач"""
     try:
         # Проверяем обязательные поля
         employee_id = request.form.get('employee_id')
         platform = request.form.get('platform')
         account_name = request.form.get('account_name')
+        # Что делать с уже загруженными ордерами: 'skip' (по умолчанию) или 'update'
+        on_duplicate = request.form.get('on_duplicate', 'skip')
         
         if not employee_id or not platform or not account_name:
             return jsonify({'error': 'Не указаны обязательные поля'}), 400
         
+        if on_duplicate not in ('skip', 'update'):
+            return jsonify({'error': 'on_duplicate должен быть skip или update'}), 400
+        
         # Получаем параметры фильтрации по времени
         start_date_str = request.form.get('start_date')
         end_date_str = request.form.get('end_date')
         
-        print(f"\nDEBUG UPLOAD: Параметры запроса:")
-        print(f"DEBUG UPLOAD: employee_id = {employee_id}")
-        print(f"DEBUG UPLOAD: platform = {platform}")
-        print(f"DEBUG UPLOAD: account_name = {account_name}")
-        print(f"DEBUG UPLOAD: start_date_str = {start_date_str}")
-        print(f"DEBUG UPLOAD: end_date_str = {end_date_str}")
+        orders_log.debug("Параметры запроса:")
+        orders_log.debug("employee_id = %s", employee_id)
+        orders_log.debug("platform = %s", platform)
+        orders_log.debug("account_name = %s", account_name)
+        orders_log.debug("start_date_str = %s", start_date_str)
+        orders_log.debug("end_date_str = %s", end_date_str)
         
         start_date = None
         end_date = None
@@ -2798,7 +3262,7 @@ def upload_orders():
         if start_date_str:
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%dT%H:%M')
-                print(f"DEBUG UPLOAD: start_date = {start_date}")
+                orders_log.debug("start_date = %s", start_date)
             except ValueError:
                 return jsonify({'error': 'Неверный формат начальной даты'}), 400
         
@@ -2806,7 +3270,7 @@ def upload_orders():
         if end_date_str:
             try:
                 end_date = datetime.strptime(end_date_str, '%Y-%m-%dT%H:%M')
-                print(f"DEBUG UPLOAD: end_date = {end_date}")
+                orders_log.debug("end_date = %s", end_date)
             except ValueError:
                 return jsonify({'error': 'Неверный формат конечной даты'}), 400
         
@@ -2854,66 +3318,21 @@ def upload_orders():
         filename = f"{timestamp}_{safe_name}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         
-        print(f"DEBUG UPLOAD: Сохраняем файл: {filepath}")
+        orders_log.debug("Сохраняем файл: %s", filepath)
         file.save(filepath)
         
-        # Обрабатываем файл с фильтрацией по времени, передаем оригинальное имя для определения типа
-        orders_data = parse_orders_file(filepath, platform, start_date, end_date, original_filename)
-        print(f"DEBUG UPLOAD: Получено {len(orders_data)} ордеров из файла")
-        
-        # Сохраняем ордера в базу данных
-        created_orders = []
-        skipped_orders = []
-        
-        for order_data in orders_data:
-            # Проверяем, что ордер еще не существует
-            existing_order = Order.query.filter_by(
-                order_id=order_data['order_id'],
-                platform=platform
-            ).first()
-            if existing_order:
-                skipped_orders.append(order_data['order_id'])
-                continue
-            
-            # Создаем новый ордер
-            order = Order(
-                order_id=order_data['order_id'],
-                employee_id=employee_id,
-                platform=platform,
-                account_name=order_data.get('account_name') or account_name,  # Используем account_name из order_data, если есть
-                symbol=order_data['symbol'],
-                side=order_data['side'],
-                quantity=order_data['quantity'],
-                price=order_data['price'],
-                total_usdt=order_data['total_usdt'],
-                fees_usdt=order_data.get('fees_usdt', 0),
-                status=order_data.get('status', 'filled'),
-                executed_at=order_data['executed_at']
-            )
-            
-            db.session.add(order)
-            created_orders.append(order_data['order_id'])
-            print(f"DEBUG UPLOAD: Создан ордер {order_data['order_id']}")
-        
-        db.session.commit()
-        
-        # Формируем сообщение о результате
-        message = f'Загружено {len(created_orders)} ордеров, пропущено {len(skipped_orders)} дублей'
-        if start_date or end_date:
-            total_parsed = len(orders_data)
-            message += f', обработано {total_parsed} ордеров из файла'
-            if start_date:
-                message += f' с {start_date.strftime("%d.%m.%Y %H:%M")}'
-            if end_date:
-                message += f' по {end_date.strftime("%d.%m.%Y %H:%M")}'
-        
+        # Разбор и запись ордеров идут в фоновой задаче, клиент опрашивает /api/jobs/<job_id>
+        job_id = submit_import_job(
+            'orders_upload', import_orders_file,
+            filepath=filepath, platform=platform, start_date=start_date, end_date=end_date,
+            original_filename=original_filename, employee_id=employee_id,
+            account_name=account_name, on_duplicate=on_duplicate
+        )
         return jsonify({
             'success': True,
-            'count': len(created_orders),
-            'skipped': len(skipped_orders),
-            'total_parsed': len(orders_data),
-            'message': message
-        })
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -2923,13 +3342,13 @@ def upload_orders():
 def get_platform_balances():
     """Возвращает текущие балансы по всем площадкам"""
     try:
-        # Получаем все отчеты, отсортированные по дате и ID
-        all_reports = ShiftReport.query.order_by(
+        # Самый свежий отчет - для информации о последнем обновлении
+        latest_report = ShiftReport.query.order_by(
             ShiftReport.shift_date.desc(), 
             ShiftReport.id.desc()
-        ).all()
+        ).first()
         
-        if not all_reports:
+        if not latest_report:
             return jsonify({
                 'platforms': [],
                 'total_balance': 0,
@@ -2938,43 +3357,42 @@ def get_platform_balances():
                 'message': 'Нет данных о балансах'
             })
         
-        # Собираем последние балансы для каждого аккаунта
-        account_balances = {}  # {platform: {account_name: {balance, last_update_info}}}
+        # Последний баланс каждого аккаунта берем из shift_report_balance:
+        # ROW_NUMBER() по (площадка, имя аккаунта) от самого свежего отчета
+        account_name_expr = func.coalesce(ShiftReportBalance.account_name, 'Неизвестный аккаунт')
+        ranked = db.session.query(
+            ShiftReportBalance.id.label('row_id'),
+            func.row_number().over(
+                partition_by=(ShiftReportBalance.platform, account_name_expr),
+                order_by=(ShiftReportBalance.shift_date.desc(), ShiftReportBalance.shift_report_id.desc(), ShiftReportBalance.id)
+            ).label('rn')
+        ).filter(
+            ShiftReportBalance.platform.in_(['bybit', 'htx', 'bliss', 'gate'])
+        ).subquery()
+        latest_rows = db.session.query(
+            ShiftReportBalance, account_name_expr, Employee.name
+        ).join(
+            ranked, ranked.c.row_id == ShiftReportBalance.id
+        ).outerjoin(
+            Employee, Employee.id == ShiftReportBalance.employee_id
+        ).filter(
+            ranked.c.rn == 1
+        ).order_by(
+            ShiftReportBalance.shift_date.desc(), ShiftReportBalance.shift_report_id.desc(), ShiftReportBalance.id
+        ).all()
         
-        for report in all_reports:
-            try:
-                balances = json.loads(report.balances_json or '{}')
-            except json.JSONDecodeError:
-                continue
-                
-            employee = db.session.get(Employee, report.employee_id)
-            employee_name = employee.name if employee else 'Неизвестный сотрудник'
-            
-            for platform in ['bybit', 'htx', 'bliss', 'gate']:
-                if platform not in account_balances:
-                    account_balances[platform] = {}
-                    
-                platform_accounts = balances.get(platform, [])
-                for acc in platform_accounts:
-                    account_name = acc.get('account_name', 'Неизвестный аккаунт')
-                    
-                    # Если для этого аккаунта ещё нет записи, добавляем её
-                    if account_name not in account_balances[platform]:
-                        try:
-                            balance_str = acc.get('end_balance', '0')
-                            balance = float(balance_str) if balance_str and balance_str != '' else 0.0
-                        except (ValueError, TypeError):
-                            balance = 0.0
-                            
-                        account_balances[platform][account_name] = {
-                            'balance': balance,
-                            'account_id': acc.get('account_id') or acc.get('id'),
-                            'last_update': {
-                                'date': report.shift_date.isoformat(),
-                                'shift_type': report.shift_type,
-                                'employee_name': employee_name
-                            }
-                        }
+        # Собираем последние балансы для каждого аккаунта
+        account_balances = {platform: {} for platform in ['bybit', 'htx', 'bliss', 'gate']}  # {platform: {account_name: {balance, last_update_info}}}
+        for row, account_name, employee_name in latest_rows:
+            account_balances[row.platform][account_name] = {
+                'balance': float(row.end_balance or 0),
+                'account_id': row.account_id,
+                'last_update': {
+                    'date': row.shift_date.isoformat(),
+                    'shift_type': row.shift_type,
+                    'employee_name': employee_name or 'Неизвестный сотрудник'
+                }
+            }
         
         # Формируем результат
         platform_stats = []
@@ -3017,7 +3435,6 @@ def get_platform_balances():
             })
         
         # Информация о последнем обновлении (из самого свежего отчета)
-        latest_report = all_reports[0]
         latest_employee = db.session.get(Employee, latest_report.employee_id)
         
         return jsonify({
@@ -3037,6 +3454,7 @@ def get_platform_balances():
         return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
 
 @app.route('/api/employee-profile/<int:employee_id>', methods=['GET'])
+@cached_result('order', 'shift_report', 'employee', 'account', 'initial_balance', 'shift_profit_snapshot')
 def get_employee_profile(employee_id):
     """Возвращает детальный профиль сотрудника с максимальным количеством показателей"""
     try:
@@ -3052,7 +3470,7 @@ def get_employee_profile(employee_id):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        print(f"[SEARCH] Ищем отчеты за период: {start_date} - {end_date}")
+        stats_log.debug("[SEARCH] Ищем отчеты за период: %s - %s", start_date, end_date)
         
         # Получаем сотрудника
         employee = Employee.query.get_or_404(employee_id)
@@ -3070,23 +3488,21 @@ def get_employee_profile(employee_id):
         ).order_by(ShiftReport.shift_date.desc()).all()
         
         # Отладочная информация
-        print(f"[PROFILE] Профиль сотрудника {employee.name} (ID: {employee_id})")
-        print(f"[PERIOD] Период: {start_date} - {end_date}")
-        print(f"[STATS] Всего отчетов у сотрудника: {len(all_reports)}")
+        stats_log.debug("[PROFILE] Профиль сотрудника %s (ID: %s)", employee.name, employee_id)
+        stats_log.debug("[PERIOD] Период: %s - %s", start_date, end_date)
+        stats_log.debug("[STATS] Всего отчетов у сотрудника: %s", len(all_reports))
         if all_reports:
-            print("[LIST] Все отчеты сотрудника:")
+            stats_log.debug("[LIST] Все отчеты сотрудника:")
             for r in all_reports:
-                print(f"   - {r.shift_date} ({r.shift_type}) - {r.total_requests} заявок")
-        print(f"[STATS] Найдено отчетов за период: {len(reports)}")
+                stats_log.debug("- %s (%s) - %s заявок", r.shift_date, r.shift_type, r.total_requests)
+        stats_log.debug("[STATS] Найдено отчетов за период: %s", len(reports))
         for i, report in enumerate(reports):
-            print(f"  [LIST] Отчет {i+1}: {report.shift_date} ({report.shift_type})")
-            print(f"    Всего заявок: {report.total_requests}")
-            print(f"    Bybit: {report.bybit_requests}, HTX: {report.htx_requests}, Bliss: {report.bliss_requests}")
-            print(f"    Балансы JSON: {report.balances_json[:100]}...")
-            profit_data = calculate_profit_from_orders(db.session, report)
-            print(f"    Прибыль: {profit_data}")
-            print(f"    Скам: {report.scam_amount}, Докидка: {report.dokidka_amount}")
-            print("    ---")
+            stats_log.debug("[LIST] Отчет %s: %s (%s)", i+1, report.shift_date, report.shift_type)
+            stats_log.debug("Всего заявок: %s", report.total_requests)
+            stats_log.debug("Bybit: %s, HTX: %s, Bliss: %s", report.bybit_requests, report.htx_requests, report.bliss_requests)
+            stats_log.debug("Балансы JSON: %s...", report.balances_json[:100])
+            stats_log.debug("Скам: %s, Докидка: %s", report.scam_amount, report.dokidka_amount)
+            stats_log.debug("---")
         
         # Автоматически привязываем ордера к отчетам сотрудника
         from utils import link_orders_to_employee
@@ -3096,10 +3512,10 @@ def get_employee_profile(employee_id):
                 linked_count = link_orders_to_employee(db.session, report)
                 total_linked += linked_count
                 if linked_count > 0:
-                    print(f"[LINK] Привязано {linked_count} ордеров к отчету от {report.shift_date}")
+                    stats_log.debug("[LINK] Привязано %s ордеров к отчету от %s", linked_count, report.shift_date)
         
         if total_linked > 0:
-            print(f"[LINK] Всего привязано {total_linked} ордеров к отчетам сотрудника")
+            stats_log.debug("[LINK] Всего привязано %s ордеров к отчетам сотрудника", total_linked)
         
         # Получаем все ордера сотрудника за период
         orders = Order.query.filter(
@@ -3108,67 +3524,71 @@ def get_employee_profile(employee_id):
             Order.executed_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
         ).all()
         
-        print("[WORK] Начинаем расчет основной статистики...")
+        stats_log.debug("[WORK] Начинаем расчет основной статистики...")
         try:
             # Основная статистика
             basic_stats = calculate_employee_statistics(reports, employee, db)
-            print(f"[OK] Основная статистика: {basic_stats}")
+            stats_log.debug("[OK] Основная статистика: %s", basic_stats)
         except Exception as e:
-            print(f"[ERROR] Ошибка при расчете основной статистики: {str(e)}")
+            stats_log.error("Ошибка при расчете основной статистики: %s", str(e))
             import traceback
             traceback.print_exc()
             basic_stats = {}
         
-        print("[WORK] Начинаем расчет детальной статистики по отчетам...")
+        stats_log.debug("[WORK] Начинаем расчет детальной статистики по отчетам...")
         # Детальная статистика по отчетам
         report_details = []
         total_project_profit = 0
         total_salary_profit = 0
         platform_profits = {'bybit': 0, 'htx': 0, 'bliss': 0, 'gate': 0}
         
+        # Прибыль по ордерам для всех смен периода - из снимков (после привязки ордеров)
+        order_profits = get_order_profits(db.session, reports)
+        timeline = get_balance_timeline(db.session)
+        
         for i, report in enumerate(reports):
-            print(f"[WORK] Обрабатываем отчет {i+1}/{len(reports)}: {report.shift_date}")
+            stats_log.debug("[WORK] Обрабатываем отчет %s/%s: %s", i+1, len(reports), report.shift_date)
             try:
-                profit_data = calculate_profit_from_orders(db.session, report)
-                print(f"[OK] Прибыль рассчитана: {profit_data}")
+                profit_data = order_profits[report.id]
+                stats_log.debug("[OK] Прибыль рассчитана: %s", profit_data)
                 total_project_profit += profit_data['project_profit']
                 total_salary_profit += profit_data['salary_profit']
             except Exception as e:
-                print(f"[ERROR] Ошибка при расчете прибыли для отчета {report.shift_date}: {str(e)}")
+                stats_log.error("Ошибка при расчете прибыли для отчета %s: %s", report.shift_date, str(e))
                 import traceback
                 traceback.print_exc()
                 profit_data = {'project_profit': 0, 'salary_profit': 0, 'profit': 0, 'scam': 0, 'dokidka': 0, 'internal': 0}
             
             # Парсим балансы
-            print(f"[WORK] Парсим балансы для отчета {report.shift_date}...")
+            stats_log.debug("[WORK] Парсим балансы для отчета %s...", report.shift_date)
             try:
                 balances = json.loads(report.balances_json or '{}')
-                print(f"[OK] Балансы распарсены: {len(balances)} платформ")
+                stats_log.debug("[OK] Балансы распарсены: %s платформ", len(balances))
             except Exception as e:
-                print(f"[ERROR] Ошибка при парсинге балансов: {str(e)}")
+                stats_log.error("Ошибка при парсинге балансов: %s", str(e))
                 balances = {}
             
             # Считаем прибыль по платформам
-            print(f"[WORK] Считаем прибыль по платформам...")
+            stats_log.debug("[WORK] Считаем прибыль по платформам...")
             platform_deltas = {}
             try:
                 for platform in ['bybit', 'htx', 'bliss', 'gate']:
                     accounts_list = balances.get(platform, [])
                     delta = 0
                     for acc in accounts_list:
-                        prev = find_prev_balance(db.session, acc.get('account_id') or acc.get('id'), platform, report)
+                        prev = timeline.prev_balance(acc.get('account_id') or acc.get('id'), platform, report)
                         cur = float(acc.get('balance', 0)) if acc.get('balance') not in (None, '') else 0
                         delta += cur - prev
                     platform_deltas[platform] = delta
                     platform_profits[platform] += delta
-                print(f"[OK] Прибыль по платформам рассчитана: {platform_deltas}")
+                stats_log.debug("[OK] Прибыль по платформам рассчитана: %s", platform_deltas)
             except Exception as e:
-                print(f"[ERROR] Ошибка при расчете прибыли по платформам: {str(e)}")
+                stats_log.error("Ошибка при расчете прибыли по платформам: %s", str(e))
                 import traceback
                 traceback.print_exc()
                 platform_deltas = {'bybit': 0, 'htx': 0, 'bliss': 0, 'gate': 0}
             
-            print(f"[WORK] Формируем детали отчета...")
+            stats_log.debug("[WORK] Формируем детали отчета...")
             try:
                 report_details.append({
                     'id': report.id,
@@ -3187,14 +3607,14 @@ def get_employee_profile(employee_id):
                     'platform_deltas': platform_deltas,
                     'balances': balances
                 })
-                print(f"[OK] Детали отчета добавлены")
+                stats_log.debug("[OK] Детали отчета добавлены")
             except Exception as e:
-                print(f"[ERROR] Ошибка при формировании деталей отчета: {str(e)}")
+                stats_log.error("Ошибка при формировании деталей отчета: %s", str(e))
                 import traceback
                 traceback.print_exc()
         
-        print("[WORK] Начинаем расчет статистики по ордерам...")
-        print(f"[WORK] Найдено ордеров: {len(orders)}")
+        stats_log.debug("[WORK] Начинаем расчет статистики по ордерам...")
+        stats_log.debug("[WORK] Найдено ордеров: %s", len(orders))
         
         # Рассчитываем статистику на основе привязанных ордеров
         from utils import calculate_shift_stats_from_orders
@@ -3203,7 +3623,6 @@ def get_employee_profile(employee_id):
         # Пересчитываем прибыль используя ту же логику, что и в API статистики ордеров
         # Прибыль = покупки - продажи (из ордеров)
         # Получаем все ордера за период для данного сотрудника
-        from datetime import datetime, timedelta
         
         # Получаем ордера покупок
         buy_orders = Order.query.filter(
@@ -3315,7 +3734,7 @@ def get_employee_profile(employee_id):
             'special_orders_count': len([o for o in orders if o.status in ['scam', 'dokidka', 'internal_transfer', 'appealed']])
         })
         
-        print("[WORK] Начинаем расчет временной статистики...")
+        stats_log.debug("[WORK] Начинаем расчет временной статистики...")
         # Временная статистика
         time_stats = {}
         try:
@@ -3330,25 +3749,25 @@ def get_employee_profile(employee_id):
                     'active_days': len(set(r.shift_date for r in reports)),
                     'activity_ratio': len(set(r.shift_date for r in reports)) / ((last_report.shift_date - first_report.shift_date).days + 1)
                 }
-            print("[OK] Временная статистика рассчитана")
+            stats_log.debug("[OK] Временная статистика рассчитана")
         except Exception as e:
-            print(f"[ERROR] Ошибка при расчете временной статистики: {str(e)}")
+            stats_log.error("Ошибка при расчете временной статистики: %s", str(e))
             import traceback
             traceback.print_exc()
             time_stats = {}
         
-        print("[WORK] Начинаем расчет статистики по типам смен...")
+        stats_log.debug("[WORK] Начинаем расчет статистики по типам смен...")
         # Статистика по типам смен
         try:
             shift_stats = {
                 'morning_shifts': len([r for r in reports if r.shift_type == 'morning']),
                 'evening_shifts': len([r for r in reports if r.shift_type == 'evening']),
-                'morning_profit': sum(calculate_profit_from_orders(db.session, r)['salary_profit'] for r in reports if r.shift_type == 'morning'),
-                'evening_profit': sum(calculate_profit_from_orders(db.session, r)['salary_profit'] for r in reports if r.shift_type == 'evening')
+                'morning_profit': sum(order_profits[r.id]['salary_profit'] for r in reports if r.shift_type == 'morning'),
+                'evening_profit': sum(order_profits[r.id]['salary_profit'] for r in reports if r.shift_type == 'evening')
             }
-            print("[OK] Статистика по типам смен рассчитана")
+            stats_log.debug("[OK] Статистика по типам смен рассчитана")
         except Exception as e:
-            print(f"[ERROR] Ошибка при расчете статистики по типам смен: {str(e)}")
+            stats_log.error("Ошибка при расчете статистики по типам смен: %s", str(e))
             import traceback
             traceback.print_exc()
             shift_stats = {
@@ -3358,7 +3777,7 @@ def get_employee_profile(employee_id):
                 'evening_profit': 0
             }
         
-        print("[WORK] Начинаем расчет средних показателей...")
+        stats_log.debug("[WORK] Начинаем расчет средних показателей...")
         # Средние показатели
         avg_stats = {}
         try:
@@ -3371,21 +3790,21 @@ def get_employee_profile(employee_id):
                     'avg_htx_per_shift': sum(r.htx_requests or 0 for r in reports) / len(reports),
                     'avg_bliss_per_shift': sum(r.bliss_requests or 0 for r in reports) / len(reports)
                 }
-            print("[OK] Средние показатели рассчитаны")
+            stats_log.debug("[OK] Средние показатели рассчитаны")
         except Exception as e:
-            print(f"[ERROR] Ошибка при расчете средних показателей: {str(e)}")
+            stats_log.error("Ошибка при расчете средних показателей: %s", str(e))
             import traceback
             traceback.print_exc()
             avg_stats = {}
         
-        print("[WORK] Начинаем расчет лучших и худших показателей...")
+        stats_log.debug("[WORK] Начинаем расчет лучших и худших показателей...")
         # Лучшие и худшие показатели
         best_worst = {}
         try:
             if reports:
-                profits = [calculate_profit_from_orders(db.session, r)['salary_profit'] for r in reports]
-                best_report = max(reports, key=lambda r: calculate_profit_from_orders(db.session, r)['salary_profit'])
-                worst_report = min(reports, key=lambda r: calculate_profit_from_orders(db.session, r)['salary_profit'])
+                profits = [order_profits[r.id]['salary_profit'] for r in reports]
+                best_report = max(reports, key=lambda r: order_profits[r.id]['salary_profit'])
+                worst_report = min(reports, key=lambda r: order_profits[r.id]['salary_profit'])
                 
                 best_worst = {
                     'best_profit': {
@@ -3403,14 +3822,14 @@ def get_employee_profile(employee_id):
                         'date': max(reports, key=lambda r: r.total_requests or 0).shift_date.isoformat()
                     }
                 }
-            print("[OK] Лучшие и худшие показатели рассчитаны")
+            stats_log.debug("[OK] Лучшие и худшие показатели рассчитаны")
         except Exception as e:
-            print(f"[ERROR] Ошибка при расчете лучших и худших показателей: {str(e)}")
+            stats_log.error("Ошибка при расчете лучших и худших показателей: %s", str(e))
             import traceback
             traceback.print_exc()
             best_worst = {}
         
-        print("[WORK] Формируем итоговый профиль...")
+        stats_log.debug("[WORK] Формируем итоговый профиль...")
         # Формируем итоговый профиль
         try:
             profile = {
@@ -3436,11 +3855,11 @@ def get_employee_profile(employee_id):
                 'platform_profits': platform_profits
             }
             
-            print("[OK] Итоговый профиль сформирован")
-            print("[WORK] Отправляем ответ...")
+            stats_log.debug("[OK] Итоговый профиль сформирован")
+            stats_log.debug("[WORK] Отправляем ответ...")
             return jsonify(profile)
         except Exception as e:
-            print(f"[ERROR] Ошибка при формировании итогового профиля: {str(e)}")
+            stats_log.error("Ошибка при формировании итогового профиля: %s", str(e))
             import traceback
             traceback.print_exc()
             return jsonify({'error': str(e)}), 500
@@ -3497,41 +3916,41 @@ def process_shift_files(report_id, employee_id, shift_start_time, shift_end_time
                 continue
                 
             try:
-                print(f"Обрабатываем файл {platform}: {file_path}")
+                shift_log.info("Обрабатываем файл %s: %s", platform, file_path)
                 
                 # Проверяем, есть ли у сотрудника аккаунты на этой платформе
                 # Для bybit_btc используем те же аккаунты что и для bybit
                 actual_platform = 'bybit' if platform == 'bybit_btc' else platform
                 if actual_platform not in platform_accounts:
-                    print(f"У сотрудника нет аккаунтов на платформе {actual_platform}")
+                    shift_log.info("У сотрудника нет аккаунтов на платформе %s", actual_platform)
                     continue
                 
-                # Обрабатываем файл для каждого аккаунта на этой платформе
+                # Разбираем файл один раз и распределяем ордера по всем аккаунтам платформы
                 # Для bybit_btc используем аккаунты bybit
                 target_platform = 'bybit' if platform == 'bybit_btc' else platform
-                for account_id in platform_accounts[target_platform]:
-                    account_stats = process_platform_file(
-                        file_path,
-                        platform,  # Передаем оригинальную платформу (bybit_btc)
-                        [account_id],  # Передаем только один аккаунт
-                        shift_start_time,
-                        shift_end_time,
-                        report_id,
-                        employee_id
-                    )
-                    
-                    stats['total_orders'] += account_stats.get('total_orders', 0)
-                    stats['linked_orders'] += account_stats.get('linked_orders', 0)
+                account_stats = process_platform_file(
+                    file_path,
+                    platform,  # Передаем оригинальную платформу (bybit_btc)
+                    platform_accounts[target_platform],
+                    shift_start_time,
+                    shift_end_time,
+                    report_id,
+                    employee_id
+                )
+                
+                stats['total_orders'] += account_stats.get('total_orders', 0)
+                stats['linked_orders'] += account_stats.get('linked_orders', 0)
+                stats['errors'].extend(account_stats.get('errors', []))
                 
                 if platform not in stats['platforms_processed']:
                     stats['platforms_processed'].append(platform)
                 
-                print(f"Обработано {stats['total_orders']} ордеров для {platform}, создано {stats['linked_orders']} новых")
+                shift_log.info("Обработано %s ордеров для %s, создано %s новых", stats['total_orders'], platform, stats['linked_orders'])
                 
             except Exception as e:
                 error_msg = f"Ошибка обработки файла {platform}: {str(e)}"
                 stats['errors'].append(error_msg)
-                print(error_msg)
+                shift_log.error("%s", error_msg)
                 continue
         
         return stats
@@ -3619,7 +4038,7 @@ def validate_shift_time_and_files(shift_start_time, shift_end_time, files_data,
         
         # Проверяем содержимое файла
         try:
-            orders_data = parse_orders_file(
+            orders_data = parse_orders_file_cached(
                 file_path, 
                 platform, 
                 shift_start_time, 
@@ -3725,9 +4144,131 @@ def validate_shift():
     except Exception as e:
         return jsonify({'error': f'Ошибка валидации: {str(e)}'}), 500
 
+def process_shift_report_files(progress, report_id, employee_id, selected_accounts, saved_files, save_errors,
+                               shift_start_dt, shift_end_dt, stats=None):
+    """Разбирает сохраненные файлы выгрузок отчета смены и привязывает ордера (тело задачи 'shift_files').
+
+    saved_files: {(площадка файла, account_id): путь}, save_errors: {(площадка файла, account_id): текст ошибки}.
+    stats - статистика, уже набранная при создании отчета (ручные суммы Gate); к ней
+    добавляется обработка файлов. Возвращает итоговую статистику отчета.
+    """
+    stats = copy.deepcopy(stats) if stats else {
+        'total_orders': 0,
+        'linked_orders': 0,
+        'platforms_processed': [],
+        'errors': []
+    }
+    
+    # Файлы разбираем параллельно; запись ордеров в БД ниже идет по порядку площадок и аккаунтов
+    prefetch_parsed_files(
+        [(file_path, file_platform) for (file_platform, _), file_path in saved_files.items()],
+        shift_start_dt,
+        shift_end_dt
+    )
+    progress.stage('parsed', files=len(saved_files), files_done=0, total_orders=0, linked_orders=0)
+    
+    files_done = 0
+    for platform in ['bybit', 'htx', 'bliss']:
+        if not selected_accounts.get(platform):
+            continue
+        platform_stats = {
+            'total_orders': 0,
+            'linked_orders': 0,
+            'errors': []
+        }
+        
+        for account_id in selected_accounts[platform]:
+            file_jobs = [(platform, 'файла ' + platform)]
+            if platform == 'bybit':
+                # BTC файлы для Bybit (если есть)
+                file_jobs.append(('bybit_btc', 'BTC файла'))
+            for file_platform, file_label in file_jobs:
+                try:
+                    if (file_platform, account_id) in save_errors:
+                        raise Exception(save_errors[(file_platform, account_id)])
+                    file_path = saved_files.get((file_platform, account_id))
+                    if not file_path:
+                        continue
+                    
+                    shift_log.info("Обрабатываем файл %s для аккаунта %s: %s", file_platform, account_id, file_path)
+                    
+                    # Обрабатываем файл и привязываем ордера для конкретного аккаунта
+                    account_stats = process_platform_file(
+                        file_path, 
+                        file_platform, 
+                        [account_id],  # Передаем только один аккаунт
+                        shift_start_dt, 
+                        shift_end_dt,
+                        report_id,
+                        employee_id
+                    )
+                    
+                    platform_stats['total_orders'] += account_stats.get('total_orders', 0)
+                    platform_stats['linked_orders'] += account_stats.get('linked_orders', 0)
+                    
+                    if account_stats.get('errors'):
+                        platform_stats['errors'].extend(account_stats['errors'])
+                    
+                except Exception as e:
+                    error_msg = f'Ошибка обработки {file_label} для аккаунта {account_id}: {str(e)}'
+                    platform_stats['errors'].append(error_msg)
+                    shift_log.error("%s", error_msg)
+                
+                files_done += 1
+                progress.stage(
+                    'inserted', files_done=files_done,
+                    total_orders=stats['total_orders'] + platform_stats['total_orders'],
+                    linked_orders=stats['linked_orders'] + platform_stats['linked_orders']
+                )
+        
+        # Обновляем общую статистику
+        stats['total_orders'] += platform_stats['total_orders']
+        stats['linked_orders'] += platform_stats['linked_orders']
+        
+        if platform_stats['total_orders'] > 0 or platform_stats['linked_orders'] > 0:
+            stats['platforms_processed'].append(platform.upper())
+        
+        if platform_stats['errors']:
+            stats['errors'].extend(platform_stats['errors'])
+    
+    return stats
+
+def build_shift_special_order(report, kind, status, created_ts, amount_usdt, amount_rub, platform, account_name,
+                              count_in_sales, count_in_purchases):
+    """Служебный ордер отчета смены (апелляция, докидка, скам, внутренний перевод).
+
+    Ордер не добавляется в сессию - это делает create_shift_report одним коммитом.
+    """
+    amount_usdt = float(amount_usdt)
+    amount_rub = float(amount_rub) if amount_rub else 0
+    # Курс из рублевой суммы, иначе 1.0
+    price = amount_rub / amount_usdt if amount_rub > 0 and amount_usdt > 0 else 1.0
+    return Order(
+        order_id=f"{kind}_{report.id}_{created_ts}",
+        employee_id=report.employee_id,
+        platform=platform,
+        account_name=account_name,
+        symbol='USDT',
+        side='sell',  # Служебные ордера учитываются как продажа
+        quantity=amount_usdt,
+        price=price,
+        total_usdt=amount_rub if amount_rub > 0 else amount_usdt,
+        fees_usdt=0,
+        status=status,
+        count_in_sales=count_in_sales,  # Учитываем в продажах если установлен чекбокс
+        count_in_purchases=count_in_purchases,  # Учитываем в покупках если установлен чекбокс
+        executed_at=report.shift_start_time  # Используем время начала смены
+    )
+
 @app.route('/api/reports/create-shift', methods=['POST'])
 def create_shift_report():
-    """Создает отчёт по смене с автоматической обработкой файлов выгрузок"""
+    """
+    Создает отчёт по смене с автоматической обработкой файлов выгрузок.
+
+    Файлы выгрузок обрабатываются в фоновой задаче: тогда в ответе есть job_id и
+    status_url, а stats = null - статистика обработки приходит в result задачи.
+    Без файлов задача не создается и stats возвращается сразу.
+    """
     try:
         # Получаем данные из формы
         employee_id = request.form.get('employee_id')
@@ -3756,7 +4297,7 @@ def create_shift_report():
         try:
             shift_start_dt = datetime.strptime(shift_start_time, '%Y-%m-%dT%H:%M')
             shift_end_dt = datetime.strptime(shift_end_time, '%Y-%m-%dT%H:%M')
-            print(f"DEBUG SHIFT: Время смены (МСК): {shift_start_dt} - {shift_end_dt}")
+            shift_log.debug("Время смены (МСК): %s - %s", shift_start_dt, shift_end_dt)
         except ValueError:
             return jsonify({'error': 'Неверный формат времени'}), 400
         
@@ -3811,8 +4352,8 @@ def create_shift_report():
         )
         
         # Отладочная информация для чекбоксов аппеляций
-        print(f"[REPORT] appeal_count_in_sales = {request.form.get('appeal_count_in_sales')} -> {report.appeal_count_in_sales}")
-        print(f"[REPORT] appeal_count_in_purchases = {request.form.get('appeal_count_in_purchases')} -> {report.appeal_count_in_purchases}")
+        shift_log.info("[REPORT] appeal_count_in_sales = %s -> %s", request.form.get('appeal_count_in_sales'), report.appeal_count_in_sales)
+        shift_log.info("[REPORT] appeal_count_in_purchases = %s -> %s", request.form.get('appeal_count_in_purchases'), report.appeal_count_in_purchases)
         
         # Сохраняем фотографии
         # Проверяем существование директории uploads
@@ -3839,341 +4380,446 @@ def create_shift_report():
                 file.save(file_path)
                 report.end_photo = filename
         
-        # Сохраняем отчет в базу
+        # Вся отправка смены - одна транзакция: отчет, история скама и служебные ордера
+        # пишутся одним flush/commit, при ошибке не остается ничего частично записанного.
+        # Справочные данные (сотрудник, имена аккаунтов Gate) загружаются один раз.
+        employee = db.session.get(Employee, int(employee_id))
+        gate_account_ids = [int(account_id) for account_id in selected_accounts.get('gate') or []]
+        gate_account_names = {}
+        if gate_account_ids:
+            gate_account_names = dict(
+                db.session.query(Account.id, Account.account_name)
+                .filter(Account.id.in_(gate_account_ids))
+                .all()
+            )
+        
+        # id отчета нужен для order_id служебных ордеров - получаем его flush'ем без коммита
         db.session.add(report)
-        db.session.commit()
+        db.session.flush()
+        created_ts = int(datetime.utcnow().timestamp())
         
         # Если скам отмечен как личный, сохраняем его в историю
         if report.scam_amount:
-            scam_history = EmployeeScamHistory(
+            db.session.add(EmployeeScamHistory(
                 employee_id=int(employee_id),
                 shift_report_id=report.id,
                 amount=report.scam_amount,
                 date=report.shift_date,
                 comment=report.scam_comment
-            )
-            db.session.add(scam_history)
-            db.session.commit()
-        
-        # Если указана апелляция, создаем ордер в истории ордеров
-        if report.appeal_amount and report.appeal_amount > 0:
-            # Получаем информацию о сотруднике для определения аккаунта
-            employee = Employee.query.get(int(employee_id))
-            if employee:
-                # Получаем данные апелляции из формы
-                appeal_amount_usdt = float(report.appeal_amount)
-                appeal_amount_rub = safe_float(request.form.get('appeal_amount_rub', 0))
-                appeal_platform = request.form.get('appeal_platform', 'bybit')
-                appeal_account = request.form.get('appeal_account', f"{employee.name}_appeal")
-                
-                # Рассчитываем курс
-                if appeal_amount_rub > 0 and appeal_amount_usdt > 0:
-                    price = appeal_amount_rub / appeal_amount_usdt
-                else:
-                    # Используем средний курс за день или 1.0
-                    price = 1.0
-                
-                # Создаем ордер апелляции
-                appeal_order = Order(
-                    order_id=f"appeal_{report.id}_{int(datetime.utcnow().timestamp())}",
-                    employee_id=int(employee_id),
-                    platform=appeal_platform,
-                    account_name=appeal_account,
-                    symbol='USDT',
-                    side='sell',  # Апелляция обычно как продажа
-                    quantity=appeal_amount_usdt,
-                    price=price,
-                    total_usdt=appeal_amount_rub if appeal_amount_rub > 0 else appeal_amount_usdt,
-                    fees_usdt=0,
-                    status='appealed',  # Специальный статус для апелляций
-                    count_in_sales=report.appeal_count_in_sales,  # Учитываем в продажах если установлен чекбокс
-                    count_in_purchases=report.appeal_count_in_purchases,  # Учитываем в покупках если установлен чекбокс
-                    executed_at=shift_start_dt  # Используем время начала смены
-                )
-                
-                db.session.add(appeal_order)
-                db.session.commit()
-                
-                print(f"Создан ордер апелляции: {appeal_order.order_id}, сумма: {appeal_amount_usdt} USDT, {appeal_amount_rub} RUB, платформа: {appeal_platform}, аккаунт: {appeal_account}")
-                print(f"[APPEAL ORDER] count_in_sales = {appeal_order.count_in_sales}, count_in_purchases = {appeal_order.count_in_purchases}")
-        
-        # Если указана докидка, создаем ордер в истории ордеров
-        if report.dokidka_amount and report.dokidka_amount > 0:
-            # Получаем информацию о сотруднике для определения аккаунта
-            employee = Employee.query.get(int(employee_id))
-            if employee:
-                # Получаем данные докидки из формы
-                dokidka_amount_usdt = float(report.dokidka_amount)
-                dokidka_amount_rub = float(report.dokidka_amount_rub) if report.dokidka_amount_rub else 0
-                dokidka_platform = report.dokidka_platform or 'bybit'
-                dokidka_account = report.dokidka_account or f"{employee.name}_dokidka"
-                
-                # Рассчитываем курс
-                if dokidka_amount_rub > 0 and dokidka_amount_usdt > 0:
-                    price = dokidka_amount_rub / dokidka_amount_usdt
-                else:
-                    # Используем средний курс за день или 1.0
-                    price = 1.0
-                
-                # Создаем ордер докидки
-                dokidka_order = Order(
-                    order_id=f"dokidka_{report.id}_{int(datetime.utcnow().timestamp())}",
-                    employee_id=int(employee_id),
-                    platform=dokidka_platform,
-                    account_name=dokidka_account,
-                    symbol='USDT',
-                    side='sell',  # Докидка обычно как продажа
-                    quantity=dokidka_amount_usdt,
-                    price=price,
-                    total_usdt=dokidka_amount_rub if dokidka_amount_rub > 0 else dokidka_amount_usdt,
-                    fees_usdt=0,
-                    status='dokidka',  # Специальный статус для докидок
-                    count_in_sales=report.dokidka_count_in_sales,  # Учитываем в продажах если установлен чекбокс
-                    count_in_purchases=report.dokidka_count_in_purchases,  # Учитываем в покупках если установлен чекбокс
-                    executed_at=shift_start_dt  # Используем время начала смены
-                )
-                
-                db.session.add(dokidka_order)
-                db.session.commit()
-                
-                print(f"Создан ордер докидки: {dokidka_order.order_id}, сумма: {dokidka_amount_usdt} USDT, {dokidka_amount_rub} RUB, платформа: {dokidka_platform}, аккаунт: {dokidka_account}")
-        
-        # Если указан скам, создаем ордер в истории ордеров
-        if report.scam_amount and report.scam_amount > 0:
-            # Получаем информацию о сотруднике для определения аккаунта
-            employee = Employee.query.get(int(employee_id))
-            if employee:
-                # Получаем данные скама из формы
-                scam_amount_usdt = float(report.scam_amount)
-                scam_amount_rub = float(report.scam_amount_rub) if report.scam_amount_rub else 0
-                scam_platform = report.scam_platform or 'bybit'
-                scam_account = report.scam_account or f"{employee.name}_scam"
-                
-                # Рассчитываем курс
-                if scam_amount_rub > 0 and scam_amount_usdt > 0:
-                    price = scam_amount_rub / scam_amount_usdt
-                else:
-                    # Используем средний курс за день или 1.0
-                    price = 1.0
-                
-                # Создаем ордер скама
-                scam_order = Order(
-                    order_id=f"scam_{report.id}_{int(datetime.utcnow().timestamp())}",
-                    employee_id=int(employee_id),
-                    platform=scam_platform,
-                    account_name=scam_account,
-                    symbol='USDT',
-                    side='sell',  # Скам обычно как продажа
-                    quantity=scam_amount_usdt,
-                    price=price,
-                    total_usdt=scam_amount_rub if scam_amount_rub > 0 else scam_amount_usdt,
-                    fees_usdt=0,
-                    status='scam',  # Специальный статус для скамов
-                    count_in_sales=report.scam_count_in_sales,  # Учитываем в продажах если установлен чекбокс
-                    count_in_purchases=report.scam_count_in_purchases,  # Учитываем в покупках если установлен чекбокс
-                    executed_at=shift_start_dt  # Используем время начала смены
-                )
-                
-                db.session.add(scam_order)
-                db.session.commit()
-                
-                print(f"Создан ордер скама: {scam_order.order_id}, сумма: {scam_amount_usdt} USDT, {scam_amount_rub} RUB, платформа: {scam_platform}, аккаунт: {scam_account}")
-        
-        # Если указан внутренний перевод, создаем ордер в истории ордеров
-        if report.internal_transfer_amount and report.internal_transfer_amount > 0:
-            # Получаем информацию о сотруднике для определения аккаунта
-            employee = Employee.query.get(int(employee_id))
-            if employee:
-                # Получаем данные внутреннего перевода из формы
-                internal_transfer_amount_usdt = float(report.internal_transfer_amount)
-                internal_transfer_amount_rub = float(report.internal_transfer_amount_rub) if report.internal_transfer_amount_rub else 0
-                internal_transfer_platform = report.internal_transfer_platform or 'bybit'
-                internal_transfer_account = report.internal_transfer_account or f"{employee.name}_internal"
-                
-                # Рассчитываем курс
-                if internal_transfer_amount_rub > 0 and internal_transfer_amount_usdt > 0:
-                    price = internal_transfer_amount_rub / internal_transfer_amount_usdt
-                else:
-                    # Используем средний курс за день или 1.0
-                    price = 1.0
-                
-                # Создаем ордер внутреннего перевода
-                internal_transfer_order = Order(
-                    order_id=f"internal_transfer_{report.id}_{int(datetime.utcnow().timestamp())}",
-                    employee_id=int(employee_id),
-                    platform=internal_transfer_platform,
-                    account_name=internal_transfer_account,
-                    symbol='USDT',
-                    side='sell',  # Внутренний перевод обычно как продажа
-                    quantity=internal_transfer_amount_usdt,
-                    price=price,
-                    total_usdt=internal_transfer_amount_rub if internal_transfer_amount_rub > 0 else internal_transfer_amount_usdt,
-                    fees_usdt=0,
-                    status='internal_transfer',  # Специальный статус для внутренних переводов
-                    count_in_sales=report.internal_transfer_count_in_sales,  # Учитываем в продажах если установлен чекбокс
-                    count_in_purchases=report.internal_transfer_count_in_purchases,  # Учитываем в покупках если установлен чекбокс
-                    executed_at=shift_start_dt  # Используем время начала смены
-                )
-                
-                db.session.add(internal_transfer_order)
-                db.session.commit()
-                
-                print(f"Создан ордер внутреннего перевода: {internal_transfer_order.order_id}, сумма: {internal_transfer_amount_usdt} USDT, {internal_transfer_amount_rub} RUB, платформа: {internal_transfer_platform}, аккаунт: {internal_transfer_account}")
-        
-        # Обрабатываем файлы выгрузок и привязываем ордера
+            ))
+        
+        special_orders = []
+        if employee:
+            # Апелляция: сумма в рублях и аккаунт берутся из формы
+            if report.appeal_amount and report.appeal_amount > 0:
+                special_orders.append(build_shift_special_order(
+                    report, 'appeal', 'appealed', created_ts,
+                    amount_usdt=report.appeal_amount,
+                    amount_rub=safe_float(request.form.get('appeal_amount_rub', 0)),
+                    platform=request.form.get('appeal_platform', 'bybit'),
+                    account_name=request.form.get('appeal_account', f"{employee.name}_appeal"),
+                    count_in_sales=report.appeal_count_in_sales,
+                    count_in_purchases=report.appeal_count_in_purchases
+                ))
+            # Докидка
+            if report.dokidka_amount and report.dokidka_amount > 0:
+                special_orders.append(build_shift_special_order(
+                    report, 'dokidka', 'dokidka', created_ts,
+                    amount_usdt=report.dokidka_amount,
+                    amount_rub=report.dokidka_amount_rub,
+                    platform=report.dokidka_platform or 'bybit',
+                    account_name=report.dokidka_account or f"{employee.name}_dokidka",
+                    count_in_sales=report.dokidka_count_in_sales,
+                    count_in_purchases=report.dokidka_count_in_purchases
+                ))
+            # Скам
+            if report.scam_amount and report.scam_amount > 0:
+                special_orders.append(build_shift_special_order(
+                    report, 'scam', 'scam', created_ts,
+                    amount_usdt=report.scam_amount,
+                    amount_rub=report.scam_amount_rub,
+                    platform=report.scam_platform or 'bybit',
+                    account_name=report.scam_account or f"{employee.name}_scam",
+                    count_in_sales=report.scam_count_in_sales,
+                    count_in_purchases=report.scam_count_in_purchases
+                ))
+            # Внутренний перевод
+            if report.internal_transfer_amount and report.internal_transfer_amount > 0:
+                special_orders.append(build_shift_special_order(
+                    report, 'internal_transfer', 'internal_transfer', created_ts,
+                    amount_usdt=report.internal_transfer_amount,
+                    amount_rub=report.internal_transfer_amount_rub,
+                    platform=report.internal_transfer_platform or 'bybit',
+                    account_name=report.internal_transfer_account or f"{employee.name}_internal",
+                    count_in_sales=report.internal_transfer_count_in_sales,
+                    count_in_purchases=report.internal_transfer_count_in_purchases
+                ))
+        
+        # Суммы Gate вводятся вручную - ордера создаем сразу
         stats = {
             'total_orders': 0,
             'linked_orders': 0,
             'platforms_processed': [],
             'errors': []
         }
-        
-        # Обрабатываем файлы для каждого аккаунта
-        for platform in ['bybit', 'htx', 'bliss', 'gate']:
-            if platform in selected_accounts and selected_accounts[platform]:
-                platform_stats = {
-                    'total_orders': 0,
-                    'linked_orders': 0,
-                    'errors': []
-                }
-                
-                for account_id in selected_accounts[platform]:
-                    if platform == 'gate':
-                        # Для Gate обрабатываем суммы вместо файлов
-                        gate_amount_key = f'gate_amount_{account_id}'
-                        gate_amount_rub_key = f'gate_amount_rub_{account_id}'
-                        
-                        if gate_amount_key in request.form:
-                            try:
-                                gate_amount = float(request.form[gate_amount_key])
-                                gate_amount_rub = float(request.form.get(gate_amount_rub_key, 0))
-                                print(f"Обрабатываем сумму Gate для аккаунта {account_id}: {gate_amount} USDT, {gate_amount_rub} RUB")
-                                print(f"DEBUG: Все данные формы для Gate: {dict(request.form)}")
-                                
-                                # Создаем фиктивный ордер для Gate с указанной суммой
-                                # GATE всегда идет как покупка
-                                # Если указана сумма в рублях, используем её как price, иначе 1.0
-                                price = gate_amount_rub / gate_amount if gate_amount > 0 and gate_amount_rub > 0 else 1.0
-                                
-                                gate_order = Order(
-                                    order_id=f'gate_manual_{report.id}_{account_id}_{int(datetime.utcnow().timestamp())}',
-                                    employee_id=int(employee_id),
-                                    platform='gate',
-                                    account_name=next((acc.account_name for acc in Account.query.filter_by(id=account_id).all()), 'Unknown'),
-                                    symbol='USDT',
-                                    side='buy',  # GATE всегда идет как покупка
-                                    quantity=gate_amount,
-                                    price=price,  # Курс RUB/USDT или 1.0
-                                    total_usdt=gate_amount_rub,  # Используем сумму в рублях
-                                    fees_usdt=0,
-                                    status='filled',
-                                    executed_at=shift_start_dt  # Используем время начала смены
-                                )
-                                
-                                db.session.add(gate_order)
-                                platform_stats['linked_orders'] += 1
-                                
-                                # Сохраняем изменения в базе данных
-                                db.session.commit()
-                                
-                            except Exception as e:
-                                error_msg = f'Ошибка обработки суммы Gate для аккаунта {account_id}: {str(e)}'
-                                platform_stats['errors'].append(error_msg)
-                                print(error_msg)
-                    else:
-                        # Для остальных площадок обрабатываем файлы
-                        file_key = f'file_{platform}_{account_id}'
-                        if file_key in request.files:
-                            file = request.files[file_key]
-                            if file.filename:
-                                try:
-                                    # Сохраняем файл и получаем путь
-                                    file_path = save_report_file(file, platform, report.id)
-                                    if not file_path:
-                                        continue
-                                    
-                                    print(f"Обрабатываем файл {platform} для аккаунта {account_id}: {file_path}")
-                                    
-                                    # Обрабатываем файл и привязываем ордера для конкретного аккаунта
-                                    account_stats = process_platform_file(
-                                        file_path, 
-                                        platform, 
-                                        [account_id],  # Передаем только один аккаунт
-                                        shift_start_dt, 
-                                        shift_end_dt,
-                                        report.id,
-                                        int(employee_id)
-                                    )
-                                    
-                                    platform_stats['total_orders'] += account_stats.get('total_orders', 0)
-                                    platform_stats['linked_orders'] += account_stats.get('linked_orders', 0)
-                                    
-                                    if account_stats.get('errors'):
-                                        platform_stats['errors'].extend(account_stats['errors'])
-                                    
-                                except Exception as e:
-                                    error_msg = f'Ошибка обработки файла {platform} для аккаунта {account_id}: {str(e)}'
-                                    platform_stats['errors'].append(error_msg)
-                                    print(error_msg)
-                        
-                        # Обрабатываем BTC файлы для Bybit (если есть)
-                        if platform == 'bybit':
-                            btc_file_key = f'file_bybit_btc_{account_id}'
-                            if btc_file_key in request.files:
-                                btc_file = request.files[btc_file_key]
-                                if btc_file.filename:
-                                    try:
-                                        # Сохраняем BTC файл и получаем путь
-                                        btc_file_path = save_report_file(btc_file, 'bybit_btc', report.id)
-                                        if btc_file_path:
-                                            print(f"Обрабатываем BTC файл для аккаунта {account_id}: {btc_file_path}")
-                                            
-                                            # Обрабатываем BTC файл и привязываем ордера
-                                            btc_account_stats = process_platform_file(
-                                                btc_file_path, 
-                                                'bybit_btc', 
-                                                [account_id],  # Передаем только один аккаунт
-                                                shift_start_dt, 
-                                                shift_end_dt,
-                                                report.id,
-                                                int(employee_id)
-                                            )
-                                            
-                                            platform_stats['total_orders'] += btc_account_stats.get('total_orders', 0)
-                                            platform_stats['linked_orders'] += btc_account_stats.get('linked_orders', 0)
-                                            
-                                            if btc_account_stats.get('errors'):
-                                                platform_stats['errors'].extend(btc_account_stats['errors'])
-                                        
-                                    except Exception as e:
-                                        error_msg = f'Ошибка обработки BTC файла для аккаунта {account_id}: {str(e)}'
-                                        platform_stats['errors'].append(error_msg)
-                                        print(error_msg)
-                
-                # Обновляем общую статистику
-                stats['total_orders'] += platform_stats['total_orders']
-                stats['linked_orders'] += platform_stats['linked_orders']
+        gate_linked = 0
+        for account_id in gate_account_ids:
+            gate_amount_key = f'gate_amount_{account_id}'
+            gate_amount_rub_key = f'gate_amount_rub_{account_id}'
+            
+            if gate_amount_key in request.form:
+                try:
+                    gate_amount = float(request.form[gate_amount_key])
+                    gate_amount_rub = float(request.form.get(gate_amount_rub_key, 0))
+                except (TypeError, ValueError) as e:
+                    error_msg = f'Ошибка обработки суммы Gate для аккаунта {account_id}: {str(e)}'
+                    stats['errors'].append(error_msg)
+                    shift_log.error("%s", error_msg)
+                    continue
+                shift_log.info("Обрабатываем сумму Gate для аккаунта %s: %s USDT, %s RUB", account_id, gate_amount, gate_amount_rub)
                 
-                if platform_stats['total_orders'] > 0 or platform_stats['linked_orders'] > 0:
-                    stats['platforms_processed'].append(platform.upper())
+                # Создаем фиктивный ордер для Gate с указанной суммой
+                # GATE всегда идет как покупка
+                # Если указана сумма в рублях, используем её как price, иначе 1.0
+                price = gate_amount_rub / gate_amount if gate_amount > 0 and gate_amount_rub > 0 else 1.0
                 
-                if platform_stats['errors']:
-                    stats['errors'].extend(platform_stats['errors'])
+                special_orders.append(Order(
+                    order_id=f'gate_manual_{report.id}_{account_id}_{created_ts}',
+                    employee_id=int(employee_id),
+                    platform='gate',
+                    account_name=gate_account_names.get(account_id, 'Unknown'),
+                    symbol='USDT',
+                    side='buy',  # GATE всегда идет как покупка
+                    quantity=gate_amount,
+                    price=price,  # Курс RUB/USDT или 1.0
+                    total_usdt=gate_amount_rub,  # Используем сумму в рублях
+                    fees_usdt=0,
+                    status='filled',
+                    executed_at=shift_start_dt  # Используем время начала смены
+                ))
+                gate_linked += 1
+        if gate_linked:
+            stats['linked_orders'] += gate_linked
+            stats['platforms_processed'].append('GATE')
+        
+        db.session.add_all(special_orders)
+        db.session.commit()
+        
+        for order in special_orders:
+            shift_log.info("Создан ордер %s: %s USDT, %s RUB, платформа: %s, аккаунт: %s, count_in_sales = %s, count_in_purchases = %s",
+                           order.order_id, order.quantity, order.total_usdt, order.platform, order.account_name,
+                           order.count_in_sales, order.count_in_purchases)
+        
+        # Файлы выгрузок сохраняем после коммита отчета, а разбираем и пишем ордера в фоновой задаче
+        saved_files = {}
+        save_errors = {}
+        for platform in ['bybit', 'htx', 'bliss']:
+            for account_id in selected_accounts.get(platform) or []:
+                file_platforms = [platform, 'bybit_btc'] if platform == 'bybit' else [platform]
+                for file_platform in file_platforms:
+                    file = request.files.get(f'file_{file_platform}_{account_id}')
+                    if not file or not file.filename:
+                        continue
+                    try:
+                        file_path = save_report_file(file, file_platform, report.id)
+                        if file_path:
+                            saved_files[(file_platform, account_id)] = file_path
+                    except Exception as e:
+                        save_errors[(file_platform, account_id)] = str(e)
+        
+        job_id = None
+        if saved_files or save_errors:
+            job_id = submit_import_job(
+                'shift_files', process_shift_report_files,
+                report_id=report.id, employee_id=int(employee_id), selected_accounts=selected_accounts,
+                saved_files=saved_files, save_errors=save_errors,
+                shift_start_dt=shift_start_dt, shift_end_dt=shift_end_dt, stats=stats
+            )
         
+        # Если файлы ушли в задачу, статистики на этот момент еще нет: итоговая
+        # (вместе с ручными суммами Gate) будет в result задачи по status_url
         return jsonify({
             'id': report.id,
             'message': 'Report created successfully',
-            'stats': stats
+            'stats': None if job_id else stats,
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}' if job_id else None
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Ошибка создания отчёта: {str(e)}'}), 500
 
 
+# --- ПРОВЕРКА ДУБЛЕЙ ОРДЕРОВ ---
+# Существующие ордера ищутся множествами: order_id проверяются IN-запросами
+# порциями по DEDUP_IN_CHUNK_SIZE, BTC ордера - так же по уникальному индексу
+# отпечатка содержимого. Дальше дубли отсеиваются в памяти.
+
+DEDUP_IN_CHUNK_SIZE = 500
+
+def find_existing_order_ids(order_ids, platform=None):
+    """Множество order_id из order_ids, которые уже сохранены (для площадки, если она указана)"""
+    unique_ids = list(dict.fromkeys(order_ids))
+    existing = set()
+    for i in range(0, len(unique_ids), DEDUP_IN_CHUNK_SIZE):
+        chunk = unique_ids[i:i + DEDUP_IN_CHUNK_SIZE]
+        query = db.session.query(Order.order_id).filter(Order.order_id.in_(chunk))
+        if platform:
+            query = query.filter(Order.platform == platform)
+        existing.update(row[0] for row in query.all())
+    return existing
+
+def order_content_fingerprint(symbol, side, quantity, price, executed_at):
+    """Отпечаток содержимого ордера (BTC ордера Bybit не имеют надежного order_id).
+
+    Числа приводятся к точности колонок Numeric(15, 8), время - к секундам,
+    поэтому отпечаток из файла совпадает с отпечатком уже сохраненного ордера.
+    Такую же функцию использует миграция add_order_content_fingerprint.
+    """
+    canonical = '|'.join([
+        str(symbol or '').upper(),
+        str(side or '').lower(),
+        '%.8f' % float(quantity or 0),
+        '%.8f' % float(price or 0),
+        executed_at.strftime('%Y-%m-%d %H:%M:%S') if executed_at else ''
+    ])
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+def find_existing_fingerprints(fingerprints):
+    """Множество отпечатков из fingerprints, которые уже есть в БД (индексный поиск порциями)"""
+    unique_fingerprints = list(dict.fromkeys(fingerprints))
+    existing = set()
+    for i in range(0, len(unique_fingerprints), DEDUP_IN_CHUNK_SIZE):
+        chunk = unique_fingerprints[i:i + DEDUP_IN_CHUNK_SIZE]
+        rows = db.session.query(Order.content_fingerprint).filter(
+            Order.content_fingerprint.in_(chunk)
+        ).all()
+        existing.update(row[0] for row in rows)
+    return existing
+
+# --- ПАКЕТНАЯ ЗАПИСЬ ОРДЕРОВ ---
+# Импортированные ордера пишутся многострочными INSERT через SQLAlchemy Core,
+# по одному выражению на пачку. Конфликт по order_id разрешает сама БД:
+# MySQL - ON DUPLICATE KEY UPDATE, SQLite - ON CONFLICT. Вставленные и
+# обновленные строки определяются по результату этой же записи, что закрывает
+# гонку параллельных загрузок одного файла.
+
+BULK_INSERT_BATCH_SIZE = 500
+
+# Поля, которые переписываются при on_duplicate='update'; статус и флаги учета,
+# выставленные вручную, не трогаем
+ORDER_UPSERT_FIELDS = ('symbol', 'side', 'quantity', 'price', 'total_usdt', 'fees_usdt', 'executed_at', 'content_fingerprint', 'updated_at')
+
+def _check_finite_number(value, field):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or not math.isfinite(number):
+        raise ValueError(f'Некорректное значение {field}: {value!r}')
+
+def order_insert_row(order, employee_id, platform, account_name):
+    """Строка таблицы order для пакетной вставки из словаря разобранного ордера.
+
+    Пакетная вставка идет мимо проверок ORM, поэтому строку, которую БД приняла бы
+    с подменой значений (пустая сторона сделки, пустые числа, время не datetime),
+    отклоняем ValueError.
+    """
+    side = order.get('side')
+    if not isinstance(side, str) or not side.strip():
+        raise ValueError(f"Некорректная сторона сделки: {side!r}")
+    _check_finite_number(order.get('quantity'), 'quantity')
+    _check_finite_number(order.get('price'), 'price')
+    if not isinstance(order.get('executed_at'), datetime):
+        raise ValueError(f"Некорректное время исполнения: {order.get('executed_at')!r}")
+    now = datetime.utcnow()
+    return {
+        'order_id': order['order_id'],
+        'employee_id': employee_id,
+        'platform': platform,
+        'account_name': account_name,
+        'symbol': order['symbol'],
+        'side': order['side'],
+        'quantity': order['quantity'],
+        'price': order['price'],
+        'total_usdt': order['total_usdt'],
+        'fees_usdt': order.get('fees_usdt', 0),
+        'status': order.get('status', 'filled'),
+        'count_in_sales': False,
+        'count_in_purchases': False,
+        'executed_at': order['executed_at'],
+        'content_fingerprint': order_content_fingerprint(
+            order['symbol'], order['side'], order['quantity'], order['price'], order['executed_at']
+        ) if platform == 'bybit_btc' else None,
+        'created_at': now,
+        'updated_at': now
+    }
+
+def _order_conflict_insert(on_duplicate):
+    """INSERT в таблицу order с обработкой конфликта order_id средствами диалекта БД"""
+    table = Order.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_dialect.insert(table)
+        if on_duplicate == 'update':
+            return stmt.on_duplicate_key_update({field: stmt.inserted[field] for field in ORDER_UPSERT_FIELDS})
+        # Пустой upsert вместо INSERT IGNORE: IGNORE превращает в предупреждения любые
+        # ошибки (NULL в NOT NULL, обрезку строк), а не только конфликт ключа.
+        # id = id не меняет строку ни при конфликте order_id, ни при конфликте отпечатка
+        return stmt.on_duplicate_key_update(id=table.c.id)
+    if dialect == 'sqlite':
+        stmt = sqlite_dialect.insert(table)
+        if on_duplicate == 'update':
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['order_id'],
+                set_={field: stmt.excluded[field] for field in ORDER_UPSERT_FIELDS}
+            )
+        else:
+            # Без index_elements пропускаются конфликты по любому уникальному ключу (order_id и отпечаток)
+            stmt = stmt.on_conflict_do_nothing()
+        # RETURNING отдает только вставленные и обновленные строки
+        return stmt.returning(table.c.order_id, table.c.created_at)
+    return None
+
+def _write_order_batch(batch, on_duplicate, stamp):
+    """Пишет пачку строк одним INSERT, конфликты order_id и отпечатка разрешает БД.
+
+    Возвращает (вставленные order_id, обновленные order_id) по результату самой записи.
+    created_at upsert не переписывает, поэтому строка вставлена этим выражением,
+    только если ее created_at равен отметке пачки stamp. SQLite отдает затронутые
+    строки через RETURNING. В MySQL RETURNING нет, а rowcount при CLIENT_FOUND_ROWS
+    не отличает вставку от пустого upsert - строки пачки перечитываются после записи
+    в той же транзакции (отметка там с точностью до секунды).
+    """
+    stmt = _order_conflict_insert(on_duplicate)
+    rows_by_id = {row['order_id']: row for row in batch}
+    if stmt is None:
+        # БД без конфликтного INSERT: существующие ордера отсеиваем запросом
+        existing = find_existing_order_ids(rows_by_id)
+        new_rows = [row for row in batch if row['order_id'] not in existing]
+        if new_rows:
+            db.session.execute(insert(Order.__table__).values(new_rows))
+        return {row['order_id'] for row in new_rows}, set()
+    
+    result = db.session.execute(stmt.values(batch))
+    if result.returns_rows:
+        written = result.all()
+    else:
+        written = []
+        for i in range(0, len(rows_by_id), DEDUP_IN_CHUNK_SIZE):
+            chunk = list(rows_by_id)[i:i + DEDUP_IN_CHUNK_SIZE]
+            written.extend(db.session.query(Order.order_id, Order.created_at).filter(Order.order_id.in_(chunk)))
+    
+    inserted = set()
+    updated = set()
+    for order_id, created_at in written:
+        if order_id not in rows_by_id:
+            continue
+        if created_at == stamp:
+            inserted.add(order_id)
+        elif on_duplicate == 'update':
+            updated.add(order_id)
+    return inserted, updated
+
+def bulk_write_orders(rows, on_duplicate='skip'):
+    """Пакетно записывает строки ордеров (см. order_insert_row) в текущей транзакции.
+
+    on_duplicate='skip' оставляет существующие ордера как есть, 'update' обновляет
+    у них поля ORDER_UPSERT_FIELDS. Повторы order_id и отпечатка внутри rows пропускаются.
+    Снимки прибыли затронутых смен сбрасываются, а дневные сводки пересчитываются
+    в той же транзакции.
+    Возвращает {'inserted', 'skipped', 'updated', 'inserted_ids'}, где inserted_ids -
+    множество order_id, которые вставила именно эта запись.
+    """
+    counts = {'inserted': 0, 'skipped': 0, 'updated': 0, 'inserted_ids': set()}
+    unique_rows = []
+    seen_ids = set()
+    seen_fingerprints = set()
+    for row in rows:
+        fingerprint = row.get('content_fingerprint')
+        if row['order_id'] in seen_ids or (fingerprint and fingerprint in seen_fingerprints):
+            continue
+        seen_ids.add(row['order_id'])
+        if fingerprint:
+            seen_fingerprints.add(fingerprint)
+        unique_rows.append(row)
+    counts['skipped'] = len(rows) - len(unique_rows)
+    if not unique_rows:
+        return counts
+    
+    # Отметка записи в created_at/updated_at; MySQL хранит DATETIME с точностью до секунды
+    stamp = datetime.utcnow()
+    if db.session.get_bind().dialect.name == 'mysql':
+        stamp = stamp.replace(microsecond=0)
+    
+    for i in range(0, len(unique_rows), BULK_INSERT_BATCH_SIZE):
+        batch = [dict(row, created_at=stamp, updated_at=stamp) for row in unique_rows[i:i + BULK_INSERT_BATCH_SIZE]]
+        # Запись идет мимо ORM - снимки прибыли смен и дневные сводки обновляем сами
+        old_points = []
+        if on_duplicate == 'update':
+            # Обновляемый ордер остается у прежнего сотрудника и мог сменить день -
+            # старые точки нужны только для пересчета сводок и снимков
+            old_points = db.session.query(Order.employee_id, Order.executed_at).filter(
+                Order.order_id.in_([row['order_id'] for row in batch])
+            ).all()
+        
+        inserted, updated = _write_order_batch(batch, on_duplicate, stamp)
+        counts['inserted'] += len(inserted)
+        counts['updated'] += len(updated)
+        counts['skipped'] += len(batch) - len(inserted) - len(updated)
+        counts['inserted_ids'].update(inserted)
+        
+        order_points = [(row['employee_id'], row['executed_at']) for row in batch
+                        if row['order_id'] in inserted or row['order_id'] in updated]
+        order_points.extend(old_points)
+        if order_points:
+            invalidate_shift_profit_snapshots(db.session.connection(), order_points=order_points)
+            refresh_order_daily_rollups(db.session.connection(), order_points)
+    
+    if counts['inserted'] or counts['updated']:
+        mark_tables_changed(db.session, 'order')
+    orders_log.debug("Пакетная запись ордеров: inserted=%s skipped=%s updated=%s",
+                     counts['inserted'], counts['skipped'], counts['updated'])
+    return counts
+
+def route_orders_to_accounts(orders, account_names):
+    """
+    Распределяет ордера выгрузки по выбранным аккаунтам.
+
+    Если в ордере есть export_account (колонка аккаунта в выгрузке), ордер получает
+    совпавший без учета регистра аккаунт. Остальные ордера - без export_account
+    или с именем, не совпавшим ни с одним выбранным аккаунтом, - как и раньше,
+    получает первый аккаунт.
+
+    Returns:
+        tuple: (список пар (ордер, имя аккаунта), число ордеров с несовпавшим именем аккаунта)
+    """
+    if not account_names:
+        return [], 0
+    default_account = account_names[0]
+    by_lower = {name.lower(): name for name in account_names}
+
+    routed = []
+    unmatched = 0
+    for order in orders:
+        export_name = order.get('export_account')
+        account_name = by_lower.get(str(export_name).strip().lower()) if export_name else None
+        if account_name is None:
+            if export_name:
+                unmatched += 1
+            account_name = default_account
+        routed.append((order, account_name))
+    return routed, unmatched
+
 def process_platform_file(file_path, platform, account_ids, shift_start_dt, shift_end_dt, report_id, employee_id):
-    """Обрабатывает файл выгрузки для конкретной площадки с поддержкой диапазона дат и времени внутри дня"""
-    print(f"\nDEBUG SHIFT: Обработка файла {platform}")
-    print(f"DEBUG SHIFT: Время смены {shift_start_dt} - {shift_end_dt}")
+    """Обрабатывает файл выгрузки для конкретной площадки с поддержкой диапазона дат и времени внутри дня.
+
+    Файл разбирается один раз, ордера распределяются между аккаунтами account_ids
+    (см. route_orders_to_accounts).
+    """
+    shift_log.debug("Обработка файла %s", platform)
+    shift_log.debug("Время смены %s - %s", shift_start_dt, shift_end_dt)
     
     stats = {
         'total_orders': 0,
@@ -4185,16 +4831,21 @@ def process_platform_file(file_path, platform, account_ids, shift_start_dt, shif
         from datetime import timedelta, time
         # Получаем аккаунты для проверки
         accounts = Account.query.filter(Account.id.in_(account_ids)).all()
-        account_names = [acc.account_name for acc in accounts]
+        # Порядок аккаунтов как в account_ids: первый получает ордера без указания аккаунта
+        accounts_by_id = {acc.id: acc for acc in accounts}
+        account_names = [accounts_by_id[acc_id].account_name for acc_id in account_ids if acc_id in accounts_by_id]
         
         if not account_names:
             stats['errors'].append(f'Не найдены аккаунты с ID: {account_ids}')
             return stats
         
-        # Читаем файл в зависимости от платформы
-        orders = parse_orders_file(file_path, platform)
+        # Читаем файл в зависимости от платформы; окно смены применяется при разборе,
+        # результат общий с проверкой смены и с другими аккаунтами площадки
+        parse_info = {}
+        orders = parse_orders_file_cached(file_path, platform, shift_start_dt, shift_end_dt, parse_info=parse_info)
         if not orders:
-            stats['errors'].append(f'Не удалось прочитать файл для платформы: {platform}')
+            if not parse_info.get('summary', {}).get('rows_read'):
+                stats['errors'].append(f'Не удалось прочитать файл для платформы: {platform}')
             return stats
         
         # Для bybit_btc сохраняем платформу как 'bybit_btc' в БД для правильной фильтрации
@@ -4202,16 +4853,6 @@ def process_platform_file(file_path, platform, account_ids, shift_start_dt, shif
         
         stats['total_orders'] = len(orders)
         
-        # Если в выгрузке отсутствует поле account_name, привяжем все ордера к текущему аккаунту
-        # (передаём всегда только один account_id на вызов)
-        if len(account_names) == 1:
-            default_account_name = account_names[0]
-        else:
-            default_account_name = None
-        
-        # Приводим имена аккаунтов к нижнему регистру для сравнения
-        account_names_lower = [name.lower() for name in account_names]
-        
         # Фильтруем ордера по времени смены
         account_orders = []
         for order in orders:
@@ -4219,65 +4860,66 @@ def process_platform_file(file_path, platform, account_ids, shift_start_dt, shif
             if shift_start_dt <= order_time <= shift_end_dt:
                 account_orders.append(order)
         
+        # Распределяем ордера по аккаунтам за один проход
+        routed_orders, unmatched = route_orders_to_accounts(account_orders, account_names)
+        if unmatched:
+            stats['unmatched_account_orders'] = unmatched
+            shift_log.info("%s: у %s ордеров аккаунт из выгрузки не совпал с выбранными, они отнесены к %s",
+                           platform, unmatched, account_names[0])
+        
         # Сохраняем отфильтрованные ордера
-        created_count = 0
-        for order in account_orders:
+        # Существующие ордера получаем пачкой; созданные в этом проходе добавляются в те же множества
+        routed_list = [order for order, _ in routed_orders]
+        existing_ids = find_existing_order_ids([order['order_id'] for order in routed_list], platform)
+        fingerprints = {}
+        if platform == 'bybit_btc':
+            fingerprints = {
+                id(order): order_content_fingerprint(
+                    order['symbol'], order['side'], order['quantity'], order['price'], order['executed_at']
+                )
+                for order in routed_list
+            }
+        existing_fingerprints = find_existing_fingerprints(fingerprints.values()) if fingerprints else set()
+        
+        new_rows = []
+        row_accounts = {}
+        for order, account_name in routed_orders:
             try:
                 # Проверяем, что ордер еще не существует
-                existing_order = Order.query.filter_by(
-                    order_id=order['order_id'],
-                    platform=platform
-                ).first()
-                
-                if existing_order:
-                    print(f"Ордер уже существует: {order['order_id']}")
+                if order['order_id'] in existing_ids:
+                    debug_sampled(shift_log, 'order.exists', "Ордер уже существует: %s", order['order_id'])
                     continue
                 
                 # Дополнительная проверка для BTC ордеров по содержимому
                 if platform == 'bybit_btc':
-                    # Проверяем существование ордера с теми же ключевыми полями
-                    duplicate_order = Order.query.filter_by(
-                        platform='bybit_btc',
-                        symbol=order['symbol'],
-                        side=order['side'],
-                        quantity=order['quantity'],
-                        price=order['price'],
-                        executed_at=order['executed_at']
-                    ).first()
-                    
-                    if duplicate_order:
-                        print(f"BTC ордер с такими же данными уже существует: {duplicate_order.order_id}")
+                    fingerprint = fingerprints[id(order)]
+                    if fingerprint in existing_fingerprints:
+                        debug_sampled(shift_log, 'order.exists', "BTC ордер с такими же данными уже существует: %s", order['order_id'])
                         continue
+                    existing_fingerprints.add(fingerprint)
                 
-                # Создаем новый ордер
-                new_order = Order(
-                    order_id=order['order_id'],
-                    employee_id=employee_id,
-                    platform=db_platform,  # Используем db_platform для правильного сохранения
-                    account_name=default_account_name,  # Всегда используем имя выбранного аккаунта
-                    symbol=order['symbol'],
-                    side=order['side'],
-                    quantity=order['quantity'],
-                    price=order['price'],
-                    total_usdt=order['total_usdt'],
-                    fees_usdt=order.get('fees_usdt', 0),
-                    status=order.get('status', 'filled'),
-                    executed_at=order['executed_at']
-                )
-                
-                db.session.add(new_order)
-                created_count += 1
-                print(f"Создан новый ордер: {order['order_id']} для аккаунта {order.get('account_name')}")
+                # Готовим строку нового ордера (db_platform - площадка, под которой ордер хранится в БД)
+                new_rows.append(order_insert_row(order, employee_id, db_platform, account_name))
+                row_accounts[order['order_id']] = account_name
+                existing_ids.add(order['order_id'])
+                debug_sampled(shift_log, 'order.created', "Создан новый ордер: %s для аккаунта %s", order['order_id'], account_name)
                 
             except Exception as e:
-                print(f"Ошибка сохранения ордера {order.get('order_id')}: {str(e)}")
+                shift_log.error("Ошибка сохранения ордера %s: %s", order.get('order_id'), str(e))
                 continue
         
-        # Сохраняем изменения
+        # Пишем новые ордера пачками; ордера, вставленные параллельной загрузкой, БД пропустит сама
+        write_counts = bulk_write_orders(new_rows)
         db.session.commit()
         
+        created_count = write_counts['inserted']
+        # Созданные ордера по аккаунтам - по тому, что вставила запись
+        stats['accounts'] = {name: 0 for name in account_names}
+        for order_id in write_counts['inserted_ids']:
+            stats['accounts'][row_accounts[order_id]] += 1
         stats['linked_orders'] = created_count
-        print(f"Обработано {len(account_orders)} ордеров для {platform}, создано {created_count} новых")
+        stats['skipped_orders'] = len(routed_orders) - created_count
+        shift_log.info("Обработано %s ордеров для %s, создано %s новых", len(routed_orders), platform, created_count)
         
         return stats
         
@@ -4339,7 +4981,7 @@ def get_salary_settings():
             'bonus_profit_threshold': settings.bonus_profit_threshold
         })
     except Exception as e:
-        print('Error getting salary settings:', e)
+        app_log.error("Error getting salary settings: %s", e)
         return jsonify({'error': 'Ошибка при получении настроек'}), 500
 
 @app.route('/api/settings/salary', methods=['POST'])
@@ -4366,7 +5008,7 @@ def update_salary_settings():
         db.session.commit()
         return jsonify({'success': True})
     except Exception as e:
-        print('Error updating salary settings:', e)
+        app_log.error("Error updating salary settings: %s", e)
         return jsonify({'error': 'Ошибка при обновлении настроек'}), 500
 
 @app.route('/api/employee-salary/<int:employee_id>', methods=['GET'])
@@ -4426,8 +5068,9 @@ def calculate_employee_statistics(reports, emp, db):
     total_scam = float(sum(r.scam_amount or 0 for r in reports if getattr(r, 'scam_personal', False)))
     total_transfer = float(sum(r.dokidka_amount or 0 for r in reports))
     # Считаем прибыль по новой логике
-    total_project_profit = sum(calculate_report_profit(db.session, r)['project_profit'] for r in reports)
-    total_salary_profit = sum(calculate_report_profit(db.session, r)['salary_profit'] for r in reports)
+    report_profits = get_report_profits(db.session, reports)
+    total_project_profit = sum(report_profits[r.id]['project_profit'] for r in reports)
+    total_salary_profit = sum(report_profits[r.id]['salary_profit'] for r in reports)
     # Используем индивидуальный процент сотрудника, если задан, иначе 30%
     salary_percent = emp.salary_percent if emp.salary_percent is not None else 30.0
     salary = max(0, total_salary_profit * (salary_percent / 100))
@@ -4455,6 +5098,7 @@ def calculate_employee_statistics(reports, emp, db):
     }
 
 @app.route('/api/statistics', methods=['GET'])
+@cached_result('order', 'shift_report', 'employee', 'account', 'initial_balance', 'shift_profit_snapshot')
 def statistics():
     """Возвращает подробную статистику по сотрудникам за выбранный период: смены, заявки, прибыль, скам, переводы, зарплата и т.д."""
     start_date = request.args.get('start_date')
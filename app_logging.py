@@ -0,0 +1,125 @@
+"""
+Логирование разбора выгрузок и расчетов.
+
+Каждая подсистема пишет в свой логгер 'birch.<подсистема>':
+    app, parse, timezone, orders, shift, stats, profit
+
+Уровни задаются переменными окружения:
+    LOG_LEVEL                - общий уровень (по умолчанию INFO)
+    LOG_LEVEL_<ПОДСИСТЕМА>   - уровень подсистемы, например LOG_LEVEL_PARSE=DEBUG
+    LOG_SAMPLE_FIRST         - сколько сообщений с одним ключом выборки выводить подряд (по умолчанию 5)
+    LOG_SAMPLE_EVERY         - после этого выводить каждое N-е сообщение (по умолчанию 1000)
+
+В горячих циклах сообщения пишутся через debug_sampled(): если уровень
+выключен, строка сообщения не форматируется, а при включенном уровне
+выводится только выборка.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+ROOT_LOGGER_NAME = 'birch'
+SUBSYSTEMS = ('app', 'parse', 'timezone', 'orders', 'shift', 'stats', 'profit')
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+LOG_SAMPLE_FIRST = int(os.environ.get('LOG_SAMPLE_FIRST', 5))
+LOG_SAMPLE_EVERY = max(int(os.environ.get('LOG_SAMPLE_EVERY', 1000)), 1)
+
+_sample_counts = Counter()
+_sample_lock = threading.Lock()
+
+
+def _env_level(name, default):
+    """Уровень логирования из переменной окружения ('DEBUG', 'INFO', ... или число)"""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    value = value.strip().upper()
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value)
+    return level if isinstance(level, int) else default
+
+
+def _configure_root():
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.propagate = False
+    root.setLevel(_env_level('LOG_LEVEL', logging.INFO))
+    return root
+
+
+_configure_root()
+
+
+def get_logger(subsystem):
+    """Логгер подсистемы; уровень можно переопределить через LOG_LEVEL_<ПОДСИСТЕМА>"""
+    logger = logging.getLogger(f'{ROOT_LOGGER_NAME}.{subsystem}')
+    level = _env_level(f'LOG_LEVEL_{subsystem.upper()}', None)
+    if level is not None:
+        logger.setLevel(level)
+    return logger
+
+
+def sampled(key):
+    """True для первых LOG_SAMPLE_FIRST вызовов с ключом key и затем для каждого LOG_SAMPLE_EVERY-го"""
+    with _sample_lock:
+        _sample_counts[key] += 1
+        count = _sample_counts[key]
+    return count <= LOG_SAMPLE_FIRST or count % LOG_SAMPLE_EVERY == 0
+
+
+def debug_sampled(logger, key, msg, *args):
+    """Отладочное сообщение из горячего цикла: проверка уровня, затем выборка"""
+    if logger.isEnabledFor(logging.DEBUG) and sampled(key):
+        logger.debug(msg, *args)
+
+
+class ParseSummary:
+    """Итог разбора одного файла: прочитано, принято, отброшено по причинам, время"""
+
+    def __init__(self, platform, source=None):
+        self.platform = platform
+        self.source = source
+        self.rows_read = 0
+        self.rows_kept = 0
+        self.rejected = Counter()
+        self.stopped_early = False  # строки после пройденного окна смены не разбирались
+        self._started = time.perf_counter()
+
+    def read(self, count=1):
+        self.rows_read += count
+
+    def keep(self, count=1):
+        self.rows_kept += count
+
+    def reject(self, reason, count=1):
+        if count:
+            self.rejected[reason] += count
+
+    def as_dict(self):
+        return {
+            'platform': self.platform,
+            'source': self.source,
+            'rows_read': self.rows_read,
+            'rows_kept': self.rows_kept,
+            'rows_rejected': dict(self.rejected),
+            'stopped_early': self.stopped_early,
+            'elapsed_ms': round((time.perf_counter() - self._started) * 1000, 1)
+        }
+
+    def finish(self, logger):
+        """Пишет одну итоговую запись разбора и возвращает ее как словарь"""
+        summary = self.as_dict()
+        logger.info(
+            "Итог разбора %s (%s): прочитано %d, принято %d, отброшено %s, строки после окна пропущены без разбора: %s, %.1f мс",
+            summary['platform'], summary['source'], summary['rows_read'], summary['rows_kept'],
+            summary['rows_rejected'], summary['stopped_early'], summary['elapsed_ms']
+        )
+        return summary
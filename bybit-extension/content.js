@@ -1,5 +1,438 @@
 // Content script для отслеживания ордеров на Bybit
+
+// Очередь отправки ордеров: хранится в chrome.storage.local и переживает перезагрузку страницы.
+// Ордера уходят пачками в /api/orders (режим нескольких ордеров), при сбое - повтор с экспоненциальной задержкой.
+class OrderSendQueue {
+  constructor(getSettings, callbacks = {}) {
+    this.getSettings = getSettings;
+    this.onSent = callbacks.onSent || (() => {});
+    this.onError = callbacks.onError || (() => {});
+    this.onDelivered = callbacks.onDelivered || (() => {});
+    this.filterNew = callbacks.filterNew || (async (orders) => orders);
+    this.queue = [];
+    this.sentIds = [];
+    this.sentIdSet = new Set();
+    this.flushTimer = null;
+    this.flushing = false;
+    this.attempt = 0;
+  }
+
+  static get STORAGE_QUEUE_KEY() { return 'orderSendQueue'; }
+  static get STORAGE_SENT_KEY() { return 'sentOrderIds'; }
+  static get MAX_BATCH() { return 50; }          // Ордеров в одном запросе
+  static get FLUSH_DELAY_MS() { return 3000; }   // Сколько ждать новых ордеров перед отправкой
+  static get RETRY_BASE_MS() { return 2000; }
+  static get RETRY_MAX_MS() { return 5 * 60 * 1000; }
+  static get MAX_SENT_IDS() { return 5000; }     // Сколько отправленных id помнить
+
+  async load() {
+    try {
+      const result = await chrome.storage.local.get([
+        OrderSendQueue.STORAGE_QUEUE_KEY,
+        OrderSendQueue.STORAGE_SENT_KEY
+      ]);
+      this.queue = result[OrderSendQueue.STORAGE_QUEUE_KEY] || [];
+      this.sentIds = result[OrderSendQueue.STORAGE_SENT_KEY] || [];
+      this.sentIdSet = new Set(this.sentIds);
+      console.log(`📦 Очередь отправки: ${this.queue.length} ордеров ждут отправки, ${this.sentIds.length} уже отправлено`);
+    } catch (error) {
+      console.error('Ошибка загрузки очереди отправки:', error);
+    }
+    
+    // Ордера, оставшиеся с прошлой страницы, отправляем сразу
+    if (this.queue.length > 0) {
+      this.scheduleFlush(0);
+    }
+    window.addEventListener('online', () => {
+      // Сеть вернулась - не ждем окончания задержки повтора
+      this.attempt = 0;
+      this.scheduleFlush(0);
+    });
+  }
+
+  // Id, которые уже отправлены или стоят в очереди
+  knownIds() {
+    return [...this.sentIds, ...this.queue.map(order => order.order_id)];
+  }
+
+  isKnown(orderId) {
+    return this.sentIdSet.has(orderId) || this.queue.some(order => order.order_id === orderId);
+  }
+
+  async enqueue(orderData) {
+    if (!orderData || this.isKnown(orderData.order_id)) {
+      return false;
+    }
+    this.queue.push(orderData);
+    await this.persist();
+    
+    // Полная пачка уходит сразу, иначе ждем, пока соберутся соседние ордера
+    this.scheduleFlush(this.queue.length >= OrderSendQueue.MAX_BATCH ? 0 : OrderSendQueue.FLUSH_DELAY_MS);
+    return true;
+  }
+
+  async markSent(orderIds) {
+    orderIds.forEach(orderId => {
+      if (!this.sentIdSet.has(orderId)) {
+        this.sentIdSet.add(orderId);
+        this.sentIds.push(orderId);
+      }
+    });
+    if (this.sentIds.length > OrderSendQueue.MAX_SENT_IDS) {
+      this.sentIds = this.sentIds.slice(-OrderSendQueue.MAX_SENT_IDS);
+      this.sentIdSet = new Set(this.sentIds);
+    }
+    const sent = new Set(orderIds);
+    this.queue = this.queue.filter(order => !sent.has(order.order_id));
+    await this.persist();
+  }
+
+  async persist() {
+    try {
+      await chrome.storage.local.set({
+        [OrderSendQueue.STORAGE_QUEUE_KEY]: this.queue,
+        [OrderSendQueue.STORAGE_SENT_KEY]: this.sentIds
+      });
+    } catch (error) {
+      console.error('Ошибка сохранения очереди отправки:', error);
+    }
+  }
+
+  scheduleFlush(delay) {
+    if (this.flushTimer) {
+      // Уже запланированную отправку переносим только на более раннее время и не во время задержки повтора
+      if (delay > 0 || this.attempt > 0) {
+        return;
+      }
+      clearTimeout(this.flushTimer);
+    }
+    this.flushTimer = setTimeout(() => {
+      this.flushTimer = null;
+      this.flush();
+    }, delay);
+  }
+
+  scheduleRetry() {
+    this.attempt++;
+    const backoff = Math.min(OrderSendQueue.RETRY_BASE_MS * Math.pow(2, this.attempt - 1), OrderSendQueue.RETRY_MAX_MS);
+    const delay = backoff / 2 + Math.random() * backoff / 2;
+    console.warn(`⏳ Повтор отправки через ${Math.round(delay / 1000)} с (попытка ${this.attempt})`);
+    if (this.flushTimer) {
+      clearTimeout(this.flushTimer);
+    }
+    this.flushTimer = setTimeout(() => {
+      this.flushTimer = null;
+      this.flush();
+    }, delay);
+  }
+
+  async flush() {
+    if (this.flushing || this.queue.length === 0) {
+      return;
+    }
+    const settings = this.getSettings();
+    if (!settings.serverUrl) {
+      console.error('URL сервера не задан в настройках расширения');
+      return;
+    }
+    
+    this.flushing = true;
+    const queued = this.queue.slice(0, OrderSendQueue.MAX_BATCH);
+    
+    try {
+      // Ордера, которые уже есть на сервере (по фильтру известных id), не отправляем
+      const batch = await this.filterNew(queued);
+      if (batch.length < queued.length) {
+        const fresh = new Set(batch.map(order => order.order_id));
+        const known = queued.map(order => order.order_id).filter(orderId => !fresh.has(orderId));
+        console.log(`⏭️ ${known.length} ордеров уже есть на сервере, пропускаем`);
+        await this.markSent(known);
+      }
+      
+      if (batch.length > 0) {
+        await this.sendBatch(settings, batch);
+      }
+    } catch (error) {
+      // Сеть недоступна - ордера остаются в очереди до следующей попытки
+      console.error('💥 Ошибка отправки пачки ордеров:', error);
+      this.scheduleRetry();
+    } finally {
+      this.flushing = false;
+    }
+    
+    if (this.attempt === 0 && this.queue.length > 0) {
+      this.scheduleFlush(0);
+    }
+  }
+
+  async sendBatch(settings, batch) {
+    // Ключ идемпотентности зависит только от содержимого пачки, поэтому повтор после обрыва не создаст дублей
+    const idempotencyKey = 'queue-' + batch.length + '-' + hashString(JSON.stringify(batch));
+    
+    console.log(`🚀 Отправляем пачку из ${batch.length} ордеров на сервер`);
+    const response = await fetch(`${settings.serverUrl}/api/orders`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Idempotency-Key': idempotencyKey
+      },
+      body: JSON.stringify(batch)
+    });
+    
+    if (response.ok) {
+      const result = await response.json();
+      const failed = result.results.filter(item => item.status === 'error');
+      failed.forEach(item => console.error('❌ Ордер отклонен сервером:', item.order_id, item.error));
+      
+      // Отклоненные сервером ордера повторно не отправляем: ошибка в данных не исправится
+      await this.markSent(batch.map(order => order.order_id));
+      this.onDelivered(result.results.filter(item => item.status !== 'error').map(item => item.order_id));
+      this.attempt = 0;
+      this.onSent(result.created, failed.length);
+    } else if (response.status >= 500 || response.status === 429) {
+      console.error('❌ Сервер не принял пачку ордеров:', response.status);
+      this.scheduleRetry();
+    } else {
+      // 4xx - пачка некорректна целиком, повтор не поможет
+      const errorText = await response.text();
+      console.error('❌ Пачка ордеров отклонена:', response.status, errorText);
+      await this.markSent(batch.map(order => order.order_id));
+      this.attempt = 0;
+      this.onError(`Ошибка сохранения ордеров: ${response.status}`);
+    }
+  }
+}
+
+// Простой 32-битный хеш строки (FNV-1a) для ключей идемпотентности
+function hashString(text) {
+  let hash = 0x811c9dc5;
+  for (let i = 0; i < text.length; i++) {
+    hash ^= text.charCodeAt(i);
+    hash = Math.imul(hash, 0x01000193) >>> 0;
+  }
+  return hash.toString(16);
+}
+
+// base64 для больших массивов байт (String.fromCharCode(...bytes) переполняет стек)
+function bytesToBase64(bytes) {
+  let binary = '';
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+// FNV-1a по байтам UTF-8 с заданным начальным значением (как _fnv1a32 на сервере)
+function fnv1a32(bytes, seed) {
+  let hash = seed;
+  for (let i = 0; i < bytes.length; i++) {
+    hash ^= bytes[i];
+    hash = Math.imul(hash, 0x01000193) >>> 0;
+  }
+  return hash;
+}
+
+// Фильтр Блума order_id, которые уже есть на сервере (/api/orders/known-filter).
+// Хранится в chrome.storage.local и обновляется инкрементально: сервер присылает биты
+// ордеров, записанных с момента cursor (с запасом), они объединяются с имеющимися через OR.
+// Когда ордеров становится больше, чем вмещает фильтр, сервер присылает новый полный фильтр.
+// "Нет в фильтре" - точный ответ; "есть" уточняется одним запросом к /api/orders/known-ids.
+class KnownOrderFilter {
+  constructor(getSettings) {
+    this.getSettings = getSettings;
+    this.state = null;  // {scope, m, k, cursor (время сервера, ISO), bits (base64), fetchedAt}
+    this.bytes = null;
+    this.refreshing = null;
+  }
+
+  static get STORAGE_KEY() { return 'knownOrderFilter'; }
+  static get WINDOW_DAYS() { return 30; }                         // За какой период берем ордера сервера
+  static get INCREMENTAL_REFRESH_MS() { return 60 * 1000; }       // Как часто дозапрашивать новые ордера
+  static get FULL_REFRESH_MS() { return 6 * 60 * 60 * 1000; }     // Как часто строить фильтр заново
+  static get H1_SEED() { return 0x811c9dc5; }
+  static get H2_SEED() { return 0x050c5d1f; }
+
+  async load() {
+    try {
+      const result = await chrome.storage.local.get([KnownOrderFilter.STORAGE_KEY]);
+      this.setState(result[KnownOrderFilter.STORAGE_KEY] || null);
+    } catch (error) {
+      console.error('Ошибка загрузки фильтра известных ордеров:', error);
+    }
+  }
+
+  setState(state) {
+    this.state = state;
+    this.bytes = state ? Uint8Array.from(atob(state.bits), char => char.charCodeAt(0)) : null;
+  }
+
+  async persist() {
+    const state = this.state ? {
+      ...this.state,
+      bits: bytesToBase64(this.bytes)
+    } : null;
+    this.state = state;
+    try {
+      await chrome.storage.local.set({ [KnownOrderFilter.STORAGE_KEY]: state });
+    } catch (error) {
+      console.error('Ошибка сохранения фильтра известных ордеров:', error);
+    }
+  }
+
+  scope(settings) {
+    return `${settings.serverUrl}|${settings.employeeId}|bybit`;
+  }
+
+  indexes(orderId) {
+    const bytes = new TextEncoder().encode(String(orderId));
+    const h1 = fnv1a32(bytes, KnownOrderFilter.H1_SEED);
+    const h2 = (fnv1a32(bytes, KnownOrderFilter.H2_SEED) | 1) >>> 0;
+    const result = [];
+    for (let j = 0; j < this.state.k; j++) {
+      result.push((h1 + j * h2) % this.state.m);
+    }
+    return result;
+  }
+
+  mightContain(orderId) {
+    if (!this.bytes) return false;
+    return this.indexes(orderId).every(index => (this.bytes[index >> 3] & (1 << (index & 7))) !== 0);
+  }
+
+  // Добавляет ордера, которые сервер только что принял
+  async add(orderIds) {
+    if (!this.bytes || orderIds.length === 0) return;
+    orderIds.forEach(orderId => {
+      this.indexes(orderId).forEach(index => {
+        this.bytes[index >> 3] |= 1 << (index & 7);
+      });
+    });
+    await this.persist();
+  }
+
+  async refresh() {
+    // Параллельные вызовы ждут один и тот же запрос
+    if (!this.refreshing) {
+      this.refreshing = this.doRefresh().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    return this.refreshing;
+  }
+
+  async doRefresh() {
+    const settings = this.getSettings();
+    if (!settings.serverUrl || !settings.employeeId) return;
+    
+    const now = Date.now();
+    const scope = this.scope(settings);
+    const sameScope = this.state && this.state.scope === scope;
+    const age = sameScope ? now - this.state.fetchedAt : Infinity;
+    if (age < KnownOrderFilter.INCREMENTAL_REFRESH_MS) return;
+    // Курсор старого формата (id ордера) не подходит для дельты - строим фильтр заново
+    const incremental = age < KnownOrderFilter.FULL_REFRESH_MS && typeof this.state.cursor === 'string';
+    
+    const startDate = new Date(now - KnownOrderFilter.WINDOW_DAYS * 24 * 60 * 60 * 1000).toISOString().slice(0, 10);
+    const params = new URLSearchParams({
+      employee_id: settings.employeeId,
+      platform: 'bybit',
+      start_date: startDate
+    });
+    if (incremental) {
+      params.set('since', this.state.cursor);
+      params.set('m', this.state.m);
+      params.set('k', this.state.k);
+    }
+    
+    const response = await fetch(`${settings.serverUrl}/api/orders/known-filter?${params}`);
+    if (!response.ok) {
+      throw new Error(`Фильтр известных ордеров: ${response.status}`);
+    }
+    const result = await response.json();
+    
+    if (incremental && result.incremental && result.m === this.state.m && result.k === this.state.k) {
+      const delta = Uint8Array.from(atob(result.bits), char => char.charCodeAt(0));
+      delta.forEach((byte, i) => {
+        this.bytes[i] |= byte;
+      });
+      this.state.cursor = result.cursor;
+      this.state.fetchedAt = now;
+    } else if (result.incremental) {
+      // Дельту другого размера нельзя объединить с фильтром - строим фильтр заново
+      this.setState(null);
+      return this.doRefresh();
+    } else {
+      // Полный фильтр (в том числе если сервер перестроил переполненный фильтр)
+      this.setState({ scope, m: result.m, k: result.k, cursor: result.cursor, bits: result.bits, fetchedAt: now });
+    }
+    console.log(`🧮 Фильтр известных ордеров обновлен (${result.incremental ? 'новых' : 'всего'}: ${result.count})`);
+    await this.persist();
+  }
+
+  // Оставляет только ордера, которых нет на сервере. При ошибке возвращает все: сервер сам отсеет дубли
+  async filterNew(orders) {
+    if (orders.length === 0) return orders;
+    try {
+      await this.refresh();
+      const maybeKnown = orders.filter(order => this.mightContain(order.order_id));
+      if (maybeKnown.length === 0) return orders;
+      
+      // Срабатывание фильтра может быть ложным - уточняем одним запросом
+      const settings = this.getSettings();
+      const response = await fetch(`${settings.serverUrl}/api/orders/known-ids`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ order_ids: maybeKnown.map(order => order.order_id) })
+      });
+      if (!response.ok) return orders;
+      const known = new Set((await response.json()).known);
+      return orders.filter(order => !known.has(order.order_id));
+    } catch (error) {
+      console.error('Ошибка проверки известных ордеров:', error);
+      return orders;
+    }
+  }
+}
+
 class BybitOrderTracker {
+  static get SCAN_DEBOUNCE_MS() { return 150; }  // Сколько собирать мутации перед разбором
+
+  // Элементы, в которых может быть ордер: строки таблиц и типовые строки/карточки div-верстки
+  static get ORDER_ROW_SELECTOR() {
+    return [
+      'tr',                       // Строки таблиц
+      '.ant-table-row',           // Ant Design таблицы
+      '[data-row-key]',           // Строки с data-row-key
+      '.order-row',               // Строки ордеров
+      '.trade-row',               // Строки сделок
+      '.history-row',             // Строки истории
+      '[class*="order"]:not([class*="button"]):not([class*="header"])',  // Элементы с "order" (кроме кнопок и заголовков)
+      '[class*="trade"]:not([class*="button"]):not([class*="header"])',  // Элементы с "trade" (кроме кнопок и заголовков)
+      '.table-row',               // Общие строки таблицы
+      '[data-testid*="order"]',   // Элементы с "order" в data-testid
+      '[data-testid*="trade"]',   // Элементы с "trade" в data-testid
+      '.rc-table-row',            // React Component таблицы
+      '[class*="list-item"]',     // Элементы списка
+      '[class*="card"]',          // Карточки
+      '.bybit-table-row',         // Специфичные классы Bybit
+      '[class*="history"]',       // Элементы истории
+      '[class*="transaction"]',   // Элементы транзакций
+      '.table-body-row',          // Строки тела таблицы
+      '[role="row"]',             // Элементы с ролью "row"
+      'div[class*="row"]',        // Div с "row" в классе
+      'div[class*="item"]',       // Div с "item" в классе
+      '[class*="entry"]',         // Элементы записи
+      '[class*="record"]'         // Элементы записи
+    ].join(', ');
+  }
+
+  // Строки, которые перепроверяются целиком, если изменилось что-то внутри них
+  static get ENCLOSING_ROW_SELECTOR() {
+    return 'tr, [role="row"], .ant-table-row, [data-row-key], .rc-table-row';
+  }
+
   constructor() {
     this.settings = {
       serverUrl: 'http://localhost:5000',
@@ -9,6 +442,23 @@ class BybitOrderTracker {
     };
     this.observer = null;
     this.processedOrders = new Set();
+    this.pendingScanNodes = new Set();
+    this.scanTimer = null;
+    this.rowSignatures = new WeakMap();
+    this.knownFilter = new KnownOrderFilter(() => this.settings);
+    this.sendQueue = new OrderSendQueue(() => this.settings, {
+      filterNew: (orders) => this.knownFilter.filterNew(orders),
+      onDelivered: (orderIds) => this.knownFilter.add(orderIds),
+      onSent: (created, failed) => {
+        if (created > 0) {
+          this.showSuccessNotification(created === 1 ? 'Ордер сохранен в системе' : `Сохранено ${created} ордеров`);
+        }
+        if (failed > 0) {
+          this.showErrorNotification(`${failed} ордеров сервер не принял`);
+        }
+      },
+      onError: (message) => this.showErrorNotification(message)
+    });
     this.init();
   }
 
@@ -16,6 +466,11 @@ class BybitOrderTracker {
     // Загружаем настройки
     await this.loadSettings();
     
+    // Восстанавливаем очередь отправки; уже отправленные ордера повторно не обрабатываем
+    await this.knownFilter.load();
+    await this.sendQueue.load();
+    this.sendQueue.knownIds().forEach(orderId => this.processedOrders.add(orderId));
+    
     // Слушаем сообщения от popup
     chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
       if (message.action === 'updateSettings') {
@@ -102,11 +557,13 @@ class BybitOrderTracker {
   }
 
   setupObserver() {
-    // Наблюдаем за изменениями в DOM
+    // Наблюдаем за изменениями в DOM, но разбираем только добавленные узлы
     this.observer = new MutationObserver((mutations) => {
       mutations.forEach((mutation) => {
         if (mutation.type === 'childList') {
-          this.checkForNewOrders();
+          mutation.addedNodes.forEach(node => this.queueScan(node));
+        } else if (mutation.type === 'characterData') {
+          this.queueScan(mutation.target.parentElement);
         }
       });
     });
@@ -114,98 +571,79 @@ class BybitOrderTracker {
     // Начинаем наблюдение
     this.observer.observe(document.body, {
       childList: true,
-      subtree: true
+      subtree: true,
+      characterData: true
     });
 
     // Первоначальная проверка
     this.checkForNewOrders();
   }
 
-  checkForNewOrders() {
-    // Ищем таблицы с ордерами
-    const orderTables = document.querySelectorAll('[data-testid="order-table"], .order-table, table');
+  queueScan(node) {
+    if (!node) return;
+    // Текстовый узел - проверяем его элемент
+    const element = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+    if (!element || element.closest('.bybit-tracker-notification')) return;
     
-    orderTables.forEach(table => {
-      const rows = table.querySelectorAll('tr');
-      rows.forEach(row => {
-        this.processOrderRow(row);
+    this.pendingScanNodes.add(element);
+    
+    // Пачку мутаций собираем SCAN_DEBOUNCE_MS и разбираем в ближайшем кадре
+    if (this.scanTimer) return;
+    this.scanTimer = setTimeout(() => {
+      requestAnimationFrame(() => {
+        this.scanTimer = null;
+        this.scanPendingNodes();
       });
-    });
+    }, BybitOrderTracker.SCAN_DEBOUNCE_MS);
+  }
+
+  scanPendingNodes() {
+    const nodes = [...this.pendingScanNodes];
+    this.pendingScanNodes.clear();
+    if (!this.settings.trackingEnabled) return;
+    
+    // Узлы, вложенные в другие ожидающие узлы или уже удаленные со страницы, не сканируем отдельно
+    const pending = new Set(nodes);
+    const hasPendingAncestor = (node) => {
+      for (let parent = node.parentElement; parent; parent = parent.parentElement) {
+        if (pending.has(parent)) return true;
+      }
+      return false;
+    };
+    nodes
+      .filter(node => node.isConnected && !hasPendingAncestor(node))
+      .forEach(root => this.scanSubtree(root));
+  }
 
-    // Ищем div-элементы с ордерами (для современных веб-приложений)
-    this.checkForDivOrders();
+  checkForNewOrders() {
+    // Полный проход по странице - только при запуске, дальше работают мутации
+    this.scanSubtree(document.body);
+  }
+
+  scanSubtree(root) {
+    // Строка, внутри которой что-то изменилось, проверяется целиком
+    const enclosingRow = root.closest(BybitOrderTracker.ENCLOSING_ROW_SELECTOR);
+    const rows = root.querySelectorAll(BybitOrderTracker.ORDER_ROW_SELECTOR);
+    if (enclosingRow) {
+      this.scanRow(enclosingRow);
+    }
+    rows.forEach(row => this.scanRow(row));
 
     // Ищем уведомления о завершении ордеров
-    this.checkOrderNotifications();
+    this.checkOrderNotifications(root);
   }
 
-    checkForDivOrders() {
-    // Сначала ищем элементы с высокой вероятностью содержания ордеров
-    const prioritySelectors = [
-      'tbody tr',                 // Строки в tbody (самый вероятный)
-      '.ant-table-tbody > tr',    // Прямые дочерние строки tbody
-      'tr:not(:first-child)',     // Строки таблиц (кроме заголовков)
-    ];
+  scanRow(row) {
+    // Кэш подписей строк: строка с тем же текстом уже разобрана, пропускаем ее
+    const signature = row.textContent;
+    if (this.rowSignatures.get(row) === signature) return;
+    this.rowSignatures.set(row, signature);
 
-    let foundOrders = false;
-    
-    // Проверяем приоритетные селекторы
-    for (const selector of prioritySelectors) {
-      const elements = document.querySelectorAll(selector);
-      console.log(`Проверяем селектор ${selector}: найдено ${elements.length} элементов`);
-      
-      elements.forEach(element => {
-        const elementText = element.textContent;
-        // Проверяем, что элемент содержит реальные данные ордера
-        if (this.isLikelyOrderElement(elementText)) {
-          console.log(`Найден потенциальный ордер в ${selector}:`, elementText.substring(0, 100));
-          this.processOrderElement(element);
-          foundOrders = true;
-        }
-      });
-      
-      // Если нашли ордера в приоритетных селекторах, не ищем в остальных
-      if (foundOrders) {
-        console.log(`Найдены ордера в приоритетном селекторе ${selector}, прекращаем поиск`);
-        return;
-      }
+    if (row.tagName === 'TR' && row.cells.length >= 5) {
+      this.processOrderRow(row);
+    } else if (this.isLikelyOrderElement(signature)) {
+      this.processOrderElement(row);
     }
-
-    // Если не нашли в приоритетных, ищем в остальных
-    const otherSelectors = [
-      '.ant-table-row',           // Ant Design таблицы
-      '[data-row-key]',           // Строки с data-row-key
-      '.order-row',               // Строки ордеров
-      '.trade-row',               // Строки сделок
-      '.history-row',             // Строки истории
-      '[class*="order"]:not([class*="button"]):not([class*="header"])',  // Элементы с "order" (кроме кнопок и заголовков)
-      '[class*="trade"]:not([class*="button"]):not([class*="header"])',  // Элементы с "trade" (кроме кнопок и заголовков)
-      '.table-row',               // Общие строки таблицы
-      '[data-testid*="order"]',   // Элементы с "order" в data-testid
-      '[data-testid*="trade"]',   // Элементы с "trade" в data-testid
-      '.rc-table-row',            // React Component таблицы
-      '[class*="list-item"]',     // Элементы списка
-      '[class*="card"]',          // Карточки
-      '.bybit-table-row',         // Специфичные классы Bybit
-      '[class*="history"]',       // Элементы истории
-      '[class*="transaction"]',   // Элементы транзакций
-      '.table-body-row',          // Строки тела таблицы
-      '[role="row"]',             // Элементы с ролью "row"
-      'div[class*="row"]',        // Div с "row" в классе
-      'div[class*="item"]',       // Div с "item" в классе
-      '[class*="entry"]',         // Элементы записи
-      '[class*="record"]'         // Элементы записи
-    ];
-
-    otherSelectors.forEach(selector => {
-      const elements = document.querySelectorAll(selector);
-      elements.forEach(element => {
-        const elementText = element.textContent;
-        if (this.isLikelyOrderElement(elementText)) {
-          this.processOrderElement(element);
-        }
-      });
-    });
   }
 
   isLikelyOrderElement(text) {
@@ -610,9 +1048,13 @@ class BybitOrderTracker {
     return result;
   }
 
-  checkOrderNotifications() {
+  checkOrderNotifications(root = document) {
     // Ищем уведомления о завершении ордеров
-    const notifications = document.querySelectorAll('.notification, .toast, .alert, [role="alert"]');
+    const selector = '.notification, .toast, .alert, [role="alert"]';
+    const notifications = [...root.querySelectorAll(selector)];
+    if (root.matches && root.matches(selector)) {
+      notifications.push(root);
+    }
     
     notifications.forEach(notification => {
       const text = notification.textContent.toLowerCase();
@@ -658,60 +1100,12 @@ class BybitOrderTracker {
   }
 
   async sendOrderToServer(orderData) {
-    try {
-      console.log('🚀 Отправляем ордер на сервер:', orderData);
-      console.log('🔗 URL сервера:', `${this.settings.serverUrl}/api/orders`);
-      
-      // Проверяем, что URL сервера задан
-      if (!this.settings.serverUrl) {
-        throw new Error('URL сервера не задан в настройках расширения');
-      }
-      
-      // Проверяем соединение с сервером
-      console.log('🔍 Проверяем соединение с сервером...');
-      
-      const response = await fetch(`${this.settings.serverUrl}/api/orders`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(orderData)
-      });
-
-      console.log('📡 Ответ сервера - статус:', response.status);
-      
-      if (response.ok) {
-        const responseData = await response.json();
-        console.log('✅ Ордер успешно сохранен:', responseData);
-        this.showSuccessNotification('Ордер сохранен в системе');
-        return true;
-      } else {
-        const errorText = await response.text();
-        console.error('❌ Ошибка сохранения ордера:', response.status, errorText);
-        this.showErrorNotification(`Ошибка сохранения ордера: ${response.status}`);
-        return false;
-      }
-    } catch (error) {
-      console.error('💥 Ошибка отправки ордера:', error);
-      
-      // Детальная диагностика ошибки
-      let errorMessage = 'Ошибка соединения с сервером';
-      
-      if (error.name === 'TypeError' && error.message.includes('Failed to fetch')) {
-        errorMessage = 'Сервер недоступен. Проверьте:\n1. Запущен ли сервер на ' + this.settings.serverUrl + '\n2. Правильность URL в настройках расширения\n3. Не блокирует ли браузер запросы';
-        console.error('🔥 Сервер недоступен! Проверьте:');
-        console.error('   1. Запущен ли сервер на:', this.settings.serverUrl);
-        console.error('   2. Правильность URL в настройках расширения');
-        console.error('   3. Не блокирует ли браузер запросы');
-      } else if (error.name === 'TypeError' && error.message.includes('NetworkError')) {
-        errorMessage = 'Сетевая ошибка. Проверьте интернет-соединение';
-      } else if (error.message.includes('URL сервера не задан')) {
-        errorMessage = 'Настройте URL сервера в расширении';
-      }
-      
-      this.showErrorNotification(errorMessage);
-      return false;
+    // Ордер ставится в очередь и уйдет на сервер в ближайшей пачке
+    const queued = await this.sendQueue.enqueue(orderData);
+    if (queued) {
+      console.log('📥 Ордер поставлен в очередь отправки:', orderData.order_id);
     }
+    return queued;
   }
 
   showSuccessNotification(message) {
@@ -736,6 +1130,7 @@ class BybitOrderTracker {
       z-index: 10000;
       background: ${type === 'success' ? '#28a745' : '#dc3545'};
     `;
+    notification.className = 'bybit-tracker-notification';
     notification.textContent = message;
     
     document.body.appendChild(notification);
@@ -908,62 +1303,65 @@ class BybitOrderTracker {
       console.log(`Найдено ${allOrders.length} ордеров для загрузки`);
       
       if (allOrders.length === 0) {
-        // Дополнительная отладка - показываем что нашли на странице
-        console.log('Отладка: ищем любые элементы с текстом, содержащим ключевые слова...');
-        const allElements = document.querySelectorAll('*');
-        let foundElements = 0;
-        
-        allElements.forEach(el => {
-          const text = el.textContent.toLowerCase();
-          if ((text.includes('order') || text.includes('trade') || text.includes('buy') || text.includes('sell') ||
-               text.includes('продажа') || text.includes('покупка') || text.includes('usdt') || text.includes('rub')) && 
-              text.length > 10 && text.length < 500) {
-            console.log('Найден элемент с потенциальными данными ордера:', el.tagName, el.className, text.substring(0, 100));
-            foundElements++;
-          }
-        });
-        
-        console.log(`Найдено ${foundElements} элементов с потенциальными данными ордеров`);
-        
-        // Специальная отладка для Bybit - ищем элементы с RUB или USDT
-        console.log('Специальная отладка для Bybit:');
-        const bybitElements = document.querySelectorAll('*');
-        bybitElements.forEach(el => {
-          const text = el.textContent;
-          if (text.includes('RUB') || text.includes('USDT')) {
-            console.log('Элемент с валютой:', el.tagName, el.className, text.substring(0, 150));
-          }
-        });
+        // Для отладки сообщаем, сколько элементов проверили (без повторного обхода всего документа)
+        const foundElements = processedElements.size;
+        console.log(`Проверено ${foundElements} элементов с потенциальными данными ордеров`);
         
         this.showNotification(`Ордера не найдены на странице. Найдено ${foundElements} потенциальных элементов.`, 'error');
         return { success: false, error: `Ордера не найдены на странице. Найдено ${foundElements} потенциальных элементов.` };
       }
       
-      // Отправляем ордера на сервер
+      // Ордера, которые уже есть на сервере, не отправляем
+      const foundCount = allOrders.length;
+      allOrders = await this.knownFilter.filterNew(allOrders);
+      if (allOrders.length < foundCount) {
+        console.log(`⏭️ ${foundCount - allOrders.length} ордеров уже есть на сервере`);
+      }
+      
+      // Отправляем ордера на сервер пачками через /api/orders/batch
       let successCount = 0;
       let errorCount = 0;
+      const batchSize = 200;
       
-      for (const orderData of allOrders) {
+      for (let start = 0; start < allOrders.length; start += batchSize) {
+        const batch = allOrders.slice(start, start + batchSize);
+        // Ключ идемпотентности зависит от содержимого пачки: повторная отправка вернет тот же ответ
+        const idempotencyKey = 'load-' + settings.employeeId + '-' + batch.length + '-' + hashString(JSON.stringify(batch));
+        
         try {
-          const response = await fetch(`${settings.serverUrl}/api/orders`, {
+          const response = await fetch(`${settings.serverUrl}/api/orders/batch`, {
             method: 'POST',
             headers: {
               'Content-Type': 'application/json',
+              'Idempotency-Key': idempotencyKey
             },
-            body: JSON.stringify(orderData)
+            body: JSON.stringify(batch)
           });
 
           if (response.ok) {
-            successCount++;
-            // Добавляем в обработанные, чтобы избежать дублирования
-            this.processedOrders.add(orderData.order_id);
+            const result = await response.json();
+            result.results.forEach(item => {
+              if (item.status === 'error') {
+                errorCount++;
+                console.error('Ошибка сохранения ордера:', item.order_id, item.error);
+              } else {
+                // Созданные и уже существующие ордера добавляем в обработанные, чтобы избежать дублирования
+                if (item.status === 'created') {
+                  successCount++;
+                }
+                this.processedOrders.add(item.order_id);
+              }
+            });
+            const deliveredIds = result.results.filter(item => item.status !== 'error').map(item => item.order_id);
+            await this.sendQueue.markSent(deliveredIds);
+            await this.knownFilter.add(deliveredIds);
           } else {
-            errorCount++;
-            console.error('Ошибка сохранения ордера:', orderData.order_id, response.status);
+            errorCount += batch.length;
+            console.error('Ошибка сохранения пачки ордеров:', response.status);
           }
         } catch (error) {
-          errorCount++;
-          console.error('Ошибка отправки ордера:', orderData.order_id, error);
+          errorCount += batch.length;
+          console.error('Ошибка отправки пачки ордеров:', error);
         }
       }
       
@@ -973,14 +1371,16 @@ class BybitOrderTracker {
         if (errorCount > 0) {
           this.showErrorNotification(`${errorCount} ордеров не удалось загрузить`);
         }
+      } else if (errorCount === 0) {
+        this.showSuccessNotification('Все найденные ордера уже есть в системе');
       } else {
         this.showErrorNotification('Не удалось загрузить ни одного ордера');
       }
       
       return { 
-        success: successCount > 0, 
+        success: successCount > 0 || errorCount === 0, 
         count: successCount,
-        total: allOrders.length,
+        total: foundCount,
         errors: errorCount
       };
       
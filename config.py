@@ -12,6 +12,10 @@ class Config:
     
     # Admin password
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'Blalala2')
+    
+    # Фоновые задачи импорта (потоки внутри процесса приложения)
+    IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS', 2))
+    IMPORT_JOBS_SYNC = False
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -39,6 +43,8 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # База в памяти не видна из других потоков - задачи импорта выполняются прямо в запросе
+    IMPORT_JOBS_SYNC = True
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,39 @@
+"""add order_batch_request table
+
+Revision ID: b3d9f1a6c510
+Revises: a1c7e5b9d402
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d9f1a6c510'
+down_revision: Union[str, Sequence[str], None] = 'a1c7e5b9d402'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ответы пакетной загрузки ордеров по ключу идемпотентности
+    op.create_table('order_batch_request',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=100), nullable=False),
+    sa.Column('request_hash', sa.String(length=64), nullable=False),
+    sa.Column('response_json', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index('ix_order_batch_request_created_at', 'order_batch_request', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_batch_request_created_at', table_name='order_batch_request')
+    op.drop_table('order_batch_request')
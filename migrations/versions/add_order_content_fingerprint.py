@@ -0,0 +1,82 @@
+"""add content_fingerprint to order
+
+Revision ID: a1c7e5b9d402
+Revises: 8f5d9e2f3b34
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c7e5b9d402'
+down_revision: Union[str, Sequence[str], None] = '8f5d9e2f3b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def order_content_fingerprint(symbol, side, quantity, price, executed_at):
+    """Копия app.order_content_fingerprint: миграция не должна зависеть от кода приложения"""
+    canonical = '|'.join([
+        str(symbol or '').upper(),
+        str(side or '').lower(),
+        '%.8f' % float(quantity or 0),
+        '%.8f' % float(price or 0),
+        executed_at.strftime('%Y-%m-%d %H:%M:%S') if executed_at else ''
+    ])
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('order', sa.Column('content_fingerprint', sa.String(length=40), nullable=True))
+    
+    # Заполняем отпечатки у существующих BTC ордеров. Если в БД уже лежат дубли,
+    # отпечаток получает только самый ранний ордер, иначе не создастся уникальный индекс
+    connection = op.get_bind()
+    order_table = sa.table(
+        'order',
+        sa.column('id', sa.Integer),
+        sa.column('platform', sa.String),
+        sa.column('symbol', sa.String),
+        sa.column('side', sa.String),
+        sa.column('quantity', sa.Numeric),
+        sa.column('price', sa.Numeric),
+        sa.column('executed_at', sa.DateTime),
+        sa.column('content_fingerprint', sa.String)
+    )
+    rows = connection.execute(
+        sa.select(
+            order_table.c.id, order_table.c.symbol, order_table.c.side,
+            order_table.c.quantity, order_table.c.price, order_table.c.executed_at
+        ).where(order_table.c.platform == 'bybit_btc').order_by(order_table.c.id)
+    ).fetchall()
+    
+    seen = set()
+    updates = []
+    for row in rows:
+        fingerprint = order_content_fingerprint(row.symbol, row.side, row.quantity, row.price, row.executed_at)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        updates.append({'order_pk': row.id, 'fingerprint': fingerprint})
+    
+    update_stmt = order_table.update().where(
+        order_table.c.id == sa.bindparam('order_pk')
+    ).values(content_fingerprint=sa.bindparam('fingerprint'))
+    for i in range(0, len(updates), BACKFILL_BATCH_SIZE):
+        connection.execute(update_stmt, updates[i:i + BACKFILL_BATCH_SIZE])
+    
+    op.create_index('ix_order_content_fingerprint', 'order', ['content_fingerprint'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_content_fingerprint', table_name='order')
+    op.drop_column('order', 'content_fingerprint')
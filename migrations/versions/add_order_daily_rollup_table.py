@@ -0,0 +1,56 @@
+"""add order_daily_rollup table
+
+Revision ID: f4c1d9a7b263
+Revises: e2b8f4a1c937
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1d9a7b263'
+down_revision: Union[str, Sequence[str], None] = 'e2b8f4a1c937'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('order_daily_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('platform', sa.String(length=20), nullable=False),
+    sa.Column('side', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('count_in_sales', sa.Boolean(), nullable=False),
+    sa.Column('count_in_purchases', sa.Boolean(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('quantity_sum', sa.Numeric(precision=20, scale=8), nullable=False),
+    sa.Column('total_usdt_sum', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_daily_rollup_key', 'order_daily_rollup',
+                    ['day', 'employee_id', 'platform', 'side', 'status', 'count_in_sales', 'count_in_purchases'],
+                    unique=True)
+    # Сводки по уже загруженным ордерам (то же делает `flask rebuild-order-rollups`)
+    op.execute(
+        'INSERT INTO order_daily_rollup (day, employee_id, platform, side, status, count_in_sales, '
+        'count_in_purchases, order_count, quantity_sum, total_usdt_sum) '
+        'SELECT date(executed_at), employee_id, platform, side, status, '
+        'COALESCE(count_in_sales, 0), COALESCE(count_in_purchases, 0), '
+        'COUNT(id), COALESCE(SUM(quantity), 0), COALESCE(SUM(total_usdt), 0) '
+        'FROM `order` '
+        'GROUP BY date(executed_at), employee_id, platform, side, status, '
+        'COALESCE(count_in_sales, 0), COALESCE(count_in_purchases, 0)'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_daily_rollup_key', table_name='order_daily_rollup')
+    op.drop_table('order_daily_rollup')
@@ -0,0 +1,41 @@
+"""add shift_profit_snapshot table
+
+Revision ID: e2b8f4a1c937
+Revises: d7a4c2e9b815
+Create Date: 2026-10-18 17:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8f4a1c937'
+down_revision: Union[str, Sequence[str], None] = 'd7a4c2e9b815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('shift_profit_snapshot',
+    sa.Column('shift_report_id', sa.Integer(), nullable=False),
+    sa.Column('order_profit_json', sa.Text(), nullable=True),
+    sa.Column('report_profit_json', sa.Text(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['shift_report_id'], ['shift_report.id'], ),
+    sa.PrimaryKeyConstraint('shift_report_id')
+    )
+    # Пустой снимок для каждого существующего отчета: значения посчитаются при первом чтении
+    op.execute(
+        'INSERT INTO shift_profit_snapshot (shift_report_id, version) '
+        'SELECT id, 0 FROM shift_report'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('shift_profit_snapshot')
@@ -0,0 +1,135 @@
+"""add shift_report_balance table
+
+Revision ID: d7a4c2e9b815
+Revises: c5e2a8d4f713
+Create Date: 2026-10-18 16:30:00.000000
+
+"""
+import json
+import math
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a4c2e9b815'
+down_revision: Union[str, Sequence[str], None] = 'c5e2a8d4f713'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 500
+SHIFT_REPORT_BALANCE_LIMIT = 10 ** 13
+
+
+def _balance_number(value):
+    """Копия app._balance_number: миграция не должна зависеть от кода приложения"""
+    if value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number) or abs(number) >= SHIFT_REPORT_BALANCE_LIMIT:
+        return None
+    return number
+
+
+def shift_report_balance_rows(report_id, employee_id, shift_date, shift_type, balances_json):
+    """Копия app.shift_report_balance_rows"""
+    try:
+        balances = json.loads(balances_json or '{}')
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(balances, dict):
+        return []
+    rows = []
+    seen = set()
+    for platform, accounts in balances.items():
+        if not isinstance(accounts, list):
+            continue
+        for acc in accounts:
+            if not isinstance(acc, dict):
+                continue
+            try:
+                account_id = int(acc.get('account_id') or acc.get('id'))
+            except (TypeError, ValueError):
+                account_id = None
+            account_name = acc.get('account_name')
+            account_name = str(account_name)[:100] if account_name not in (None, '') else None
+            key = (platform, account_id if account_id is not None else account_name)
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append({
+                'shift_report_id': report_id,
+                'employee_id': employee_id,
+                'platform': str(platform)[:20],
+                'account_id': account_id,
+                'account_name': account_name,
+                'shift_date': shift_date,
+                'shift_type': shift_type,
+                'start_balance': _balance_number(acc.get('start_balance')),
+                'end_balance': _balance_number(acc.get('end_balance')),
+                'balance': _balance_number(acc.get('balance'))
+            })
+    return rows
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    balance_table = op.create_table('shift_report_balance',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('shift_report_id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=True),
+    sa.Column('platform', sa.String(length=20), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=True),
+    sa.Column('account_name', sa.String(length=100), nullable=True),
+    sa.Column('shift_date', sa.Date(), nullable=False),
+    sa.Column('shift_type', sa.String(length=20), nullable=False),
+    sa.Column('start_balance', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('end_balance', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.Column('balance', sa.Numeric(precision=15, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['shift_report_id'], ['shift_report.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    
+    # Переносим балансы из balances_json существующих отчетов порциями
+    connection = op.get_bind()
+    report_table = sa.table(
+        'shift_report',
+        sa.column('id', sa.Integer),
+        sa.column('employee_id', sa.Integer),
+        sa.column('shift_date', sa.Date),
+        sa.column('shift_type', sa.String),
+        sa.column('balances_json', sa.Text)
+    )
+    last_id = 0
+    while True:
+        reports = connection.execute(
+            sa.select(
+                report_table.c.id, report_table.c.employee_id, report_table.c.shift_date,
+                report_table.c.shift_type, report_table.c.balances_json
+            ).where(report_table.c.id > last_id).order_by(report_table.c.id).limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not reports:
+            break
+        rows = []
+        for report in reports:
+            rows.extend(shift_report_balance_rows(
+                report.id, report.employee_id, report.shift_date, report.shift_type, report.balances_json
+            ))
+        if rows:
+            connection.execute(balance_table.insert(), rows)
+        last_id = reports[-1].id
+    
+    op.create_index('ix_shift_report_balance_shift_report_id', 'shift_report_balance', ['shift_report_id'], unique=False)
+    op.create_index('ix_shift_report_balance_account_shift', 'shift_report_balance', ['account_id', 'shift_date', 'shift_type'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shift_report_balance_account_shift', table_name='shift_report_balance')
+    op.drop_index('ix_shift_report_balance_shift_report_id', table_name='shift_report_balance')
+    op.drop_table('shift_report_balance')
@@ -85,6 +85,34 @@ CREATE TABLE IF NOT EXISTS shift_report (
     FOREIGN KEY (employee_id) REFERENCES employee(id)
 );
 
+-- Нормализованные балансы аккаунтов из balances_json отчетов смен
+CREATE TABLE IF NOT EXISTS shift_report_balance (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    shift_report_id INT NOT NULL,
+    employee_id INT NULL,
+    platform VARCHAR(20) NOT NULL,
+    account_id INT NULL,
+    account_name VARCHAR(100) NULL,
+    shift_date DATE NOT NULL,
+    shift_type VARCHAR(20) NOT NULL,
+    start_balance DECIMAL(15,2) NULL,
+    end_balance DECIMAL(15,2) NULL,
+    balance DECIMAL(15,2) NULL,
+    INDEX ix_shift_report_balance_shift_report_id (shift_report_id),
+    INDEX ix_shift_report_balance_account_shift (account_id, shift_date, shift_type),
+    FOREIGN KEY (shift_report_id) REFERENCES shift_report(id)
+);
+
+-- Снимки прибыли смен (NULL - снимок сброшен и будет пересчитан при чтении)
+CREATE TABLE IF NOT EXISTS shift_profit_snapshot (
+    shift_report_id INT PRIMARY KEY,
+    order_profit_json TEXT NULL,
+    report_profit_json TEXT NULL,
+    version INT NOT NULL DEFAULT 0,
+    computed_at DATETIME NULL,
+    FOREIGN KEY (shift_report_id) REFERENCES shift_report(id)
+);
+
 -- Таблица деталей ордеров
 CREATE TABLE IF NOT EXISTS order_detail (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -143,11 +171,53 @@ CREATE TABLE IF NOT EXISTS `order` (
     count_in_sales BOOLEAN DEFAULT FALSE,
     count_in_purchases BOOLEAN DEFAULT FALSE,
     executed_at DATETIME NOT NULL,
+    content_fingerprint VARCHAR(40) NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE INDEX ix_order_content_fingerprint (content_fingerprint),
     FOREIGN KEY (employee_id) REFERENCES employee(id)
 );
 
+-- Дневные сводки ордеров (число и суммы по дню, сотруднику, площадке, стороне, статусу и флагам учета)
+CREATE TABLE IF NOT EXISTS order_daily_rollup (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    day DATE NOT NULL,
+    employee_id INT NOT NULL,
+    platform VARCHAR(20) NOT NULL,
+    side VARCHAR(10) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    count_in_sales BOOLEAN NOT NULL DEFAULT FALSE,
+    count_in_purchases BOOLEAN NOT NULL DEFAULT FALSE,
+    order_count INT NOT NULL DEFAULT 0,
+    quantity_sum DECIMAL(20,8) NOT NULL DEFAULT 0,
+    total_usdt_sum DECIMAL(20,2) NOT NULL DEFAULT 0,
+    UNIQUE INDEX ix_order_daily_rollup_key (day, employee_id, platform, side, status, count_in_sales, count_in_purchases)
+);
+
+-- Ответы пакетной загрузки ордеров по ключу идемпотентности
+CREATE TABLE IF NOT EXISTS order_batch_request (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    idempotency_key VARCHAR(100) NOT NULL UNIQUE,
+    request_hash VARCHAR(64) NOT NULL,
+    response_json TEXT NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_order_batch_request_created_at (created_at)
+);
+
+-- Фоновые задачи импорта и их прогресс
+CREATE TABLE IF NOT EXISTS import_job (
+    id VARCHAR(32) PRIMARY KEY,
+    kind VARCHAR(30) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    stage VARCHAR(20) NOT NULL,
+    counters_json TEXT,
+    result_json LONGTEXT,
+    error TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX ix_import_job_created_at (created_at)
+);
+
 -- Таблица истории скамов сотрудников
 CREATE TABLE IF NOT EXISTS employee_scam_history (
     id INT AUTO_INCREMENT PRIMARY KEY,
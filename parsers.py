@@ -0,0 +1,1416 @@
+"""
+Разбор выгрузок площадок (Bybit, HTX, Gate, Bliss, Bybit BTC).
+
+Модуль не зависит от Flask и базы данных: его импортируют процессы пула
+разбора (см. prefetch_parsed_files в app.py), поэтому при импорте здесь
+не должно выполняться ничего, кроме объявлений.
+"""
+import os
+import re
+import csv
+import codecs
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from app_logging import get_logger, debug_sampled, ParseSummary
+
+# Опциональный импорт pandas
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+    pd = None
+
+parse_log = get_logger('parse')
+tz_log = get_logger('timezone')
+
+# Смещение времени каждой платформы относительно Москвы (в часах)
+PLATFORM_TIMEZONE_OFFSETS = {
+    'bybit': 3,   # Bybit время в UTC+0, МСК это UTC+3 → добавляем 3 часа
+    'htx': -5,    # HTX время в UTC+8, МСК это UTC+3 → вычитаем 5 часов
+    'bliss': 3,   # Bliss время в UTC+0, МСК это UTC+3 → добавляем 3 часа
+    'gate': 0     # Gate.io: пока без смещения (можно настроить позже)
+}
+
+def convert_to_moscow_time(datetime_obj, platform):
+    """
+    Конвертирует время из часового пояса платформы в московское время
+    
+    Args:
+        datetime_obj: объект datetime
+        platform: название платформы ('bybit', 'htx', 'bliss')
+    
+    Returns:
+        datetime объект в московском времени
+    """
+    if not datetime_obj:
+        debug_sampled(tz_log, 'empty', "Получен пустой datetime_obj для %s", platform)
+        return datetime_obj
+    
+    offset_hours = PLATFORM_TIMEZONE_OFFSETS.get(platform.lower(), 0)
+    
+    # Применяем смещение
+    if offset_hours != 0:
+        converted = datetime_obj + timedelta(hours=offset_hours)
+        debug_sampled(tz_log, 'convert', "%s: %s %+d ч -> %s", platform, datetime_obj, offset_hours, converted)
+        datetime_obj = converted
+    else:
+        debug_sampled(tz_log, 'no_offset', "Нет смещения для платформы %s", platform)
+    
+    return datetime_obj
+
+def parse_orders_file(filepath, platform, start_date=None, end_date=None, original_filename=None, parse_info=None):
+    """Парсит файл с ордерами в зависимости от платформы.
+
+    Если передан словарь parse_info, в него записывается диагностика разбора
+    (например, нераспознанные и неоднозначные колонки выгрузки) и итог разбора
+    ('summary': прочитано / принято / отброшено по причинам / время).
+    """
+    summary = ParseSummary(platform.lower(), original_filename or os.path.basename(filepath))
+    try:
+        return _parse_orders_file(filepath, platform, start_date, end_date, parse_info, summary)
+    finally:
+        result = summary.finish(parse_log)
+        if parse_info is not None:
+            parse_info['summary'] = result
+
+def _parse_orders_file(filepath, platform, start_date, end_date, parse_info, summary):
+    """Разбор файла для parse_orders_file; счетчики строк пишутся в summary"""
+    try:
+        # Проверяем, что файл существует
+        if not os.path.exists(filepath):
+            parse_log.error("Ошибка: файл %s не существует", filepath)
+            return []
+        
+        # Определяем тип файла по расширению
+        ext = os.path.splitext(filepath)[1].lower()
+        
+        if platform.lower() == 'bliss':
+            try:
+                parse_log.debug("BLISS: Пытаемся прочитать файл %s", filepath)
+                parse_log.debug("BLISS: Размер файла: %s байт", os.path.getsize(filepath))
+                
+                # Формат определяем по одному буферу из начала файла, затем читаем файл один раз
+                dialect = sniff_export_dialect(filepath, BLISS_REQUIRED_COLUMNS)
+                if parse_info is not None:
+                    parse_info['dialect'] = dialect
+                parse_log.debug("BLISS: Первые строки файла:")
+                for i, line in enumerate(dialect['sample_lines']):
+                    parse_log.debug("BLISS: Строка %s: %s", i+1, line)
+                parse_log.debug("BLISS: Определен формат: разделитель %r, кодировка %s, кавычки %r, строка заголовка %s", dialect['delimiter'], dialect['encoding'], dialect['quotechar'], dialect['header_row'] + 1)
+                
+                df = pd.read_csv(
+                    filepath,
+                    sep=dialect['delimiter'],
+                    encoding=dialect['encoding'],
+                    quotechar=dialect['quotechar'],
+                    skiprows=dialect['header_row'],
+                    header=0
+                )
+                parse_log.debug("BLISS: Найдены колонки: %s", list(df.columns))
+                parse_log.debug("BLISS: Количество строк: %s", len(df))
+                
+                # Проверяем, что нашли нужные колонки
+                missing_columns = [col for col in BLISS_REQUIRED_COLUMNS if col not in df.columns]
+                if missing_columns:
+                    parse_log.warning("BLISS: Отсутствуют колонки: %s", missing_columns)
+                    summary.read(len(df))
+                    summary.reject('bad_header', len(df))
+                    if parse_info is not None:
+                        parse_info['columns'] = {'missing_columns': missing_columns}
+                    return []
+                
+                orders_data = []
+                summary.read(len(df))
+                
+                # Время создания разбираем всей колонкой и переводим в МСК одним сдвигом
+                creation_dates = df['Creation date'].astype(str).str.strip()
+                creation_times = shift_to_moscow(_parse_datetime_column(creation_dates), platform)
+                
+                for idx, row in df.iterrows():
+                    try:
+                        # Получаем необходимые поля
+                        order_id = str(row['Internal id']).strip()
+                        account_name = str(row['Organization user']).strip()
+                        amount = str(row['Amount']).strip().replace(' ', '').replace(',', '.')
+                        crypto_amount = str(row['Crypto amount']).strip().replace(' ', '').replace(',', '.')
+                        status = str(row['Status']).strip()
+                        method = str(row['Method']).strip()  # Добавляем поле Method
+                        
+                        debug_sampled(parse_log, 'bliss.row',
+                                      "BLISS: строка order_id=%s, account_name=%s, amount=%s, crypto_amount=%s, status=%s, method=%s",
+                                      order_id, account_name, amount, crypto_amount, status, method)
+                        
+                        # Определяем сторону ордера на основе метода
+                        if method.lower() in ['sell', 'продажа', 'продать']:
+                            side = 'sell'
+                        else:
+                            side = 'buy'
+                        
+                        # Строки без разборного времени не принимаем
+                        executed_at = creation_times[idx]
+                        if pd.isna(executed_at):
+                            debug_sampled(parse_log, 'bliss.date', "BLISS: Не удалось разобрать дату '%s'", creation_dates[idx])
+                            summary.reject('bad_time')
+                            record_rejects(parse_info, [{'row': int(idx) + 1, 'order_id': order_id, 'reason': 'bad_time', 'value': creation_dates[idx]}])
+                            continue
+                        executed_at = executed_at.to_pydatetime()
+                        
+                        # Фильтруем по времени, если указаны границы
+                        if (start_date and executed_at < start_date) or (end_date and executed_at > end_date):
+                            debug_sampled(parse_log, 'bliss.window', "BLISS: Ордер %s (%s) вне времени смены", order_id, executed_at)
+                            summary.reject('out_of_window')
+                            continue
+                        
+                        # Конвертируем числовые значения
+                        try:
+                            total_usdt = float(amount)
+                            quantity = float(crypto_amount)
+                        except:
+                            debug_sampled(parse_log, 'bliss.number', "BLISS: Ошибка конвертации чисел: amount=%s, crypto_amount=%s", amount, crypto_amount)
+                            summary.reject('bad_number')
+                            continue
+                        
+                        # Проверяем обязательные поля
+                        if not order_id:
+                            debug_sampled(parse_log, 'bliss.missing', "BLISS: Пропускаем строку - не найден ID ордера")
+                            summary.reject('missing_order_id')
+                            continue
+                        
+                        if not account_name:
+                            debug_sampled(parse_log, 'bliss.missing', "BLISS: Пропускаем строку - не найдено имя аккаунта")
+                            summary.reject('missing_account')
+                            continue
+                        
+                        # Вычисляем цену
+                        price = total_usdt / quantity if quantity > 0 else 0
+                        
+                        # Определяем статус
+                        if status.lower() in ['success', 'completed', 'done']:
+                            order_status = 'filled'
+                        elif status.lower() in ['cancelled', 'canceled']:
+                            order_status = 'canceled'
+                        elif status.lower() in ['expired']:
+                            order_status = 'expired'
+                        elif status.lower() in ['failed']:
+                            order_status = 'failed'
+                        else:
+                            order_status = 'pending'
+                        
+                        order_data = {
+                            'order_id': order_id,
+                            'symbol': 'USDT',
+                            'side': side,
+                            'quantity': quantity,
+                            'price': price,
+                            'total_usdt': total_usdt,
+                            'fees_usdt': 0,
+                            'status': order_status,
+                            'executed_at': executed_at,
+                            # Organization user из выгрузки - только для распределения по аккаунтам
+                            # смены (route_orders_to_accounts); ордер сохраняется под выбранным аккаунтом
+                            'export_account': account_name
+                        }
+                        
+                        orders_data.append(order_data)
+                        summary.keep()
+                        
+                    except Exception as e:
+                        debug_sampled(parse_log, 'bliss.error', "BLISS: Ошибка парсинга строки: %s", e)
+                        summary.reject('row_error')
+                        continue
+                
+                return orders_data
+                
+            except Exception as e:
+                parse_log.error("BLISS: Ошибка чтения файла: %s", str(e))
+                return []
+                
+        elif ext not in ['.csv', '.xlsx', '.xls']:
+            raise Exception(f"Неподдерживаемый формат файла: {ext}")
+        
+        orders_data = []
+        
+        if platform.lower() in COLUMNAR_PLATFORMS:
+            # Bybit, HTX и Gate читаются порциями и разбираются по колонкам, без iterrows()
+            orders_data = parse_orders_stream(filepath, ext, platform, start_date, end_date, parse_info, summary)
+        elif platform.lower() == 'bybit_btc':
+            # Парсинг BTC файла Bybit (CSV с данными в первом столбце)
+            try:
+                window_scan = SortedWindowScan(start_date, end_date)
+                datetime_formats = {}
+                row_number = 0
+                rows_skipped = 0
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    # Пропускаем заголовок; дальше читаем файл порциями строк, не загружая его целиком
+                    next(f, None)
+                    while True:
+                        lines = list(islice(f, STREAM_CHUNK_ROWS))
+                        if not lines:
+                            break
+                        summary.read(len(lines))
+                        
+                        batch = []
+                        for line in lines:
+                            row_number += 1
+                            order_data = parse_bybit_btc_csv_line(line)
+                            if order_data:
+                                batch.append((row_number, order_data))
+                            else:
+                                summary.reject('bad_line')
+                        if not batch:
+                            continue
+                        
+                        # Время всей порции разбираем одним вызовом и переводим в МСК (+3 часа)
+                        raw_times = pd.Series([order_data['executed_at'] for _, order_data in batch], dtype=object)
+                        times = shift_to_moscow(_parse_datetime_column(raw_times, datetime_formats, 'time'), 'bybit')
+                        # После пройденного окна порцию, продолжающую порядок времени, не разбираем
+                        if window_scan.passed and window_scan.skips(times):
+                            rows_skipped += len(batch)
+                            summary.reject('out_of_window', len(batch))
+                            continue
+                        window_scan.feed(times)
+                        
+                        rejects = []
+                        for (number, order_data), raw, order_time in zip(batch, raw_times, times.tolist()):
+                            if pd.isna(order_time):
+                                summary.reject('bad_time')
+                                rejects.append({'row': number, 'order_id': order_data['order_id'], 'reason': 'bad_time', 'value': raw})
+                                continue
+                            
+                            # Фильтруем по времени, если указаны границы
+                            if (start_date and order_time < start_date) or (end_date and order_time > end_date):
+                                summary.reject('out_of_window')
+                                continue
+                            
+                            order_data['executed_at'] = order_time.to_pydatetime()
+                            orders_data.append(order_data)
+                            summary.keep()
+                        record_rejects(parse_info, rejects)
+                
+                if rows_skipped:
+                    summary.stopped_early = True
+                    parse_log.info("BYBIT_BTC: окно смены пройдено, %s из %s строк не разбирались", rows_skipped, row_number)
+                        
+            except Exception as e:
+                parse_log.error("Ошибка чтения BTC файла: %s", str(e))
+                return []
+        
+        return orders_data
+        
+    except Exception as e:
+        parse_log.error("Ошибка парсинга файла: %s", str(e))
+        return []
+
+def parse_bybit_btc_csv_line(line):
+    """Парсит строку из BTC CSV файла Bybit (разделяет по запятой, все строки попадают в таблицу, пустые поля заменяются на числовые значения или None).
+
+    Время возвращается строкой из файла: формат определяется и разбирается сразу для порции строк.
+    """
+    try:
+        # Разделяем строку по запятой
+        parts = line.strip().split(',')
+        # Гарантируем, что parts всегда длины 14
+        while len(parts) < 14:
+            parts.append('')
+        
+        currency = parts[0].strip() if parts[0].strip() else ''
+        contract = parts[1].strip() if parts[1].strip() else ''
+        transaction_type = parts[2].strip() if parts[2].strip() else ''
+        direction = parts[3].strip() if parts[3].strip() else ''
+        quantity = parts[4].strip() if parts[4].strip() else ''
+        position = parts[5].strip() if parts[5].strip() else ''
+        filled_price = parts[6].strip() if parts[6].strip() else ''
+        funding = parts[7].strip() if parts[7].strip() else ''
+        fee_paid = parts[8].strip() if parts[8].strip() else ''
+        cash_flow = parts[9].strip() if parts[9].strip() else ''
+        change = parts[10].strip() if parts[10].strip() else ''
+        wallet_balance = parts[11].strip() if parts[11].strip() else ''
+        action = parts[12].strip() if parts[12].strip() else ''
+        time_str = parts[13].strip() if parts[13].strip() else ''
+
+        # Символ (Contract - Пара)
+        symbol = contract if contract else (currency if currency else 'USDT')
+        # Сторона
+        side = direction if direction else '--'
+        # Количество (USDT) - числовое значение или 0
+        try:
+            quantity_val = float(quantity) if quantity and quantity not in ('', None) else 0.0
+        except Exception:
+            quantity_val = 0.0
+        # Цена - числовое значение или 0
+        try:
+            price_val = float(filled_price) if filled_price and filled_price not in ('', None) else 0.0
+        except Exception:
+            price_val = 0.0
+        # order_id основан на содержимом строки для предотвращения дубликатов
+        # Используем более стабильный хеш от ключевых полей
+        import hashlib
+        key_fields = f"{currency}_{contract}_{direction}_{quantity}_{filled_price}_{time_str}"
+        # Создаем MD5 хеш для стабильности
+        hash_object = hashlib.md5(key_fields.encode('utf-8'))
+        order_id = f"btc_{hash_object.hexdigest()[:16]}"
+        return {
+            'order_id': order_id,
+            'symbol': symbol,
+            'side': side,
+            'quantity': quantity_val,
+            'price': price_val,
+            'total_usdt': 0.0,  # Для BTC ордеров всегда 0
+            'fees_usdt': 0.0,   # Для BTC ордеров всегда 0
+            'status': 'Завершен',
+            'executed_at': time_str  # строка времени; разбирается порцией в parse_orders_file
+        }
+    except Exception as e:
+        debug_sampled(parse_log, 'btc.line', "Ошибка парсинга BTC строки: %s", e)
+        return None
+
+def parse_bybit_order(row):
+    """Парсит строку ордера Bybit"""
+    try:
+        # Ищем нужные столбцы в строке
+        order_id = None
+        symbol = None
+        side = None
+        coin_amount = None  # Объем (USDT) - из Coin Amount
+        price = None        # Цена - из Price
+        fiat_amount = None  # Объем (RUB) - из Fiat Amount
+        status = 'filled'   # Статус по умолчанию
+        executed_at = None
+        
+        # Проверяем разные варианты названий столбцов
+        for col in row.index:
+            col_lower = str(col).lower().strip()
+            col_value = str(row[col]).strip()
+            
+            # Order ID - различные варианты
+            if any(x in col_lower for x in ['order no', 'order id', 'orderid', 'order_id', 'номер']):
+                order_id = col_value
+            
+            # Symbol/Pair - торговая пара (из Cryptocurrency)
+            elif any(x in col_lower for x in ['cryptocurrency', 'symbol', 'pair', 'пара', 'инструмент', 'currency', 'валюта']):
+                if col_value and col_value.lower() not in ['nan', 'none', '']:
+                    symbol = col_value.upper()  # Приводим к верхнему регистру
+            
+            # Side/Type - направление сделки
+            elif any(x in col_lower for x in ['side', 'type', 'тип', 'направление']):
+                side_value = col_value.lower()
+                if any(x in side_value for x in ['buy', 'покупка', 'long']):
+                    side = 'buy'
+                elif any(x in side_value for x in ['sell', 'продажа', 'short']):
+                    side = 'sell'
+            
+            # Coin Amount - количество криптовалюты (идет в колонку Объем USDT)
+            elif any(x in col_lower for x in ['coin amount', 'coinamount', 'coin_amount']):
+                try:
+                    clean_value = re.sub(r'[^\d.,]', '', col_value)
+                    if clean_value:
+                        coin_amount = float(clean_value.replace(',', '.'))
+                except:
+                    pass
+            
+            # Price - цена (идет в колонку Цена)
+            elif any(x in col_lower for x in ['price', 'цена', 'курс']):
+                try:
+                    clean_value = re.sub(r'[^\d.,]', '', col_value)
+                    if clean_value:
+                        price = float(clean_value.replace(',', '.'))
+                except:
+                    pass
+            
+            # Fiat Amount - сумма в фиатной валюте (идет в колонку Объем RUB)
+            elif any(x in col_lower for x in ['fiat amount', 'fiatamount', 'fiat_amount']):
+                try:
+                    clean_value = re.sub(r'[^\d.,]', '', col_value)
+                    if clean_value:
+                        fiat_amount = float(clean_value.replace(',', '.'))
+                except:
+                    pass
+            
+            # Status - статус
+            elif any(x in col_lower for x in ['status', 'статус']):
+                if col_value and col_value.lower() not in ['nan', 'none', '']:
+                    status = col_value.lower()
+                    if 'completed' in status or 'завершен' in status:
+                        status = 'filled'
+                    elif 'canceled' in status or 'отменен' in status:
+                        status = 'canceled'
+                    elif 'pending' in status or 'ожидание' in status:
+                        status = 'pending'
+                    elif 'Оформление жалоб' in status or 'оформление жалоб' in status:
+                        status = 'appealed'  # Новый статус - как апелляция
+                    else:
+                        status = 'filled'  # По умолчанию
+            
+            # Time - время
+            elif any(x in col_lower for x in ['time', 'date', 'время', 'дата', 'created']):
+                try:
+                    if col_value and col_value != 'nan':
+                        if PANDAS_AVAILABLE:
+                            executed_at = pd.to_datetime(col_value)
+                        else:
+                            # Простой парсинг даты без pandas
+                            executed_at = datetime.strptime(col_value, '%Y-%m-%d %H:%M:%S')
+                except:
+                    pass
+        
+        # Попытка автоматически вычислить недостающие значения
+        # Вычисляем price, если есть coin_amount и fiat_amount
+        if price is None and coin_amount not in [None, 0] and fiat_amount not in [None, 0]:
+            try:
+                price = fiat_amount / coin_amount if coin_amount else None
+            except Exception as _:
+                pass
+        # Вычисляем fiat_amount, если есть price и coin_amount
+        if fiat_amount is None and price not in [None, 0] and coin_amount not in [None, 0]:
+            try:
+                fiat_amount = price * coin_amount
+            except Exception as _:
+                pass
+
+        # Установка значения по умолчанию для symbol
+        if not symbol or str(symbol).lower() in ['nan', 'none', '']:
+            symbol = 'USDT'
+
+        # Проверяем, что все необходимые данные есть после попыток вычисления
+        if not order_id or coin_amount is None or (price is None and fiat_amount is None):
+            debug_sampled(parse_log, 'bybit.row', "Пропускаем строку - недостаточно данных: order_id=%s, coin_amount=%s, price=%s, fiat_amount=%s", order_id, coin_amount, price, fiat_amount)
+            return None
+        
+        # Дополнительная проверка на корректность symbol
+        if symbol.lower() in ['nan', 'none', '']:
+            debug_sampled(parse_log, 'bybit.row', "Пропускаем строку - некорректный символ: %s", symbol)
+            return None
+        
+        # Если нет времени, используем текущее
+        if not executed_at:
+            executed_at = datetime.now()
+        
+        return {
+            'order_id': order_id,
+            'symbol': symbol,
+            'side': side,
+            'quantity': coin_amount,    # Объем (USDT) - из Coin Amount
+            'price': price,            # Цена - из Price
+            'total_usdt': fiat_amount, # Объем (RUB) - из Fiat Amount
+            'fees_usdt': 0,
+            'status': status,          # Статус - из Status
+            'executed_at': executed_at
+        }
+        
+    except Exception as e:
+        debug_sampled(parse_log, 'bybit.row', "Ошибка парсинга ордера Bybit: %s", e)
+        return None
+
+def parse_htx_order(row):
+    """Парсит строку ордера HTX с учетом специфики формата HTX"""
+    try:
+        # Инициализируем переменные
+        order_id = None
+        symbol = None
+        side = None
+        quantity = None     # Объем (USDT) - из Количество
+        price = None        # Цена - из Цена за ед.
+        total_usdt = None   # Объем (RUB) - из Общая цена
+        status = 'filled'   # Статус по умолчанию
+        executed_at = None
+        
+        # Прямой маппинг колонок HTX
+        for col in row.index:
+            col_str = str(col).strip()
+            col_value = str(row[col]).strip()
+            
+            # Order ID - Номер:
+            if col_str == 'Номер:':
+                order_id = col_value
+            
+            # Symbol/Pair - Монета (USDT + RUB = USDT)
+            elif col_str == 'Монета':
+                if col_value and col_value.lower() not in ['nan', 'none', '']:
+                    symbol = col_value.upper()  # USDT
+            
+            # Side/Type - Тип (Продать/Купить)
+            elif col_str == 'Тип':
+                if 'Продать' in col_value or 'продать' in col_value:
+                    side = 'sell'
+                elif 'Купить' in col_value or 'купить' in col_value:
+                    side = 'buy'
+            
+            # Quantity - Количество
+            elif col_str == 'Количество':
+                try:
+                    if col_value and col_value != 'nan':
+                        quantity = float(col_value.replace(',', '.'))
+                except:
+                    pass
+            
+            # Price - Цена за ед.
+            elif col_str == 'Цена за ед.':
+                try:
+                    if col_value and col_value != 'nan':
+                        price = float(col_value.replace(',', '.'))
+                except:
+                    pass
+            
+            # Total - Общая цена
+            elif col_str == 'Общая цена':
+                try:
+                    if col_value and col_value != 'nan':
+                        total_usdt = float(col_value.replace(',', '.'))
+                except:
+                    pass
+            
+            # Status - Статус
+            elif col_str == 'Статус':
+                if col_value and col_value.lower() not in ['nan', 'none', '']:
+                    if 'Завершено' in col_value or 'завершено' in col_value:
+                        status = 'filled'
+                    elif 'Отменено' in col_value or 'отменено' in col_value:
+                        status = 'canceled'
+                    elif 'Ожидание' in col_value or 'ожидание' in col_value:
+                        status = 'pending'
+                    elif 'Оформление жалоб' in col_value or 'оформление жалоб' in col_value:
+                        status = 'appealed'  # Новый статус - как апелляция
+                    else:
+                        status = 'filled'  # По умолчанию
+            
+            # Time - Время
+            elif col_str == 'Время':
+                try:
+                    if col_value and col_value != 'nan':
+                        if PANDAS_AVAILABLE:
+                            executed_at = pd.to_datetime(col_value)
+                        else:
+                            # Простой парсинг даты без pandas
+                            executed_at = datetime.strptime(col_value, '%Y-%m-%d %H:%M:%S')
+                except:
+                    pass
+        
+        # Попытка автоматически вычислить недостающие значения
+        if price is None and quantity not in [None, 0] and total_usdt not in [None, 0]:
+            try:
+                price = total_usdt / quantity if quantity else None
+            except Exception:
+                pass
+        if total_usdt is None and price not in [None, 0] and quantity not in [None, 0]:
+            try:
+                total_usdt = price * quantity
+            except Exception:
+                pass
+
+        # Устанавливаем значение символа по умолчанию, если не удалось прочитать
+        if not symbol or str(symbol).lower() in ['nan', 'none', '']:
+            symbol = 'USDT'
+
+        # Проверяем, что все необходимые данные есть после вычислений
+        if not order_id or quantity is None or (price is None and total_usdt is None):
+            debug_sampled(parse_log, 'htx.row', "HTX: Пропускаем строку - недостаточно данных: order_id=%s, quantity=%s, price=%s, total_usdt=%s", order_id, quantity, price, total_usdt)
+            return None
+        
+        # Дополнительная проверка на корректность symbol
+        if symbol.lower() in ['nan', 'none', '']:
+            debug_sampled(parse_log, 'htx.row', "HTX: Пропускаем строку - некорректный символ: %s", symbol)
+            return None
+        
+        # Если нет времени, используем текущее
+        if not executed_at:
+            executed_at = datetime.now()
+        
+        return {
+            'order_id': order_id,
+            'symbol': symbol,
+            'side': side,
+            'quantity': quantity,      # Объем (USDT) - из Количество
+            'price': price,           # Цена - из Цена за ед.
+            'total_usdt': total_usdt, # Объем (RUB) - из Общая цена
+            'fees_usdt': 0,
+            'status': status,         # Статус - из Статус
+            'executed_at': executed_at
+        }
+        
+    except Exception as e:
+        debug_sampled(parse_log, 'htx.row', "Ошибка парсинга ордера HTX: %s", e)
+        return None
+
+def parse_gate_order(row):
+    """Парсит строку ордера Gate.io"""
+    # Аналогично Bybit, но с учетом специфики Gate
+    return parse_bybit_order(row)  # Пока используем тот же парсер
+
+# --- КОЛОНОЧНЫЙ ПАРСИНГ ВЫГРУЗОК ---
+# Роль каждой колонки определяется один раз на файл, а очистка чисел, статусы,
+# даты, смещение часового пояса и фильтр по времени считаются целыми колонками.
+# Результат совпадает с построчными parse_bybit_order / parse_htx_order.
+
+COLUMNAR_PLATFORMS = ('bybit', 'htx', 'gate')
+
+# Порядок проверок повторяет цепочку elif в parse_bybit_order
+BYBIT_COLUMN_ROLES = [
+    ('order_id', ['order no', 'order id', 'orderid', 'order_id', 'номер']),
+    ('symbol', ['cryptocurrency', 'symbol', 'pair', 'пара', 'инструмент', 'currency', 'валюта']),
+    ('side', ['side', 'type', 'тип', 'направление']),
+    ('coin_amount', ['coin amount', 'coinamount', 'coin_amount']),
+    ('price', ['price', 'цена', 'курс']),
+    ('fiat_amount', ['fiat amount', 'fiatamount', 'fiat_amount']),
+    ('status', ['status', 'статус']),
+    ('time', ['time', 'date', 'время', 'дата', 'created']),
+]
+
+# Точные названия колонок HTX (см. parse_htx_order)
+HTX_COLUMN_ROLES = {
+    'Номер:': 'order_id',
+    'Монета': 'symbol',
+    'Тип': 'side',
+    'Количество': 'coin_amount',
+    'Цена за ед.': 'price',
+    'Общая цена': 'fiat_amount',
+    'Статус': 'status',
+    'Время': 'time',
+}
+
+def _matching_column_roles(column, platform):
+    """Все роли, под которые подходит название колонки, в порядке приоритета"""
+    if platform == 'htx':
+        role = HTX_COLUMN_ROLES.get(str(column).strip())
+        return [role] if role else []
+    col_lower = str(column).lower().strip()
+    return [role for role, keywords in BYBIT_COLUMN_ROLES if any(x in col_lower for x in keywords)]
+
+def resolve_column_role(column, platform):
+    """Возвращает роль колонки выгрузки ('order_id', 'price', ...) или None"""
+    roles = _matching_column_roles(column, platform.lower())
+    return roles[0] if roles else None
+
+# Скомпилированная схема заголовка выгрузки:
+#   roles      - кортеж (индекс колонки, роль) для всех распознанных колонок
+#   unmapped   - колонки, которые парсер игнорирует
+#   ambiguous  - {колонка: [роли]} для названий, подходящих под несколько ролей
+#                (выигрывает первая роль в порядке приоритета)
+#   duplicated - {роль: [колонки]} для ролей, заданных несколькими колонками
+#                (значение берётся из последней непустой колонки)
+#   missing    - обязательные роли, которых нет в заголовке
+ExportSchema = namedtuple('ExportSchema', ['platform', 'roles', 'unmapped', 'ambiguous', 'duplicated', 'missing'])
+
+EXPORT_SCHEMA_CACHE_SIZE = 64
+
+@lru_cache(maxsize=EXPORT_SCHEMA_CACHE_SIZE)
+def _compile_export_schema(platform, header):
+    roles = []
+    unmapped = []
+    ambiguous = {}
+    columns_by_role = {}
+    for i, column in enumerate(header):
+        matched = _matching_column_roles(column, platform)
+        if not matched:
+            unmapped.append(column)
+            continue
+        if len(matched) > 1:
+            ambiguous[column] = matched
+        roles.append((i, matched[0]))
+        columns_by_role.setdefault(matched[0], []).append(column)
+    duplicated = {role: columns for role, columns in columns_by_role.items() if len(columns) > 1}
+    missing = [role for role in ('order_id', 'coin_amount') if role not in columns_by_role]
+    if 'price' not in columns_by_role and 'fiat_amount' not in columns_by_role:
+        missing.append('price/fiat_amount')
+    # Без колонки времени каждая строка была бы отброшена как bad_time
+    if 'time' not in columns_by_role:
+        missing.append('time')
+    return ExportSchema(platform, tuple(roles), tuple(unmapped), ambiguous, duplicated, tuple(missing))
+
+def resolve_export_schema(columns, platform):
+    """
+    Превращает заголовок выгрузки в схему ролей колонок.
+    Схемы кешируются по сигнатуре заголовка (LRU), поэтому повторные загрузки
+    в том же формате не проходят сопоставление заново.
+    """
+    header = tuple(str(column) for column in columns)
+    return _compile_export_schema(platform.lower(), header)
+
+def describe_export_schema(schema):
+    """Краткое описание схемы для логов и ответа API (None, если всё распознано однозначно)"""
+    if not (schema.unmapped or schema.ambiguous or schema.duplicated or schema.missing):
+        return None
+    return {
+        'unmapped_columns': list(schema.unmapped),
+        'ambiguous_columns': {column: list(roles) for column, roles in schema.ambiguous.items()},
+        'duplicated_roles': {role: list(columns) for role, columns in schema.duplicated.items()},
+        'missing_roles': list(schema.missing)
+    }
+
+def _is_present(values):
+    """Маска непустых значений (пустая строка и 'nan' считаются отсутствующими)"""
+    return (values != '') & (values != 'nan')
+
+def _clean_number_column(values, strip_symbols):
+    """Переводит строковую колонку в float, NaN там, где построчный парсер оставил бы None"""
+    if strip_symbols:
+        # Bybit: выкидываем всё, кроме цифр, точки и запятой
+        values = values.str.replace(r'[^\d.,]', '', regex=True)
+    present = _is_present(values)
+    numbers = pd.to_numeric(values.str.replace(',', '.', regex=False), errors='coerce')
+    return numbers.where(present)
+
+def _map_side_column(values, platform):
+    """Направление сделки; None там, где значение не распознано"""
+    if platform.lower() == 'htx':
+        sell = values.str.contains('Продать|продать', regex=True)
+        buy = values.str.contains('Купить|купить', regex=True)
+    else:
+        lowered = values.str.lower()
+        buy = lowered.str.contains('buy|покупка|long', regex=True)
+        sell = lowered.str.contains('sell|продажа|short', regex=True)
+        # В parse_bybit_order покупка проверяется первой
+        sell = sell & ~buy
+    side = pd.Series(None, index=values.index, dtype=object)
+    side[buy & ~sell] = 'buy'
+    side[sell] = 'sell'
+    return side
+
+def _map_status_column(values, platform):
+    """Статус ордера; None там, где значение пустое и остаётся статус по умолчанию"""
+    lowered = values.str.lower()
+    status = pd.Series('filled', index=values.index, dtype=object)
+    if platform.lower() == 'htx':
+        source = values
+        rules = [
+            ('Завершено|завершено', 'filled'),
+            ('Отменено|отменено', 'canceled'),
+            ('Ожидание|ожидание', 'pending'),
+            ('Оформление жалоб|оформление жалоб', 'appealed'),
+        ]
+    else:
+        source = lowered
+        rules = [
+            ('completed|завершен', 'filled'),
+            ('canceled|отменен', 'canceled'),
+            ('pending|ожидание', 'pending'),
+            ('оформление жалоб', 'appealed'),
+        ]
+    # Применяем правила в обратном порядке, чтобы первое совпадение имело приоритет
+    for pattern, mapped in reversed(rules):
+        status[source.str.contains(pattern, regex=True)] = mapped
+    return status.where(~lowered.isin(['nan', 'none', '']))
+
+# Форматы времени в выгрузках; порядок важен для неоднозначных дат (месяц/день)
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%d.%m.%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M',
+    '%Y/%m/%d %H:%M:%S',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+]
+DATETIME_SAMPLE_SIZE = 50
+PARSE_REJECTS_LIMIT = 200
+
+def detect_datetime_format(values, preferred=None):
+    """
+    Определяет формат времени по выборке значений колонки.
+
+    Сначала проверяется preferred (формат, уже выбранный для этого файла), затем
+    DATETIME_FORMATS. Побеждает первый формат, под который подходит вся выборка,
+    иначе тот, под который подходит больше всего значений. None - если не подошел ни один.
+    """
+    sample = values[_is_present(values)].head(DATETIME_SAMPLE_SIZE)
+    if sample.empty:
+        return None
+    candidates = ([preferred] if preferred else []) + [fmt for fmt in DATETIME_FORMATS if fmt != preferred]
+    best_format, best_count = None, 0
+    for fmt in candidates:
+        count = int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        if count > best_count:
+            best_format, best_count = fmt, count
+        if count == len(sample):
+            break
+    return best_format
+
+def _parse_datetime_column(values, file_formats=None, column=None):
+    """Разбирает колонку времени одним вызовом; NaT там, где время разобрать не удалось.
+
+    file_formats - словарь {колонка: формат} одного файла: формат определяется по
+    первой порции колонки column и проверяется первым в следующих порциях того же
+    файла. Между файлами формат не переносится - неоднозначные даты (03/04/2025)
+    разбираются только по содержимому своего файла.
+    """
+    present = _is_present(values)
+    preferred = file_formats.get(column) if file_formats is not None else None
+    fmt = detect_datetime_format(values, preferred)
+    if fmt and file_formats is not None:
+        file_formats[column] = fmt
+    if fmt:
+        parsed = pd.to_datetime(values.where(present), format=fmt, errors='coerce')
+    else:
+        parsed = pd.to_datetime(values.where(present), errors='coerce')
+    # Значения в другом формате разбираем по одному на каждое уникальное значение
+    failed = present & parsed.isna()
+    if failed.any():
+        fallback = {}
+        for raw in values[failed].unique():
+            try:
+                fallback[raw] = pd.to_datetime(raw)
+            except Exception:
+                fallback[raw] = pd.NaT
+        parsed = parsed.astype(object)
+        parsed[failed] = values[failed].map(fallback)
+        parsed = pd.to_datetime(parsed, errors='coerce')
+    return parsed
+
+def shift_to_moscow(times, platform):
+    """Переводит колонку времени платформы в МСК одним сдвигом"""
+    return times + pd.Timedelta(hours=PLATFORM_TIMEZONE_OFFSETS.get(platform.lower(), 0))
+
+def record_rejects(parse_info, rejects):
+    """Добавляет отброшенные строки в parse_info['rejects'], не больше PARSE_REJECTS_LIMIT"""
+    if parse_info is None or not rejects:
+        return
+    stored = parse_info.setdefault('rejects', [])
+    room = PARSE_REJECTS_LIMIT - len(stored)
+    if room > 0:
+        stored.extend(rejects[:room])
+
+def _frame_string_columns(df):
+    """Возвращает колонки DataFrame в виде строк str(value).strip(), как их видел iterrows()"""
+    values = df.to_numpy()
+    return [
+        pd.Series(values[:, i], index=df.index).map(str).str.strip()
+        for i in range(values.shape[1])
+    ]
+
+def _nullable_list(series):
+    """Список Python-значений с None вместо NaN/NaT"""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def _frame_times(df, platform, datetime_formats=None):
+    """Время строк порции по МСК - только колонки с ролью time, как в parse_orders_frame"""
+    executed_at = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    for i, role in resolve_export_schema(df.columns, platform).roles:
+        if role == 'time':
+            values = pd.Series(df.iloc[:, i].to_numpy(), index=df.index).map(str).str.strip()
+            parsed = _parse_datetime_column(values, datetime_formats, df.columns[i])
+            executed_at = parsed.where(parsed.notna(), executed_at)
+    return shift_to_moscow(executed_at, platform)
+
+def parse_orders_frame(df, platform, start_date=None, end_date=None, parse_info=None, window_scan=None, summary=None,
+                       datetime_formats=None):
+    """
+    Колоночный парсер выгрузок Bybit / HTX / Gate.
+
+    Args:
+        df: DataFrame, прочитанный из файла выгрузки
+        platform: 'bybit', 'htx' или 'gate'
+        start_date, end_date: границы смены по МСК (опционально)
+        parse_info: словарь, в который записывается диагностика разбора (опционально)
+        window_scan: SortedWindowScan, которому передаются времена строк (опционально)
+        summary: ParseSummary, в котором считаются принятые и отброшенные строки (опционально)
+        datetime_formats: форматы времени, определенные по предыдущим порциям этого же файла (опционально)
+
+    Returns:
+        list[dict]: ордера в том же формате, что и у построчных парсеров
+    """
+    platform = platform.lower()
+    index = df.index
+    is_htx = platform == 'htx'
+
+    order_id = None
+    symbol = pd.Series(None, index=index, dtype=object)
+    side = pd.Series(None, index=index, dtype=object)
+    coin_amount = pd.Series(float('nan'), index=index)
+    price = pd.Series(float('nan'), index=index)
+    fiat_amount = pd.Series(float('nan'), index=index)
+    status = pd.Series('filled', index=index, dtype=object)
+    executed_at = pd.Series(pd.NaT, index=index, dtype='datetime64[ns]')
+    time_raw = pd.Series('', index=index, dtype=object)
+
+    schema = resolve_export_schema(df.columns, platform)
+    schema_issues = describe_export_schema(schema)
+    if parse_info is not None:
+        parse_info['columns'] = schema_issues
+    if summary is not None:
+        summary.read(len(df))
+    if schema_issues:
+        parse_log.warning("%s: проблемы заголовка выгрузки: %s", platform.upper(), schema_issues)
+    if schema.missing:
+        if summary is not None:
+            summary.reject('bad_header', len(df))
+        return []
+
+    # Как и в построчных парсерах, при повторе роли побеждает последняя колонка
+    columns = _frame_string_columns(df)
+    for i, role in schema.roles:
+        values = columns[i]
+        if role == 'order_id':
+            order_id = values
+        elif role == 'symbol':
+            valid = ~values.str.lower().isin(['nan', 'none', ''])
+            symbol = values.str.upper().where(valid, symbol)
+        elif role == 'side':
+            mapped = _map_side_column(values, platform)
+            side = mapped.where(mapped.notna(), side)
+        elif role in ('coin_amount', 'price', 'fiat_amount'):
+            numbers = _clean_number_column(values, strip_symbols=not is_htx)
+            if role == 'coin_amount':
+                coin_amount = numbers.where(numbers.notna(), coin_amount)
+            elif role == 'price':
+                price = numbers.where(numbers.notna(), price)
+            else:
+                fiat_amount = numbers.where(numbers.notna(), fiat_amount)
+        elif role == 'status':
+            mapped = _map_status_column(values, platform)
+            status = mapped.where(mapped.notna(), status)
+        elif role == 'time':
+            parsed = _parse_datetime_column(values, datetime_formats, df.columns[i])
+            executed_at = parsed.where(parsed.notna(), executed_at)
+            time_raw = values.where(parsed.notna(), time_raw)
+
+    # Автоматически вычисляем недостающие значения
+    coin_nonzero = coin_amount.notna() & (coin_amount != 0)
+    fill_price = price.isna() & coin_nonzero & fiat_amount.notna() & (fiat_amount != 0)
+    price = price.mask(fill_price, fiat_amount / coin_amount)
+    fill_fiat = fiat_amount.isna() & price.notna() & (price != 0) & coin_nonzero
+    fiat_amount = fiat_amount.mask(fill_fiat, price * coin_amount)
+
+    symbol = symbol.fillna('USDT')
+
+    # Отбрасываем строки без обязательных данных
+    keep = (order_id != '') & coin_amount.notna() & (price.notna() | fiat_amount.notna())
+    skipped = int((~keep).sum())
+    if skipped:
+        parse_log.debug("%s: пропущено %s строк - недостаточно данных", platform.upper(), skipped)
+
+    # Переводим время в МСК одним сдвигом; строки без времени отбрасываем
+    executed_at = shift_to_moscow(executed_at, platform)
+    if window_scan is not None:
+        window_scan.feed(executed_at)
+    bad_time = keep & executed_at.isna()
+    if bad_time.any():
+        rows = bad_time[bad_time].index[:PARSE_REJECTS_LIMIT]
+        record_rejects(parse_info, [
+            {'row': int(i) + 1, 'order_id': order_id[i], 'reason': 'bad_time', 'value': time_raw[i]}
+            for i in rows
+        ])
+    keep &= ~bad_time
+
+    in_window = keep.copy()
+    if start_date:
+        in_window &= executed_at >= start_date
+    if end_date:
+        in_window &= executed_at <= end_date
+    if summary is not None:
+        summary.reject('missing_fields', skipped)
+        summary.reject('bad_time', int(bad_time.sum()))
+        summary.reject('out_of_window', int((keep & ~in_window).sum()))
+        summary.keep(int(in_window.sum()))
+    keep = in_window
+
+    orders_data = []
+    for row in zip(
+        order_id[keep].tolist(),
+        symbol[keep].tolist(),
+        _nullable_list(side[keep]),
+        _nullable_list(coin_amount[keep]),
+        _nullable_list(price[keep]),
+        _nullable_list(fiat_amount[keep]),
+        status[keep].tolist(),
+        executed_at[keep].tolist(),
+    ):
+        orders_data.append({
+            'order_id': row[0],
+            'symbol': row[1],
+            'side': row[2],
+            'quantity': row[3],
+            'price': row[4],
+            'total_usdt': row[5],
+            'fees_usdt': 0,
+            'status': row[6],
+            'executed_at': row[7]
+        })
+    return orders_data
+
+# --- ПОТОКОВОЕ ЧТЕНИЕ ВЫГРУЗОК ---
+# Большие выгрузки читаются порциями по STREAM_CHUNK_ROWS строк, окно смены
+# применяется к каждой порции. Если выгрузка отсортирована по времени и окно
+# смены пройдено, остаток файла только проверяется на порядок времени: порции,
+# которые продолжают этот порядок, не разбираются. С первой строки, нарушившей
+# порядок (вторая склеенная выгрузка, частично отсортированный файл), остаток
+# файла разбирается полностью.
+
+STREAM_CHUNK_ROWS = 5000
+
+class SortedWindowScan:
+    """Следит за порядком времени в выгрузке и определяет, что окно смены уже пройдено"""
+
+    def __init__(self, start_date=None, end_date=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.direction = None  # 'asc' или 'desc', пока не известно - None
+        self.is_sorted = True
+        self.last_time = None
+        self.passed = False
+
+    def _step(self, value):
+        """Направление перехода от предыдущей строки к value; None - время не изменилось"""
+        if self.last_time is None or value == self.last_time:
+            return None
+        return 'asc' if value > self.last_time else 'desc'
+
+    def _mark_unsorted(self):
+        # Выгрузка не отсортирована - читаем и разбираем файл до конца
+        self.is_sorted = False
+        self.passed = False
+
+    def feed(self, times):
+        """Принимает времена строк (по МСК) в порядке следования в файле; пустые пропускаются"""
+        if not self.is_sorted:
+            return
+        for value in times:
+            if value is None or pd.isna(value):
+                continue
+            step = self._step(value)
+            if step is not None:
+                if self.direction is None:
+                    self.direction = step
+                elif step != self.direction:
+                    self._mark_unsorted()
+                    return
+            self.last_time = value
+
+        if self.last_time is None:
+            return
+        if self.direction == 'asc' and self.end_date and self.last_time > self.end_date:
+            self.passed = True
+        elif self.direction == 'desc' and self.start_date and self.last_time < self.start_date:
+            self.passed = True
+
+    def skips(self, times):
+        """True, если окно пройдено и порция строк times целиком продолжает порядок файла -
+        такую порцию можно не разбирать: все ее строки вне окна смены.
+
+        Строка, нарушившая порядок, переводит выгрузку в неотсортированные. Порция
+        с пустым временем разбирается обычным образом (ради диагностики bad_time).
+        """
+        if not self.passed:
+            return False
+        last_time = self.last_time
+        for value in times:
+            if value is None or pd.isna(value):
+                return False
+            if value != last_time and ('asc' if value > last_time else 'desc') != self.direction:
+                self._mark_unsorted()
+                return False
+            last_time = value
+        self.last_time = last_time
+        return True
+
+def _iter_excel_chunks(filepath, chunk_rows):
+    """Читает первый лист xlsx порциями через openpyxl в режиме read_only"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        load_workbook = None
+    if load_workbook is None or filepath.lower().endswith('.xls'):
+        # Без openpyxl (и для старого .xls) читаем файл целиком
+        yield pd.read_excel(filepath, dtype=str)
+        return
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # Имена колонок как у pd.read_excel: пустые - 'Unnamed: i', повторы - 'X.1'
+        columns = []
+        seen = {}
+        for i, name in enumerate(header):
+            name = f"Unnamed: {i}" if name is None else str(name)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+
+        width = len(columns)
+        chunk = []
+        start = 0
+        for row in rows:
+            if row is None or all(cell is None for cell in row):
+                continue
+            cells = [None if cell is None else str(cell) for cell in row[:width]]
+            cells.extend([None] * (width - len(cells)))
+            chunk.append(cells)
+            if len(chunk) >= chunk_rows:
+                # Сквозная нумерация строк, как у pd.read_csv с chunksize
+                yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)))
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)))
+    finally:
+        workbook.close()
+
+def iter_export_chunks(filepath, ext, chunk_rows=STREAM_CHUNK_ROWS):
+    """Итератор DataFrame-порций выгрузки; значения читаются как строки"""
+    if ext == '.csv':
+        # dtype=str сохраняет длинные ID ордеров без потери точности
+        with pd.read_csv(filepath, chunksize=chunk_rows, dtype=str) as reader:
+            for chunk in reader:
+                yield chunk
+    else:
+        yield from _iter_excel_chunks(filepath, chunk_rows)
+
+def parse_orders_stream(filepath, ext, platform, start_date=None, end_date=None, parse_info=None, summary=None):
+    """
+    Потоковый разбор выгрузки Bybit / HTX / Gate.
+
+    Файл читается порциями, каждая порция разбирается parse_orders_frame
+    с фильтром по окну смены. Для отсортированной по времени выгрузки
+    после пройденного окна смены порции, продолжающие порядок времени,
+    не разбираются (см. SortedWindowScan.skips).
+    """
+    platform = platform.lower()
+    window_scan = SortedWindowScan(start_date, end_date)
+    # Формат времени определяется по первой порции и дальше общий для всего файла
+    datetime_formats = {}
+    orders_data = []
+    rows_read = 0
+    rows_skipped = 0
+
+    for chunk in iter_export_chunks(filepath, ext, STREAM_CHUNK_ROWS):
+        rows_read += len(chunk)
+        if window_scan.passed and window_scan.skips(_frame_times(chunk, platform, datetime_formats)):
+            rows_skipped += len(chunk)
+            if summary is not None:
+                summary.read(len(chunk))
+                summary.reject('out_of_window', len(chunk))
+            continue
+        orders_data.extend(parse_orders_frame(chunk, platform, start_date, end_date, parse_info, window_scan, summary,
+                                              datetime_formats))
+        if resolve_export_schema(chunk.columns, platform).missing:
+            # Заголовок одинаков для всех порций - дальше читать бессмысленно
+            break
+
+    if rows_skipped:
+        if summary is not None:
+            summary.stopped_early = True
+        parse_log.info("%s: окно смены пройдено, %s из %s строк не разбирались", platform.upper(), rows_skipped, rows_read)
+    return orders_data
+
+# --- ОПРЕДЕЛЕНИЕ ФОРМАТА CSV-ВЫГРУЗОК ---
+
+BLISS_REQUIRED_COLUMNS = ['Creation date', 'Internal id', 'Organization user', 'Amount', 'Crypto amount', 'Status', 'Method']
+SNIFF_SAMPLE_BYTES = 64 * 1024
+SNIFF_DELIMITERS = [';', ',', '\t']
+
+def _split_header(line, delimiter, quotechar='"'):
+    """Разбивает строку заголовка на имена колонок"""
+    return [name.strip() for name in next(csv.reader([line], delimiter=delimiter, quotechar=quotechar), [])]
+
+def sniff_export_dialect(filepath, required_columns=None, sample_bytes=SNIFF_SAMPLE_BYTES):
+    """
+    Определяет формат CSV-выгрузки по одному буферу из начала файла.
+
+    Args:
+        filepath: путь к файлу
+        required_columns: колонки, по которым ищется строка заголовка и разделитель (опционально)
+        sample_bytes: размер читаемого буфера
+
+    Returns:
+        dict: encoding, delimiter, quotechar, header_row (номер строки заголовка с нуля),
+              columns (колонки заголовка) и sample_lines (первые строки файла)
+    """
+    with open(filepath, 'rb') as f:
+        raw = f.read(sample_bytes)
+        truncated = bool(f.read(1))
+
+    # Кодировка: BOM, затем UTF-8, иначе cp1251
+    if raw.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
+        try:
+            raw.decode('utf-8')
+            encoding = 'utf-8'
+        except UnicodeDecodeError as e:
+            # Буфер мог оборваться посреди многобайтового символа
+            encoding = 'utf-8' if truncated and e.start >= len(raw) - 3 else 'cp1251'
+    lines = raw.decode(encoding, errors='ignore').splitlines()
+    if truncated and len(lines) > 1:
+        # Последняя строка буфера могла оборваться
+        lines = lines[:-1]
+
+    # Строка заголовка: первая, в которой есть все обязательные колонки
+    header_row = 0
+    if required_columns:
+        for i, line in enumerate(lines):
+            if all(col in line for col in required_columns):
+                header_row = i
+                break
+    header = lines[header_row] if lines else ''
+
+    # Разделитель: тот, при котором заголовок содержит все обязательные колонки
+    delimiter = None
+    quotechar = '"'
+    if required_columns:
+        for sep in SNIFF_DELIMITERS:
+            if all(col in _split_header(header, sep) for col in required_columns):
+                delimiter = sep
+                break
+    try:
+        sniffed = csv.Sniffer().sniff('\n'.join(lines[header_row:header_row + 20]), delimiters=''.join(SNIFF_DELIMITERS))
+        if delimiter is None:
+            delimiter = sniffed.delimiter
+        if sniffed.delimiter == delimiter and sniffed.quotechar:
+            quotechar = sniffed.quotechar
+    except csv.Error:
+        pass
+    if delimiter is None:
+        # При равенстве побеждает разделитель, стоящий раньше в списке
+        delimiter = max(SNIFF_DELIMITERS, key=lambda sep: (header.count(sep), -SNIFF_DELIMITERS.index(sep)))
+
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'header_row': header_row,
+        'columns': _split_header(header, delimiter, quotechar),
+        'sample_lines': [line.strip() for line in lines[:5]]
+    }
+
+def parse_bliss_order(row):
+    """Парсит строку ордера Bliss с учетом специфики формата Bliss"""
+    try:
+        # Инициализируем переменные
+        order_id = None
+        symbol = 'USDT'  # Всегда USDT для Bliss
+        side = 'buy'     # Всегда покупка согласно описанию
+        quantity = None  # Объем (USDT) - из Crypto amount
+        price = None     # Цена - пропускается поле
+        total_usdt = None  # Объем (RUB) - из Amount
+        status = 'filled'  # Статус по умолчанию
+        executed_at = None
+        
+        # Отладка: выводим все колонки
+        debug_sampled(parse_log, 'bliss.row', "BLISS: Все колонки в строке: %s", list(row.index))
+        
+        for col in row.index:
+            col_str = str(col).strip()
+            col_value = str(row[col]).strip()
+            
+            debug_sampled(parse_log, 'bliss.row', "BLISS: Обрабатываем колонку '%s' со значением '%s'", col_str, col_value)
+            
+            # Order ID - Internal id
+            if col_str == 'Internal id':
+                order_id = col_value
+                debug_sampled(parse_log, 'bliss.row', "BLISS: Найден order_id: %s", order_id)
+            
+            # Quantity - Crypto amount
+            elif col_str == 'Crypto amount':
+                try:
+                    if col_value and col_value != 'nan':
+                        # Убираем запятые и конвертируем в float
+                        quantity = float(col_value.replace(',', '.'))
+                        debug_sampled(parse_log, 'bliss.row', "BLISS: Найден quantity: %s", quantity)
+                except:
+                    pass
+            
+            # Total USDT - Amount
+            elif col_str == 'Amount':
+                try:
+                    if col_value and col_value != 'nan':
+                        # Убираем запятые и конвертируем в float
+                        total_usdt = float(col_value.replace(',', '.'))
+                        debug_sampled(parse_log, 'bliss.row', "BLISS: Найден total_usdt: %s", total_usdt)
+                except:
+                    pass
+            
+            # Status - Status
+            elif col_str == 'Status':
+                if col_value and col_value != 'nan':
+                    status_value = col_value.lower()
+                    if status_value in ['success', 'completed', 'done']:
+                        status = 'filled'
+                    elif status_value in ['cancelled', 'canceled']:
+                        status = 'canceled'
+                    elif status_value in ['expired']:
+                        status = 'expired'
+                    elif status_value in ['failed']:
+                        status = 'failed'
+                    else:
+                        status = 'pending'
+                    debug_sampled(parse_log, 'bliss.row', "BLISS: Найден status: %s", status)
+            
+            # Time - пробуем разные варианты названий колонок с датой
+            elif col_str in ['Finish date', 'Creation date', 'Date', 'Time', 'Timestamp', 'Дата завершения', 'Время']:
+                debug_sampled(parse_log, 'bliss.row', "BLISS: Найдена колонка с датой '%s' со значением '%s'", col_str, col_value)
+                try:
+                    if col_value and col_value != 'nan':
+                        # Пробуем разные форматы даты
+                        date_formats = [
+                            '%d.%m.%Y %H:%M',
+                            '%d.%m.%Y %H:%M:%S',
+                            '%Y-%m-%d %H:%M:%S',
+                            '%Y-%m-%d %H:%M',
+                            '%d/%m/%Y %H:%M',
+                            '%d-%m-%Y %H:%M'
+                        ]
+                        
+                        for date_format in date_formats:
+                            try:
+                                if PANDAS_AVAILABLE:
+                                    executed_at = pd.to_datetime(col_value, format=date_format)
+                                else:
+                                    executed_at = datetime.strptime(col_value, date_format)
+                                debug_sampled(parse_log, 'bliss.row', "BLISS: Успешно распарсили дату '%s' в формате '%s' -> %s", col_value, date_format, executed_at)
+                                break
+                            except:
+                                continue
+                        else:
+                            debug_sampled(parse_log, 'bliss.row', "BLISS: Не удалось распарсить дату '%s' ни в одном формате", col_value)
+                except Exception as e:
+                    debug_sampled(parse_log, 'bliss.row', "BLISS: Ошибка парсинга даты '%s': %s", col_value, e)
+        
+        # Вычисляем цену на основе имеющихся данных
+        price = None
+        if quantity is not None and total_usdt is not None and quantity > 0:
+            price = total_usdt / quantity
+        
+        # Проверяем, что все необходимые данные есть
+        if not order_id or quantity is None or total_usdt is None or price is None:
+            debug_sampled(parse_log, 'bliss.row', "BLISS: Пропускаем строку - недостаточно данных: order_id=%s, symbol=%s, side=%s, quantity=%s, price=%s, total_usdt=%s", order_id, symbol, side, quantity, price, total_usdt)
+            return None
+        
+        # Если нет времени, используем текущее
+        if not executed_at:
+            executed_at = datetime.now()
+        
+        # Время будет конвертировано позже в process_platform_file
+        # executed_at остаётся в исходном часовом поясе
+        
+        return {
+            'order_id': order_id,
+            'account_name': None,  # Не используем имя аккаунта из файла
+            'symbol': symbol,
+            'side': side,              # Всегда 'buy'
+            'quantity': quantity,      # Объем (USDT) - из Crypto amount
+            'price': price,            # Цена - вычисляется
+            'total_usdt': total_usdt,  # Объем (RUB) - из Amount
+            'fees_usdt': 0,
+            'status': status,          # Статус - из Status
+            'executed_at': executed_at
+        }
+        
+    except Exception as e:
+        debug_sampled(parse_log, 'bliss.row', "BLISS: Ошибка парсинга строки: %s", str(e))
+        return None
+
+def parse_file_job(job):
+    """Разбор одного файла в процессе пула; возвращает ордера и диагностику"""
+    filepath, platform, start_date, end_date = job
+    info = {}
+    orders_data = parse_orders_file(filepath, platform, start_date, end_date, None, info)
+    return orders_data, info
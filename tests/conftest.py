@@ -0,0 +1,38 @@
+import os
+
+# Конфигурация выбирается при импорте app: база в памяти, задачи импорта в запросе
+os.environ.setdefault('FLASK_CONFIG', 'testing')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import pytest
+
+import app as app_module
+from app import app, db, Employee
+
+
+@pytest.fixture
+def app_ctx():
+    """Контекст приложения с чистой схемой БД и пустыми кэшами процесса"""
+    with app.app_context():
+        db.create_all()
+        app_module._parse_cache.clear()
+        app_module._result_cache.clear()
+        try:
+            yield app
+        finally:
+            db.session.rollback()
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def client(app_ctx):
+    return app_ctx.test_client()
+
+
+@pytest.fixture
+def employee(app_ctx):
+    employee = Employee(name='Тестовый сотрудник')
+    db.session.add(employee)
+    db.session.commit()
+    return employee
@@ -0,0 +1,70 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from app import db, Account, Order, process_platform_file, route_orders_to_accounts
+
+BLISS_EXPORT = (
+    'Creation date;Internal id;Organization user;Amount;Crypto amount;Status;Method\n'
+    '01.02.2024 10:00:00;1;acc1;100;1;success;sell\n'
+    '01.02.2024 10:05:00;2;ACC2;100;1;success;buy\n'
+    '01.02.2024 10:06:00;3;other;100;1;success;buy\n'
+)
+
+
+@pytest.fixture
+def bliss_file(tmp_path):
+    path = tmp_path / 'bliss.csv'
+    path.write_text(BLISS_EXPORT, encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def bliss_accounts(employee):
+    accounts = [Account(employee_id=employee.id, platform='bliss', account_name=name, is_active=True)
+                for name in ('acc1', 'acc2')]
+    db.session.add_all(accounts)
+    db.session.commit()
+    return [account.id for account in accounts]
+
+
+def test_route_keeps_unmatched_orders_on_default_account():
+    orders = [{'order_id': '1', 'export_account': 'ACC2'}, {'order_id': '2', 'export_account': 'other'},
+              {'order_id': '3'}]
+
+    routed, unmatched = route_orders_to_accounts(orders, ['acc1', 'acc2'])
+
+    assert [(order['order_id'], account) for order, account in routed] == [('1', 'acc2'), ('2', 'acc1'), ('3', 'acc1')]
+    assert unmatched == 1
+
+
+def test_shift_file_routes_orders_and_counts_written_rows(employee, bliss_accounts, bliss_file):
+    window = (datetime(2024, 2, 1, 0), datetime(2024, 2, 1, 23))
+
+    stats = process_platform_file(bliss_file, 'bliss', bliss_accounts, *window, 1, employee.id)
+
+    assert stats['linked_orders'] == 3
+    assert stats['accounts'] == {'acc1': 2, 'acc2': 1}
+    assert stats['unmatched_account_orders'] == 1
+    assert {order.order_id: order.account_name for order in Order.query} == {'1': 'acc1', '2': 'acc2', '3': 'acc1'}
+
+    again = process_platform_file(bliss_file, 'bliss', bliss_accounts, *window, 1, employee.id)
+
+    assert again['linked_orders'] == 0
+    assert again['accounts'] == {'acc1': 0, 'acc2': 0}
+
+
+def test_upload_saves_bliss_orders_under_selected_account(client, employee, tmp_path, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'UPLOAD_FOLDER', str(tmp_path))
+
+    response = client.post('/api/orders/upload', data={
+        'employee_id': str(employee.id),
+        'platform': 'bliss',
+        'account_name': 'chosen',
+        'file': (io.BytesIO(BLISS_EXPORT.encode('utf-8')), 'bliss.csv'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 202
+    assert {order.account_name for order in Order.query} == {'chosen'}
+    assert Order.query.count() == 3
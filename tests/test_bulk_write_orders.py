@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from app import db, Order, bulk_write_orders, order_insert_row
+
+
+def make_row(employee, order_id, platform='bybit', **fields):
+    order = {
+        'order_id': order_id,
+        'symbol': 'USDT',
+        'side': 'buy',
+        'quantity': 10,
+        'price': 90,
+        'total_usdt': 10,
+        'executed_at': datetime(2024, 1, 20, 10, 0),
+    }
+    order.update(fields)
+    return order_insert_row(order, employee.id, platform, 'acc')
+
+
+def test_inserts_new_rows(employee):
+    counts = bulk_write_orders([make_row(employee, 'o1'), make_row(employee, 'o2')])
+    db.session.commit()
+
+    assert (counts['inserted'], counts['skipped'], counts['updated']) == (2, 0, 0)
+    assert counts['inserted_ids'] == {'o1', 'o2'}
+    assert Order.query.count() == 2
+
+
+def test_skips_existing_and_repeated_rows(employee):
+    bulk_write_orders([make_row(employee, 'o1')])
+    db.session.commit()
+
+    counts = bulk_write_orders([make_row(employee, 'o1'), make_row(employee, 'o2'), make_row(employee, 'o2')])
+    db.session.commit()
+
+    assert (counts['inserted'], counts['skipped'], counts['updated']) == (1, 2, 0)
+    assert counts['inserted_ids'] == {'o2'}
+    assert Order.query.count() == 2
+
+
+def test_skip_leaves_existing_row_unchanged(employee):
+    bulk_write_orders([make_row(employee, 'o1', price=90)])
+    db.session.commit()
+
+    bulk_write_orders([make_row(employee, 'o1', price=95)])
+    db.session.commit()
+
+    assert float(Order.query.filter_by(order_id='o1').one().price) == 90
+
+
+def test_update_counts_updated_and_inserted(employee):
+    bulk_write_orders([make_row(employee, 'o1', price=90)])
+    db.session.commit()
+
+    counts = bulk_write_orders([make_row(employee, 'o1', price=95), make_row(employee, 'o2')], on_duplicate='update')
+    db.session.commit()
+
+    assert (counts['inserted'], counts['skipped'], counts['updated']) == (1, 0, 1)
+    assert counts['inserted_ids'] == {'o2'}
+    assert float(Order.query.filter_by(order_id='o1').one().price) == 95
+
+
+def test_row_written_by_other_session_counts_as_skipped(employee):
+    # Ордер уже вставлен другой загрузкой - запись его не считает своим
+    db.session.add(Order(order_id='o1', employee_id=employee.id, platform='htx', account_name='other',
+                         symbol='USDT', side='sell', quantity=1, price=1, total_usdt=1, status='filled',
+                         executed_at=datetime(2024, 1, 20, 9, 0)))
+    db.session.commit()
+
+    counts = bulk_write_orders([make_row(employee, 'o1')])
+
+    assert (counts['inserted'], counts['skipped']) == (0, 1)
+    assert counts['inserted_ids'] == set()
+
+
+def test_btc_fingerprint_conflict_is_skipped(employee):
+    executed_at = datetime(2024, 1, 20, 10, 0)
+    bulk_write_orders([make_row(employee, 'btc1', platform='bybit_btc', executed_at=executed_at)])
+    db.session.commit()
+
+    # Тот же ордер BTC под другим order_id
+    counts = bulk_write_orders([make_row(employee, 'btc2', platform='bybit_btc', executed_at=executed_at)])
+    db.session.commit()
+
+    assert (counts['inserted'], counts['skipped']) == (0, 1)
+    assert Order.query.count() == 1
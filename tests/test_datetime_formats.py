@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import parsers
+from parsers import parse_orders_file
+
+GATE_HEADER = 'Order No.,Type,Fiat Amount,Currency,Price,Coin Amount,Status,Time\n'
+
+
+def write_gate(tmp_path, name, times):
+    path = tmp_path / name
+    lines = [f'{i + 1},sell,100,RUB,90,1,Completed,{time}\n' for i, time in enumerate(times)]
+    path.write_text(GATE_HEADER + ''.join(lines), encoding='utf-8')
+    return str(path)
+
+
+def executed_at(path):
+    return [order['executed_at'] for order in parse_orders_file(path, 'gate')]
+
+
+def test_ambiguous_dates_do_not_depend_on_previous_file(tmp_path):
+    ambiguous = write_gate(tmp_path, 'ambiguous.csv', ['03/04/2025 10:00:00'])
+    day_first = write_gate(tmp_path, 'day_first.csv', ['13/04/2025 10:00:00'])
+
+    alone = executed_at(ambiguous)
+    executed_at(day_first)
+    after_other_file = executed_at(ambiguous)
+
+    assert alone == after_other_file
+    assert alone[0].month == 3
+
+
+def test_format_is_kept_across_chunks_of_one_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(parsers, 'STREAM_CHUNK_ROWS', 2)
+    path = write_gate(tmp_path, 'gate.csv', ['13/04/2025 10:00:00', '14/04/2025 10:00:00', '03/05/2025 10:00:00'])
+
+    times = executed_at(path)
+
+    # Третья строка неоднозначна сама по себе, но файл использует день/месяц
+    assert [(time.day, time.month) for time in times] == [(13, 4), (14, 4), (3, 5)]
+    assert times[0] == datetime(2025, 4, 13, 10, 0)
@@ -0,0 +1,88 @@
+import base64
+from datetime import datetime, timedelta
+
+from app import (db, Order, BLOOM_H1_SEED, BLOOM_H2_SEED, KNOWN_FILTER_OVERLAP, _fnv1a32,
+                 bloom_capacity, bloom_size, build_bloom_filter)
+
+
+def might_contain(filter_bytes, bits, hashes, order_id):
+    """Проверка членства так же, как KnownOrderFilter.mightContain в расширении"""
+    data = order_id.encode('utf-8')
+    h1 = _fnv1a32(data, BLOOM_H1_SEED)
+    h2 = _fnv1a32(data, BLOOM_H2_SEED) | 1
+    return all(filter_bytes[index >> 3] & (1 << (index & 7))
+               for index in ((h1 + j * h2) % bits for j in range(hashes)))
+
+
+def add_orders(employee, order_ids, updated_at=None):
+    for order_id in order_ids:
+        db.session.add(Order(order_id=order_id, employee_id=employee.id, platform='bybit', account_name='acc',
+                             symbol='USDT', side='buy', quantity=1, price=1, total_usdt=1, status='filled',
+                             executed_at=datetime.utcnow(), updated_at=updated_at or datetime.utcnow()))
+    db.session.commit()
+
+
+def fetch(client, employee, **params):
+    response = client.get('/api/orders/known-filter', query_string=dict(employee_id=employee.id, **params))
+    assert response.status_code == 200
+    body = response.get_json()
+    body['filter'] = base64.b64decode(body['bits'])
+    return body
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    known = [f'known-{i}' for i in range(2000)]
+    bits, hashes = bloom_size(len(known), 0.01)
+
+    filter_bytes = build_bloom_filter(known, bits, hashes)
+
+    assert all(might_contain(filter_bytes, bits, hashes, order_id) for order_id in known)
+    false_positives = sum(might_contain(filter_bytes, bits, hashes, f'unknown-{i}') for i in range(2000))
+    assert false_positives < 60
+    assert bloom_capacity(bits, 0.01) >= len(known)
+
+
+def test_full_filter_contains_known_orders(client, employee):
+    add_orders(employee, ['o1', 'o2', 'o3'])
+
+    body = fetch(client, employee)
+
+    assert body['incremental'] is False
+    assert body['count'] == 3
+    assert all(might_contain(body['filter'], body['m'], body['k'], order_id) for order_id in ('o1', 'o2', 'o3'))
+
+
+def test_delta_includes_order_committed_late_with_earlier_timestamp(client, employee):
+    add_orders(employee, ['o1'])
+    full = fetch(client, employee)
+
+    # Ордер длинной транзакции: записан до курсора, а виден стал только после ответа
+    add_orders(employee, ['late'], updated_at=datetime.fromisoformat(full['cursor']) - KNOWN_FILTER_OVERLAP / 2)
+    add_orders(employee, ['new'])
+    delta = fetch(client, employee, since=full['cursor'], m=full['m'], k=full['k'])
+
+    assert delta['incremental'] is True
+    assert (delta['m'], delta['k']) == (full['m'], full['k'])
+    assert might_contain(delta['filter'], delta['m'], delta['k'], 'late')
+    assert might_contain(delta['filter'], delta['m'], delta['k'], 'new')
+
+
+def test_delta_skips_orders_older_than_overlap(client, employee):
+    add_orders(employee, ['old'], updated_at=datetime.utcnow() - timedelta(days=1))
+    full = fetch(client, employee)
+
+    delta = fetch(client, employee, since=full['cursor'], m=full['m'], k=full['k'])
+
+    assert delta['count'] == 0
+
+
+def test_overfull_filter_is_rebuilt(client, employee):
+    add_orders(employee, ['o1'])
+    full = fetch(client, employee)
+    add_orders(employee, [f'n{i}' for i in range(bloom_capacity(full['m']) + 1)])
+
+    rebuilt = fetch(client, employee, since=full['cursor'], m=full['m'], k=full['k'])
+
+    assert rebuilt['incremental'] is False
+    assert rebuilt['m'] > full['m']
+    assert rebuilt['count'] == bloom_capacity(full['m']) + 2
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import db, Order, order_content_fingerprint
+
+
+def btc_order(employee, order_id, **fields):
+    values = dict(order_id=order_id, employee_id=employee.id, platform='bybit_btc', account_name='acc',
+                  symbol='BTCUSDT', side='BUY', quantity=0.1, price=50000, total_usdt=0, status='Завершен',
+                  executed_at=datetime(2024, 1, 20, 10, 0))
+    values.update(fields)
+    return Order(**values)
+
+
+def test_btc_order_gets_content_fingerprint(employee):
+    order = btc_order(employee, 'btc_1')
+    db.session.add(order)
+    db.session.commit()
+
+    assert order.content_fingerprint == order_content_fingerprint(
+        'BTCUSDT', 'BUY', 0.1, 50000, datetime(2024, 1, 20, 10, 0))
+
+
+def test_unique_index_rejects_same_btc_content(employee):
+    db.session.add(btc_order(employee, 'btc_1'))
+    db.session.commit()
+
+    # Другой order_id, то же содержимое (в том числе время с точностью до секунды)
+    db.session.add(btc_order(employee, 'btc_2', executed_at=datetime(2024, 1, 20, 10, 0, 0, 500000)))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+    assert Order.query.count() == 1
+
+
+def test_orders_of_other_platforms_have_no_fingerprint(employee):
+    for order_id in ('o1', 'o2'):
+        db.session.add(btc_order(employee, order_id, platform='bybit'))
+    db.session.commit()
+
+    assert [order.content_fingerprint for order in Order.query] == [None, None]
+
+
+def test_fingerprint_follows_content_changes(employee):
+    order = btc_order(employee, 'btc_1')
+    db.session.add(order)
+    db.session.commit()
+
+    order.price = 51000
+    db.session.commit()
+
+    assert order.content_fingerprint == order_content_fingerprint(
+        'BTCUSDT', 'BUY', 0.1, 51000, datetime(2024, 1, 20, 10, 0))
+    # Старое содержимое снова можно сохранить
+    db.session.add(btc_order(employee, 'btc_2'))
+    db.session.commit()
+
+
+def test_order_without_fingerprint_keeps_it_empty(employee):
+    db.session.add(btc_order(employee, 'btc_1'))
+    db.session.commit()
+    # Поздняя копия дубля, оставленная миграцией без отпечатка
+    late_copy = btc_order(employee, 'btc_2', price=51000)
+    db.session.add(late_copy)
+    db.session.commit()
+    db.session.execute(Order.__table__.update().where(Order.__table__.c.order_id == 'btc_2')
+                       .values(content_fingerprint=None, price=50000))
+    db.session.commit()
+    db.session.refresh(late_copy)
+
+    late_copy.quantity = 0.2
+    db.session.commit()
+
+    assert late_copy.content_fingerprint is None
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from app import (db, Employee, Order, OrderDailyRollup, bulk_write_orders, order_insert_row,
+                 order_rollup_query, order_statistics_totals)
+
+
+def make_order(employee, order_id, executed_at, **fields):
+    values = dict(order_id=order_id, employee_id=employee.id, platform='bybit', account_name='acc',
+                  symbol='USDT', side='sell', quantity=10, price=95, total_usdt=950, status='filled',
+                  executed_at=executed_at)
+    values.update(fields)
+    return Order(**values)
+
+
+def normalized(rows):
+    return sorted(
+        (str(day), employee_id, platform, side, status, bool(count_in_sales), bool(count_in_purchases),
+         int(count), round(float(quantity), 8), round(float(total_usdt), 2))
+        for day, employee_id, platform, side, status, count_in_sales, count_in_purchases, count, quantity, total_usdt
+        in rows
+    )
+
+
+def rollup_rows():
+    table = OrderDailyRollup.__table__
+    return normalized(db.session.execute(select(
+        table.c.day, table.c.employee_id, table.c.platform, table.c.side, table.c.status, table.c.count_in_sales,
+        table.c.count_in_purchases, table.c.order_count, table.c.quantity_sum, table.c.total_usdt_sum
+    )))
+
+
+def raw_rows():
+    return normalized(db.session.execute(order_rollup_query()))
+
+
+@pytest.fixture
+def other_employee(app_ctx):
+    employee = Employee(name='Второй сотрудник')
+    db.session.add(employee)
+    db.session.commit()
+    return employee
+
+
+@pytest.fixture
+def orders(employee):
+    orders = [
+        make_order(employee, 'o1', datetime(2024, 1, 20, 10)),
+        make_order(employee, 'o2', datetime(2024, 1, 20, 23, 30), side='buy', quantity=5, total_usdt=470),
+        make_order(employee, 'o3', datetime(2024, 1, 21, 0, 30), count_in_sales=True),
+    ]
+    db.session.add_all(orders)
+    db.session.commit()
+    return {order.order_id: order for order in orders}
+
+
+def test_rollups_follow_orm_insert(orders):
+    assert len(rollup_rows()) == 3
+    assert rollup_rows() == raw_rows()
+
+
+def test_rollups_follow_bulk_write(employee, orders):
+    bulk_write_orders([order_insert_row({'order_id': 'o4', 'symbol': 'USDT', 'side': 'sell', 'quantity': 3,
+                                         'price': 95, 'total_usdt': 285,
+                                         'executed_at': datetime(2024, 1, 20, 12)}, employee.id, 'bybit', 'acc')])
+    db.session.commit()
+
+    assert rollup_rows() == raw_rows()
+
+
+def test_rollups_follow_update(orders, other_employee):
+    orders['o1'].status = 'canceled'
+    orders['o2'].executed_at = datetime(2024, 1, 22, 9)
+    orders['o3'].employee_id = other_employee.id
+    orders['o3'].quantity = 7
+    db.session.commit()
+
+    assert rollup_rows() == raw_rows()
+
+
+def test_rollups_follow_delete(orders):
+    db.session.delete(orders['o1'])
+    db.session.delete(orders['o3'])
+    db.session.commit()
+
+    # Пустой день не оставляет строк в сводке
+    assert rollup_rows() == raw_rows()
+    assert len(rollup_rows()) == 1
+
+
+@pytest.mark.parametrize('start,end', [
+    (None, None),
+    (datetime(2024, 1, 20), datetime(2024, 1, 22)),
+    (datetime(2024, 1, 20, 12), datetime(2024, 1, 21, 1)),
+    (datetime(2024, 1, 20, 9), datetime(2024, 1, 20, 23)),
+])
+def test_statistics_totals_match_raw_orders(employee, orders, start, end):
+    expected = {}
+    for platform, side, status, count_in_sales, count_in_purchases, count, quantity, total_usdt in db.session.execute(
+            order_rollup_query(start, end, [employee.id], by_day=False)):
+        expected[(platform, side, status, bool(count_in_sales), bool(count_in_purchases))] = [
+            int(count), float(quantity), float(total_usdt)]
+
+    assert order_statistics_totals(start, end, employee.id) == expected
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from app import db, Order
+
+
+def batch_item(employee, order_id, **fields):
+    item = {
+        'order_id': order_id,
+        'employee_id': employee.id,
+        'symbol': 'USDT',
+        'side': 'buy',
+        'quantity': '10',
+        'price': '90',
+        'total_usdt': '900',
+        'executed_at': '2024-01-20T10:00:00',
+    }
+    item.update(fields)
+    return item
+
+
+def statuses(response):
+    return [result['status'] for result in response.get_json()['results']]
+
+
+def test_reports_created_duplicate_and_error_per_item(client, employee):
+    items = [batch_item(employee, 'o1'), batch_item(employee, 'o2'), batch_item(employee, 'o1'),
+             batch_item(employee, 'o3', employee_id=999), batch_item(employee, 'o4', price='abc')]
+
+    response = client.post('/api/orders/batch', json=items)
+
+    assert response.status_code == 200
+    assert statuses(response) == ['created', 'created', 'duplicate', 'error', 'error']
+    body = response.get_json()
+    assert (body['created'], body['duplicates'], body['errors']) == (2, 1, 2)
+    ids = {order.order_id: order.id for order in Order.query}
+    assert [result.get('id') for result in body['results'][:2]] == [ids['o1'], ids['o2']]
+
+
+def test_order_existing_under_other_platform_is_duplicate(client, employee):
+    db.session.add(Order(order_id='o1', employee_id=employee.id, platform='htx', account_name='acc',
+                         symbol='USDT', side='buy', quantity=1, price=1, total_usdt=1, status='filled',
+                         executed_at=datetime(2024, 1, 20, 9, 0)))
+    db.session.commit()
+
+    response = client.post('/api/orders/batch', json=[batch_item(employee, 'o1', platform='bybit')])
+
+    assert statuses(response) == ['duplicate']
+    assert 'id' not in response.get_json()['results'][0]
+
+
+def test_btc_order_with_same_content_is_duplicate(client, employee):
+    first = batch_item(employee, 'btc1', platform='bybit_btc')
+    client.post('/api/orders/batch', json=[first])
+
+    response = client.post('/api/orders/batch', json=[batch_item(employee, 'btc2', platform='bybit_btc')])
+
+    assert statuses(response) == ['duplicate']
+    assert Order.query.count() == 1
+
+
+def test_idempotency_key_replays_stored_response(client, employee):
+    items = [batch_item(employee, 'o1'), batch_item(employee, 'o2')]
+    headers = {'Idempotency-Key': 'k1'}
+
+    first = client.post('/api/orders/batch', json=items, headers=headers)
+    second = client.post('/api/orders/batch', json=items, headers=headers)
+
+    assert first.get_json()['replayed'] is False
+    assert second.get_json()['replayed'] is True
+    assert second.get_json()['results'] == first.get_json()['results']
+    assert Order.query.count() == 2
+
+
+def test_idempotency_key_with_other_body_is_rejected(client, employee):
+    headers = {'Idempotency-Key': 'k1'}
+    client.post('/api/orders/batch', json=[batch_item(employee, 'o1')], headers=headers)
+
+    response = client.post('/api/orders/batch', json=[batch_item(employee, 'o2')], headers=headers)
+
+    assert response.status_code == 422
+    assert Order.query.count() == 1
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from parsers import (convert_to_moscow_time, parse_bybit_btc_csv_line, parse_bybit_order, parse_gate_order,
+                     parse_htx_order, parse_orders_file)
+
+# Небольшие выгрузки со смесью регистров, запятых в числах, пропусков и мусора.
+# Время во всех строках разбирается (строки без времени старый разбор помечал now()),
+# а колонка номеров Bybit заполнена: с пропуском pandas читал ее как float и старый
+# разбор портил длинные номера ('1.8e+18').
+BYBIT_EXPORT = (
+    'Order No.,Type,Fiat Amount,Currency,Price,Coin Amount,Counterparty,Status,Time\n'
+    '1800000000000000001,BUY,9000.50,RUB,90.01,100,x,Completed,2024-05-01 06:00:00\n'
+    '1800000000000000002,sell,"1,234.50",rub,"95,5",12.9,x,Completed,2024-05-01 07:30:00\n'
+    '1800000000000000003,Sell,,RUB,91,,x,Canceled,2024-05-01 08:00:00\n'
+    '1800000000000000004,weird,500,RUB,90,5,x,Pending,2024-05-01 09:15:00\n'
+    '1800000000000000005,,500,RUB,90,5,x,Completed,2024-05-01 10:00:00\n'
+    '1800000000000000006,BUY,n/a,RUB,90,12 USDT,x,Оформление жалоб,2024-05-01 11:00:00\n'
+    '1800000000000000007,SELL,-500,RUB,90,0,x,,2024-05-01 12:00:00\n'
+    '1800000000000000008,BUY,4500,RUB,90,50,x,Completed,2024-05-02 01:00:00\n'
+)
+
+HTX_EXPORT = (
+    'Номер:,Монета,Тип,Количество,Цена за ед.,Общая цена,Статус,Время\n'
+    'H1,USDT,Продать,100.5,90.64,9109.32,Завершено,2024-05-01 12:00:00\n'
+    'H2,usdt,Купить,"12,5",91,1137.5,Отменено,2024-05-01 13:00:00\n'
+    'H3,,продать USDT,,98.02,,Завершено,2024-05-01 14:00:00\n'
+    'H4,USDT,???,abc,90,,ожидание,2024-05-01 15:00:00\n'
+    ',USDT,Купить,10,90,900,Завершено,2024-05-01 16:00:00\n'
+    'H6,USDT,Купить,10,90,900,Оформление жалоб,2024-05-02 05:00:00\n'
+)
+
+BTC_EXPORT = (
+    'Currency,Contract,Type,Direction,Quantity,Position,Filled Price,Funding,Fee Paid,Cash Flow,Change,Wallet Balance,Action,Time\n'
+    'USDT,BTCUSDT,TRADE,BUY,0.1,0,50000,,,,,,,01.05.2024 06:00\n'
+    'USDT,BTCUSDT,TRADE,SELL,0.25,0,50100.5,,,,,,,01.05.2024 07:10\n'
+    'USDT,,TRADE,,abc,0,,,,,,,,01.05.2024 08:20\n'
+    ',,TRADE,BUY,0.3,0,49000,,,,,,,01.05.2024 09:30\n'
+    'USDT,BTCUSDT,TRADE,BUY,0.1,0,50000,,,,,,,02.05.2024 03:00\n'
+)
+
+BLISS_EXPORT = (
+    'Creation date;Internal id;Organization user;Amount;Crypto amount;Status;Method\n'
+    '01.05.2024 06:00:00;B1;acc1;"1 000,50";10,5;success;sell\n'
+    '01.05.2024 07:00:00;B2;acc2;9000;100;Completed;buy\n'
+    '01.05.2024 08:00:00;B3;acc1;500;0;cancelled;Продажа\n'
+    '01.05.2024 09:00:00;B4;acc1;abc;5;expired;buy\n'
+    '01.05.2024 10:00:00;B5;acc2;900;10;failed;card\n'
+    '01.05.2024 11:00:00;B6;acc2;900;10;new;sell\n'
+    '02.05.2024 01:00:00;B7;acc1;900;10;done;buy\n'
+)
+
+WINDOWS = [(None, None), (datetime(2024, 5, 1, 10, 0), datetime(2024, 5, 1, 16, 0))]
+
+
+def in_window(orders, start_date, end_date):
+    return [order for order in orders
+            if not (start_date and order['executed_at'] < start_date)
+            and not (end_date and order['executed_at'] > end_date)]
+
+
+def iterrows_reference(path, platform, start_date, end_date):
+    """Прежний разбор: iterrows() и построчные parse_*_order"""
+    parse_row = {'bybit': parse_bybit_order, 'htx': parse_htx_order, 'gate': parse_gate_order}[platform]
+    orders = []
+    for _, row in pd.read_csv(path).iterrows():
+        order_data = parse_row(row)
+        if order_data:
+            order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], platform)
+            orders.append(order_data)
+    return in_window(orders, start_date, end_date)
+
+
+def btc_reference(path, start_date, end_date):
+    """Прежний разбор BTC: строка за строкой, время одним из двух форматов"""
+    orders = []
+    with open(path, encoding='utf-8') as f:
+        for line in f.readlines()[1:]:
+            order_data = parse_bybit_btc_csv_line(line)
+            for fmt in ('%d.%m.%Y %H:%M', '%Y-%m-%d %H:%M:%S'):
+                try:
+                    order_data['executed_at'] = datetime.strptime(order_data['executed_at'], fmt)
+                    break
+                except ValueError:
+                    continue
+            order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], 'bybit')
+            orders.append(order_data)
+    return in_window(orders, start_date, end_date)
+
+
+def bliss_reference(path, start_date, end_date):
+    """Прежний разбор Bliss: read_csv с ';' и iterrows()"""
+    statuses = {'success': 'filled', 'completed': 'filled', 'done': 'filled', 'cancelled': 'canceled',
+                'canceled': 'canceled', 'expired': 'expired', 'failed': 'failed'}
+    orders = []
+    for _, row in pd.read_csv(path, sep=';', encoding='utf-8', quotechar='"', header=0).iterrows():
+        executed_at = convert_to_moscow_time(datetime.strptime(str(row['Creation date']).strip(), '%d.%m.%Y %H:%M:%S'), 'bliss')
+        try:
+            total_usdt = float(str(row['Amount']).strip().replace(' ', '').replace(',', '.'))
+            quantity = float(str(row['Crypto amount']).strip().replace(' ', '').replace(',', '.'))
+        except ValueError:
+            continue
+        orders.append({
+            'order_id': str(row['Internal id']).strip(),
+            'symbol': 'USDT',
+            'side': 'sell' if str(row['Method']).strip().lower() in ['sell', 'продажа', 'продать'] else 'buy',
+            'quantity': quantity,
+            'price': total_usdt / quantity if quantity > 0 else 0,
+            'total_usdt': total_usdt,
+            'fees_usdt': 0,
+            'status': statuses.get(str(row['Status']).strip().lower(), 'pending'),
+            'executed_at': executed_at,
+            # Новое поле: имя из выгрузки для распределения по аккаунтам смены
+            'export_account': str(row['Organization user']).strip(),
+        })
+    return in_window(orders, start_date, end_date)
+
+
+def write_export(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('start_date,end_date', WINDOWS)
+@pytest.mark.parametrize('platform,content', [('bybit', BYBIT_EXPORT), ('gate', BYBIT_EXPORT), ('htx', HTX_EXPORT)])
+def test_columnar_parsers_match_iterrows(tmp_path, platform, content, start_date, end_date):
+    path = write_export(tmp_path, f'{platform}.csv', content)
+
+    expected = iterrows_reference(path, platform, start_date, end_date)
+
+    assert expected
+    assert parse_orders_file(path, platform, start_date, end_date) == expected
+
+
+@pytest.mark.parametrize('start_date,end_date', WINDOWS)
+def test_btc_parser_matches_line_parser(tmp_path, start_date, end_date):
+    path = write_export(tmp_path, 'btc.csv', BTC_EXPORT)
+
+    expected = btc_reference(path, start_date, end_date)
+
+    assert expected
+    assert parse_orders_file(path, 'bybit_btc', start_date, end_date) == expected
+
+
+@pytest.mark.parametrize('start_date,end_date', WINDOWS)
+def test_bliss_parser_matches_iterrows(tmp_path, start_date, end_date):
+    path = write_export(tmp_path, 'bliss.csv', BLISS_EXPORT)
+
+    expected = bliss_reference(path, start_date, end_date)
+
+    assert expected
+    assert parse_orders_file(path, 'bliss', start_date, end_date) == expected
@@ -0,0 +1,137 @@
+import json
+from datetime import date, datetime
+
+import pytest
+
+from app import db, Order, ShiftProfitSnapshot, ShiftReport, bulk_write_orders, order_insert_row
+
+
+def make_order(employee, order_id, executed_at, **fields):
+    values = dict(order_id=order_id, employee_id=employee.id, platform='bybit', account_name='acc',
+                  symbol='USDT', side='sell', quantity=10, price=95, total_usdt=950, status='filled',
+                  executed_at=executed_at)
+    values.update(fields)
+    return Order(**values)
+
+
+def make_report(employee, day, **fields):
+    values = dict(employee_id=employee.id, shift_date=day, shift_type='morning',
+                  shift_start_time=datetime(day.year, day.month, day.day, 9),
+                  shift_end_time=datetime(day.year, day.month, day.day, 21))
+    values.update(fields)
+    return ShiftReport(**values)
+
+
+def fill_snapshots():
+    """Помечает все снимки посчитанными"""
+    table = ShiftProfitSnapshot.__table__
+    db.session.execute(table.update().values(order_profit_json=json.dumps({'profit': 1}),
+                                             report_profit_json=json.dumps({'profit': 2})))
+    db.session.commit()
+
+
+def snapshot(report):
+    db.session.expire_all()
+    row = db.session.get(ShiftProfitSnapshot, report.id)
+    return row.order_profit_json is not None, row.report_profit_json is not None, row.version
+
+
+@pytest.fixture
+def reports(employee):
+    reports = [make_report(employee, date(2024, 1, 20)), make_report(employee, date(2024, 1, 22))]
+    db.session.add_all(reports)
+    db.session.commit()
+    fill_snapshots()
+    return reports
+
+
+def test_new_order_resets_only_its_shift(employee, reports):
+    version = snapshot(reports[0])[2]
+
+    db.session.add(make_order(employee, 'o1', datetime(2024, 1, 20, 10)))
+    db.session.commit()
+
+    assert snapshot(reports[0]) == (False, False, version + 1)
+    assert snapshot(reports[1])[:2] == (True, True)
+
+
+def test_order_outside_shifts_keeps_snapshots(employee, reports):
+    db.session.add(make_order(employee, 'o1', datetime(2024, 1, 20, 22)))
+    db.session.commit()
+
+    assert snapshot(reports[0])[:2] == (True, True)
+    assert snapshot(reports[1])[:2] == (True, True)
+
+
+def test_order_update_and_delete_reset_shift(employee, reports):
+    order = make_order(employee, 'o1', datetime(2024, 1, 22, 10))
+    db.session.add(order)
+    db.session.commit()
+    fill_snapshots()
+
+    order.status = 'canceled'
+    db.session.commit()
+    assert snapshot(reports[1])[:2] == (False, False)
+
+    fill_snapshots()
+    db.session.delete(order)
+    db.session.commit()
+    assert snapshot(reports[1])[:2] == (False, False)
+
+
+def test_price_change_keeps_snapshots(employee, reports):
+    order = make_order(employee, 'o1', datetime(2024, 1, 20, 10))
+    db.session.add(order)
+    db.session.commit()
+    fill_snapshots()
+
+    # Цена не входит в SHIFT_PROFIT_ORDER_FIELDS
+    order.price = 96
+    db.session.commit()
+
+    assert snapshot(reports[0])[:2] == (True, True)
+
+
+def test_bulk_write_resets_shift(employee, reports):
+    bulk_write_orders([order_insert_row({'order_id': 'o1', 'symbol': 'USDT', 'side': 'sell', 'quantity': 3,
+                                         'price': 95, 'total_usdt': 285, 'executed_at': datetime(2024, 1, 22, 12)},
+                                        employee.id, 'bybit', 'acc')])
+    db.session.commit()
+
+    assert snapshot(reports[0])[:2] == (True, True)
+    assert snapshot(reports[1])[:2] == (False, False)
+
+
+def test_rollback_keeps_snapshots(employee, reports):
+    db.session.add(make_order(employee, 'o1', datetime(2024, 1, 20, 10)))
+    db.session.flush()
+    db.session.rollback()
+
+    assert snapshot(reports[0])[:2] == (True, True)
+
+
+def test_moving_order_out_of_shift_resets_old_shift(employee, reports):
+    order = make_order(employee, 'o1', datetime(2024, 1, 20, 10))
+    db.session.add(order)
+    db.session.commit()
+    fill_snapshots()
+
+    order.executed_at = datetime(2024, 1, 21, 10)
+    db.session.commit()
+
+    assert snapshot(reports[0])[:2] == (False, False)
+    assert snapshot(reports[1])[:2] == (True, True)
+
+
+def test_moving_report_forward_resets_reports_in_between(employee, reports):
+    earlier = make_report(employee, date(2024, 1, 21))
+    db.session.add(earlier)
+    db.session.commit()
+    fill_snapshots()
+
+    # Отчет 21-го переносится на 25-е: меняется предыдущий баланс отчета 22-го
+    earlier.shift_date = date(2024, 1, 25)
+    db.session.commit()
+
+    assert snapshot(reports[0])[:2] == (True, True)
+    assert snapshot(reports[1])[:2] == (True, False)
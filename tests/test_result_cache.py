@@ -0,0 +1,54 @@
+import json
+from datetime import date, datetime
+
+from app import db, Employee, ShiftReport, ShiftProfitSnapshot, Order
+
+
+def get_statistics(client):
+    response = client.get('/api/statistics')
+    assert response.status_code == 200
+    return response
+
+
+def test_commit_invalidates_cached_response(client, employee):
+    assert get_statistics(client).headers['X-Cache'] == 'MISS'
+    assert get_statistics(client).headers['X-Cache'] == 'HIT'
+
+    db.session.add(Employee(name='Новый сотрудник'))
+    db.session.commit()
+
+    response = get_statistics(client)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert 'Новый сотрудник' in [row['name'] for row in response.get_json()]
+
+
+def test_rollback_keeps_cached_response(client, employee):
+    get_statistics(client)
+
+    db.session.add(Employee(name='Отмененный сотрудник'))
+    db.session.flush()
+    db.session.rollback()
+
+    assert get_statistics(client).headers['X-Cache'] == 'HIT'
+
+
+def test_profit_snapshot_recompute_invalidates_cached_response(client, employee):
+    report = ShiftReport(employee_id=employee.id, shift_date=date(2024, 1, 20), shift_type='morning',
+                         shift_start_time=datetime(2024, 1, 20, 9), shift_end_time=datetime(2024, 1, 20, 21))
+    db.session.add(report)
+    db.session.add(Order(order_id='o1', employee_id=employee.id, platform='bybit', account_name='acc',
+                         symbol='USDT', side='sell', quantity=10, price=95, total_usdt=950, status='filled',
+                         executed_at=datetime(2024, 1, 20, 10)))
+    db.session.commit()
+    get_statistics(client)
+    # Снимок, испорченный мимо ORM, - его исправит только пересчет администратора
+    table = ShiftProfitSnapshot.__table__
+    db.session.execute(table.update().values(order_profit_json=json.dumps({'profit': 12345})))
+    db.session.commit()
+    assert get_statistics(client).headers['X-Cache'] == 'HIT'
+
+    response = client.post('/api/admin/profit-snapshots/recompute', json={'password': 'Blalala2'})
+
+    assert response.status_code == 200
+    assert response.get_json()['mismatches']
+    assert get_statistics(client).headers['X-Cache'] == 'MISS'
@@ -0,0 +1,65 @@
+import io
+import json
+
+from app import db, Account, Order
+
+BYBIT_EXPORT = (
+    'Order No.,Type,Fiat Amount,Currency,Price,Coin Amount,Status,Time\n'
+    '5001,SELL,9000,RUB,90,100,Completed,2024-01-20 07:00:00\n'
+    '5002,BUY,4500,RUB,90,50,Completed,2024-01-20 08:00:00\n'
+)
+
+
+def shift_form(employee, accounts, **extra):
+    data = {
+        'employee_id': str(employee.id),
+        'shift_date': '2024-01-20',
+        'shift_start_time': '2024-01-20T09:00',
+        'shift_end_time': '2024-01-20T21:00',
+        'selected_accounts': json.dumps({platform: [account.id] for platform, account in accounts.items()}),
+        'balances': '{}',
+        f"gate_amount_{accounts['gate'].id}": '100',
+        f"gate_amount_rub_{accounts['gate'].id}": '9000',
+    }
+    data.update(extra)
+    return data
+
+
+def create_accounts(employee):
+    accounts = {platform: Account(employee_id=employee.id, platform=platform, account_name=f'{platform}1', is_active=True)
+                for platform in ('bybit', 'gate')}
+    db.session.add_all(accounts.values())
+    db.session.commit()
+    return accounts
+
+
+def test_shift_report_stats_come_from_import_job(client, employee, tmp_path, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'UPLOAD_FOLDER', str(tmp_path))
+    accounts = create_accounts(employee)
+
+    response = client.post('/api/reports/create-shift', data=shift_form(
+        employee, accounts,
+        **{f"file_bybit_{accounts['bybit'].id}": (io.BytesIO(BYBIT_EXPORT.encode('utf-8')), 'orders.csv')}
+    ), content_type='multipart/form-data')
+
+    body = response.get_json()
+    assert response.status_code == 200
+    # Пока файлы в задаче, неполную статистику не отдаем
+    assert body['stats'] is None
+    job = client.get(body['status_url']).get_json()
+    assert job['status'] == 'done'
+    stats = job['result']
+    assert sorted(stats['platforms_processed']) == ['BYBIT', 'GATE']
+    assert stats['total_orders'] == 2
+    assert Order.query.filter_by(platform='bybit').count() == 2
+
+
+def test_shift_report_without_files_returns_stats(client, employee):
+    accounts = create_accounts(employee)
+
+    body = client.post('/api/reports/create-shift', data=shift_form(employee, accounts),
+                       content_type='multipart/form-data').get_json()
+
+    assert body['job_id'] is None
+    assert body['stats']['platforms_processed'] == ['GATE']
+    assert body['stats']['linked_orders'] == 1
@@ -0,0 +1,116 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import parsers
+from parsers import parse_orders_file
+
+BYBIT_HEADER = 'Order No.,Type,Fiat Amount,Currency,Price,Coin Amount,Status,Time\n'
+BTC_HEADER = 'Currency,Contract,Type,Direction,Quantity,Position,Filled Price,Funding,Fee Paid,Cash Flow,Change,Wallet Balance,Action,Time\n'
+START = datetime(2024, 1, 1)
+# Окно смены по МСК (время Bybit в выгрузке - UTC)
+WINDOW = (datetime(2024, 1, 1, 9, 0), datetime(2024, 1, 1, 12, 0))
+
+
+def bybit_lines(times, first_id):
+    return [f'{first_id + i},SELL,100.5,RUB,90.1,1.5,Completed,{time:%Y-%m-%d %H:%M:%S}\n'
+            for i, time in enumerate(times)]
+
+
+def btc_lines(times, quantity):
+    return [f'USDT,BTCUSDT,TRADE,BUY,{quantity},0,{50000 + i},,,,,,,{time:%d.%m.%Y %H:%M}\n'
+            for i, time in enumerate(times)]
+
+
+def minutes(count, step=10):
+    return [START + timedelta(minutes=step * i) for i in range(count)]
+
+
+def write_export(tmp_path, name, header, lines):
+    path = tmp_path / name
+    path.write_text(header + ''.join(lines), encoding='utf-8')
+    return str(path)
+
+
+def in_window(path, platform):
+    """Ордера окна смены по полному разбору без границ (эталон)"""
+    return sorted(order['order_id'] for order in parse_orders_file(path, platform)
+                  if WINDOW[0] <= order['executed_at'] <= WINDOW[1])
+
+
+def parse_window(path, platform):
+    info = {}
+    orders = parse_orders_file(path, platform, *WINDOW, parse_info=info)
+    return sorted(order['order_id'] for order in orders), info['summary']
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(parsers, 'STREAM_CHUNK_ROWS', 10)
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_sorted_export_skips_rows_after_window(tmp_path, reverse):
+    times = minutes(200)
+    if reverse:
+        times.reverse()
+    path = write_export(tmp_path, 'bybit.csv', BYBIT_HEADER, bybit_lines(times, 1000))
+
+    order_ids, summary = parse_window(path, 'bybit')
+
+    assert order_ids == in_window(path, 'bybit')
+    assert len(order_ids) == 19
+    assert summary['stopped_early'] is True
+    assert summary['rows_read'] == 200
+
+
+def test_two_concatenated_exports_are_read_to_the_end(tmp_path):
+    lines = bybit_lines(minutes(100), 1000) + bybit_lines(minutes(100), 5000)
+    path = write_export(tmp_path, 'bybit.csv', BYBIT_HEADER, lines)
+
+    order_ids, _ = parse_window(path, 'bybit')
+
+    assert order_ids == in_window(path, 'bybit')
+    assert len(order_ids) == 38
+
+
+def test_unsorted_export_is_read_to_the_end(tmp_path):
+    times = minutes(200)
+    random.Random(1).shuffle(times)
+    path = write_export(tmp_path, 'bybit.csv', BYBIT_HEADER, bybit_lines(times, 1000))
+
+    order_ids, summary = parse_window(path, 'bybit')
+
+    assert order_ids == in_window(path, 'bybit')
+    assert summary['stopped_early'] is False
+
+
+def test_partly_sorted_export_keeps_late_window_rows(tmp_path):
+    # Отсортированный файл, в конец которого дописана строка из окна смены
+    times = minutes(200) + [datetime(2024, 1, 1, 7, 0)]
+    path = write_export(tmp_path, 'bybit.csv', BYBIT_HEADER, bybit_lines(times, 1000))
+
+    order_ids, _ = parse_window(path, 'bybit')
+
+    assert order_ids == in_window(path, 'bybit')
+    assert '1200' in order_ids
+
+
+def test_btc_two_concatenated_exports_are_read_to_the_end(tmp_path):
+    lines = btc_lines(minutes(100), '0.1') + btc_lines(minutes(100), '0.2')
+    path = write_export(tmp_path, 'btc.csv', BTC_HEADER, lines)
+
+    order_ids, _ = parse_window(path, 'bybit_btc')
+
+    assert order_ids == in_window(path, 'bybit_btc')
+    assert len(order_ids) == 38
+
+
+def test_btc_sorted_export_skips_rows_after_window(tmp_path):
+    path = write_export(tmp_path, 'btc.csv', BTC_HEADER, btc_lines(minutes(200), '0.1'))
+
+    order_ids, summary = parse_window(path, 'bybit_btc')
+
+    assert order_ids == in_window(path, 'bybit_btc')
+    assert summary['stopped_early'] is True
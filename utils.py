@@ -1,44 +1,200 @@
+import bisect
 import json
 # Модели импортируйте из app.py, если они определены там
 # from app import ShiftReport, InitialBalance, Account
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 from datetime import date
+import logging
+from app_logging import get_logger
+
+profit_log = get_logger('profit')
+
+class BalanceTimeline:
+    """
+    Предыдущие балансы аккаунтов по таблице shift_report_balance.
+
+    Для каждой пары (платформа, account_id) при первом обращении одним
+    индексным запросом загружается отсортированная по (shift_date, shift_type)
+    последовательность балансов, а предыдущий баланс ищется бинарным поиском.
+    Порядок и правила совпадают с прежним find_prev_balance: более ранние
+    даты, а в тот же день для вечерней смены - утренняя; затем InitialBalance
+    по id и по имени аккаунта.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+        # (платформа, account_id) -> ([(shift_date, shift_type)], [(report_id, баланс)]);
+        # среди отчетов одной смены последним идет более ранний отчет - он и побеждает
+        self._accounts = {}
+        self._initial_by_id = None
+        self._initial_by_name = None
+        self._account_names = None
+
+    def _account_sequence(self, platform, account_id):
+        key = (platform, account_id)
+        if key not in self._accounts:
+            from app import ShiftReportBalance
+            rows = self._session.query(
+                ShiftReportBalance.shift_date,
+                ShiftReportBalance.shift_type,
+                ShiftReportBalance.shift_report_id,
+                ShiftReportBalance.balance
+            ).filter(
+                ShiftReportBalance.account_id == account_id,
+                ShiftReportBalance.platform == platform
+            ).order_by(
+                ShiftReportBalance.shift_date,
+                ShiftReportBalance.shift_type,
+                ShiftReportBalance.shift_report_id.desc()
+            ).all()
+            self._accounts[key] = (
+                [(shift_date, shift_type) for shift_date, shift_type, _, _ in rows],
+                [(report_id, balance) for _, _, report_id, balance in rows]
+            )
+        return self._accounts[key]
+
+    def _load_initial_balances(self):
+        from app import InitialBalance, Account
+        # Начальные балансы: первое совпадение по id и по имени, как при переборе списка
+        self._initial_by_id = {}
+        self._initial_by_name = {}
+        for bal in self._session.query(InitialBalance).order_by(InitialBalance.id).all():
+            self._initial_by_id.setdefault((bal.platform, str(getattr(bal, 'account_id', None))), bal.balance)
+            self._initial_by_name.setdefault((bal.platform, bal.account_name), bal.balance)
+        self._account_names = {str(acc_id): name for acc_id, name in self._session.query(Account.id, Account.account_name).all()}
+
+    def prev_balance(self, account_id, platform, cur_report) -> float:
+        """Предыдущий баланс аккаунта на платформе до cur_report (см. find_prev_balance)"""
+        try:
+            account_key = int(account_id)
+        except (TypeError, ValueError):
+            account_key = None
+        if account_key is not None:
+            keys, entries = self._account_sequence(platform, account_key)
+            cur_date = cur_report.shift_date
+            # В тот же день вечерней смене предшествует утренняя
+            if cur_report.shift_type == 'evening':
+                lo = bisect.bisect_left(keys, (cur_date, 'morning'))
+                hi = bisect.bisect_right(keys, (cur_date, 'morning'))
+                for i in range(hi - 1, lo - 1, -1):
+                    if entries[i][0] != cur_report.id:
+                        return float(entries[i][1] or 0)
+            # Иначе - последняя запись более ранней даты
+            i = bisect.bisect_left(keys, (cur_date,)) - 1
+            if i >= 0:
+                return float(entries[i][1] or 0)
+        # Если нет предыдущего отчёта — ищем начальный баланс по id или имени
+        if self._initial_by_id is None:
+            self._load_initial_balances()
+        if (platform, str(account_id)) in self._initial_by_id:
+            return float(self._initial_by_id[(platform, str(account_id))])
+        acc_name = self._account_names.get(str(account_id))
+        if acc_name and (platform, acc_name) in self._initial_by_name:
+            return float(self._initial_by_name[(platform, acc_name)])
+        return 0.0
+
+def get_balance_timeline(session: Session) -> BalanceTimeline:
+    """
+    BalanceTimeline текущего запроса: строится при первом обращении и
+    переиспользуется всеми расчетами в рамках одного HTTP-запроса.
+    Вне запроса каждый вызов строит новую шкалу.
+    """
+    from flask import g, has_request_context
+    if not has_request_context():
+        return BalanceTimeline(session)
+    timeline = getattr(g, 'balance_timeline', None)
+    if timeline is None:
+        timeline = g.balance_timeline = BalanceTimeline(session)
+    return timeline
 
 def find_prev_balance(session: Session, account_id, platform, cur_report) -> float:
     """
     Поиск предыдущего баланса для аккаунта на платформе до cur_report.
     Сначала ищет в предыдущих отчётах, затем в InitialBalance (по id и имени).
+    Использует общую для запроса BalanceTimeline.
     """
-    from app import InitialBalance, Account
-    prev_reports = session.query(type(cur_report)).filter(
-        type(cur_report).id != cur_report.id,
-        (type(cur_report).shift_date < cur_report.shift_date) |
-        ((type(cur_report).shift_date == cur_report.shift_date) & (type(cur_report).shift_type == 'morning') & (cur_report.shift_type == 'evening'))
-    ).order_by(type(cur_report).shift_date.desc(), type(cur_report).shift_type.desc()).all()
-    for r in prev_reports:
-        try:
-            b = json.loads(r.balances_json or '{}')
-        except:
-            b = {}
-        if b.get(platform):
-            for a in b[platform]:
-                if (a.get('account_id') or a.get('id')) == account_id:
-                    return float(a.get('balance', 0))
-    # Если нет предыдущего отчёта — ищем начальный баланс по id или имени
-    ib = session.query(InitialBalance).filter_by(platform=platform).all()
-    for bal in ib:
-        if str(account_id) == str(getattr(bal, 'account_id', None)):
-            return float(bal.balance)
-    acc_obj = session.query(Account).filter_by(id=account_id).first()
-    acc_name = acc_obj.account_name if acc_obj else None
-    if acc_name:
-        for bal in ib:
-            if acc_name == bal.account_name:
-                return float(bal.balance)
-    return 0.0
+    return get_balance_timeline(session).prev_balance(account_id, platform, cur_report)
+
+class ProfitMemo:
+    """
+    Рассчитанная в рамках запроса прибыль отчетов по ключу
+    (вид расчета, report.id, version снимка прибыли).
+
+    Любое изменение, влияющее на прибыль смены, увеличивает version ее снимка
+    (invalidate_shift_profit_snapshots), поэтому после записи в том же запросе
+    значение считается заново. Отчеты без строки снимка не запоминаются.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, kind, report_id, version):
+        value = self._values.get((kind, report_id, version))
+        return dict(value) if value is not None else None
+
+    def put(self, kind, report_id, version, value):
+        if report_id is not None and version is not None:
+            self._values[(kind, report_id, version)] = dict(value)
+
+def get_profit_memo():
+    """ProfitMemo текущего запроса или None вне запроса (см. get_balance_timeline)"""
+    from flask import g, has_request_context
+    if not has_request_context():
+        return None
+    memo = getattr(g, 'profit_memo', None)
+    if memo is None:
+        memo = g.profit_memo = ProfitMemo()
+    return memo
+
+def _snapshot_versions(session: Session, report_ids: List) -> Dict[int, int]:
+    """version снимков прибыли отчетов: {report.id: version}"""
+    from app import ShiftProfitSnapshot
+    versions = {}
+    for i in range(0, len(report_ids), PROFIT_BATCH_SIZE):
+        chunk = report_ids[i:i + PROFIT_BATCH_SIZE]
+        versions.update(session.query(
+            ShiftProfitSnapshot.shift_report_id, ShiftProfitSnapshot.version
+        ).filter(ShiftProfitSnapshot.shift_report_id.in_(chunk)).all())
+    return versions
+
+def _memoized_profits(session: Session, kind: str, reports: List, compute, versions=None) -> Dict[int, Dict[str, float]]:
+    """
+    compute(reports) -> {report.id: прибыль} с запоминанием в ProfitMemo запроса:
+    каждый отчет считается не больше одного раза на версию снимка.
+    versions - уже прочитанные version снимков, иначе читаются одним запросом.
+    """
+    memo = get_profit_memo()
+    if memo is None:
+        return compute(reports)
+    if versions is None:
+        versions = _snapshot_versions(session, [r.id for r in reports if r.id is not None])
+    result = {}
+    missing = []
+    for report in reports:
+        value = memo.get(kind, report.id, versions.get(report.id))
+        if value is not None:
+            result[report.id] = value
+        else:
+            missing.append(report)
+    if missing:
+        computed = compute(missing)
+        for report in missing:
+            memo.put(kind, report.id, versions.get(report.id), computed[report.id])
+        result.update(computed)
+    return result
 
 def calculate_report_profit(session: Session, report) -> Dict[str, float]:
+    """
+    Прибыль отчета по балансам (см. _calculate_report_profit); в рамках запроса
+    считается один раз на версию снимка прибыли.
+    """
+    return _memoized_profits(
+        session, 'report', [report],
+        lambda reports: {r.id: _calculate_report_profit(session, r) for r in reports}
+    )[report.id]
+
+def _calculate_report_profit(session: Session, report) -> Dict[str, float]:
     """
     Возвращает словарь с profit (дельта), project_profit (дельта-скам-докидка-внутренний), salary_profit (дельта-докидка-внутренний)
     Теперь дельта считается как сумма (end_balance - start_balance) по всем аккаунтам всех платформ.
@@ -73,10 +229,10 @@ def calculate_report_profit(session: Session, report) -> Dict[str, float]:
                     
                     # Проверяем на аномально большие значения
                     if abs(start) > 100000:
-                        print(f"⚠️  Аномально большой начальный баланс {start} в отчете {report.id}, обнуляем")
+                        profit_log.warning("Аномально большой начальный баланс %s в отчете %s, обнуляем", start, report.id)
                         start = 0
                     if abs(end) > 100000:
-                        print(f"⚠️  Аномально большой конечный баланс {end} в отчете {report.id}, обнуляем")
+                        profit_log.warning("Аномально большой конечный баланс %s в отчете %s, обнуляем", end, report.id)
                         end = 0
                     
                     delta = end - start
@@ -85,7 +241,7 @@ def calculate_report_profit(session: Session, report) -> Dict[str, float]:
                     # print(f"🔍 Баланс аккаунта {acc.get('account_id', 'N/A')} на {platform}: {start} -> {end} (дельта: {delta})")
                     
                 except (ValueError, TypeError) as e:
-                    print(f"⚠️  Ошибка при парсинге баланса в отчете {report.id}: {e}")
+                    profit_log.warning("Ошибка при парсинге баланса в отчете %s: %s", report.id, e)
                     continue
     
     try:
@@ -137,7 +293,7 @@ def calculate_report_profit(session: Session, report) -> Dict[str, float]:
     
     # Проверяем на аномально большие значения прибыли
     if abs(profit) > 50000:
-        print(f"⚠️  Аномально большая прибыль {profit} в отчете {report.id}, обнуляем")
+        profit_log.warning("Аномально большая прибыль %s в отчете %s, обнуляем", profit, report.id)
         profit = 0.0
     
     # Рассчитываем суммы для учета в продажах и покупках
@@ -208,49 +364,27 @@ def calculate_report_profit(session: Session, report) -> Dict[str, float]:
         'purchases_adjustment': round(purchases_adjustment, 2)
     }
 
-def calculate_profit_from_orders(session: Session, report) -> Dict[str, float]:
+SPECIAL_ORDER_STATUSES = ('scam', 'appealed', 'dokidka', 'internal_transfer')
+PROFIT_BATCH_SIZE = 500
+
+def _empty_order_profit() -> Dict[str, float]:
+    return {
+        'profit': 0.0,
+        'project_profit': 0.0,
+        'salary_profit': 0.0,
+        'scam': 0.0,
+        'dokidka': 0.0,
+        'internal': 0.0,
+        'appeal': 0.0,
+        'sales_adjustment': 0.0,
+        'purchases_adjustment': 0.0
+    }
+
+def _profit_from_order_totals(report, total_buys_usdt: float, total_sales_usdt: float, special_totals: List) -> Dict[str, float]:
     """
-    Рассчитывает прибыль только на основе ордеров, без использования балансов аккаунтов.
-    Возвращает словарь с profit, project_profit, salary_profit.
+    Прибыль смены по агрегатам ордеров.
+    special_totals - список (status, count_in_sales, count_in_purchases, сумма quantity) специальных ордеров.
     """
-    from app import Order
-    
-    if not report.shift_start_time or not report.shift_end_time:
-        return {
-            'profit': 0.0,
-            'project_profit': 0.0,
-            'salary_profit': 0.0,
-            'scam': 0.0,
-            'dokidka': 0.0,
-            'internal': 0.0,
-            'appeal': 0.0,
-            'sales_adjustment': 0.0,
-            'purchases_adjustment': 0.0
-        }
-    
-    print(f"[DEBUG PROFIT] report.id={getattr(report, 'id', None)}, employee_id={getattr(report, 'employee_id', None)}, shift_start_time={getattr(report, 'shift_start_time', None)}, shift_end_time={getattr(report, 'shift_end_time', None)}")
-    print(f"[DEBUG PROFIT] scam_count_in_sales={getattr(report, 'scam_count_in_sales', None)}, scam_count_in_purchases={getattr(report, 'scam_count_in_purchases', None)}, dokidka_count_in_sales={getattr(report, 'dokidka_count_in_sales', None)}, dokidka_count_in_purchases={getattr(report, 'dokidka_count_in_purchases', None)}, internal_count_in_sales={getattr(report, 'internal_transfer_count_in_sales', None)}, internal_count_in_purchases={getattr(report, 'internal_transfer_count_in_purchases', None)}")
-    # Получаем все ордера за период смены для данного сотрудника
-    orders = session.query(Order).filter(
-        Order.employee_id == report.employee_id,
-        Order.executed_at >= report.shift_start_time,
-        Order.executed_at <= report.shift_end_time,
-        Order.status == 'filled'
-    ).all()
-    print(f"[DEBUG PROFIT] orders (filled): {len(orders)}")
-    # Получаем специальные ордера (скамы, докидки, внутренние переводы, аппеляции)
-    special_orders = session.query(Order).filter(
-        Order.employee_id == report.employee_id,
-        Order.executed_at >= report.shift_start_time,
-        Order.executed_at <= report.shift_end_time,
-        Order.status.in_(['scam', 'appealed', 'dokidka', 'internal_transfer'])
-    ).all()
-    print(f"[DEBUG PROFIT] special_orders: {len(special_orders)}")
-    
-    # Рассчитываем покупки и продажи
-    total_buys_usdt = sum(float(order.quantity) for order in orders if order.side == 'buy')
-    total_sales_usdt = sum(float(order.quantity) for order in orders if order.side == 'sell')
-    
     # Базовая прибыль = покупки - продажи
     profit = total_buys_usdt - total_sales_usdt
     
@@ -260,15 +394,14 @@ def calculate_profit_from_orders(session: Session, report) -> Dict[str, float]:
     internal = 0.0
     appeal = 0.0
     
-    for order in special_orders:
-        order_amount = float(order.quantity)
-        if order.status == 'scam':
+    for status, _, _, order_amount in special_totals:
+        if status == 'scam':
             scam += order_amount
-        elif order.status == 'appealed':
+        elif status == 'appealed':
             appeal += order_amount
-        elif order.status == 'dokidka':
+        elif status == 'dokidka':
             dokidka += order_amount
-        elif order.status == 'internal_transfer':
+        elif status == 'internal_transfer':
             internal += order_amount
     
     # Получаем флаги учета в продажах/покупках
@@ -306,17 +439,16 @@ def calculate_profit_from_orders(session: Session, report) -> Dict[str, float]:
         purchases_adjustment += appeal
     
     # Учитываем настройки ордеров
-    for order in special_orders:
-        order_amount = float(order.quantity)
-        if order.count_in_sales:
-            if order.status == 'scam':
+    for status, count_in_sales, count_in_purchases, order_amount in special_totals:
+        if count_in_sales:
+            if status == 'scam':
                 # Скам вычитаем из продаж
                 sales_adjustment -= order_amount
             else:
                 # Остальные добавляем к продажам
                 sales_adjustment += order_amount
-        if order.count_in_purchases:
-            if order.status == 'scam':
+        if count_in_purchases:
+            if status == 'scam':
                 # Скам вычитаем из покупок
                 purchases_adjustment -= order_amount
             else:
@@ -342,20 +474,192 @@ def calculate_profit_from_orders(session: Session, report) -> Dict[str, float]:
         'purchases_adjustment': round(purchases_adjustment, 2)
     }
 
+def calculate_profit_from_orders_batch(session: Session, reports: List) -> Dict[int, Dict[str, float]]:
+    """
+    calculate_profit_from_orders для списка отчетов: {report.id: прибыль}.
+    В рамках запроса каждый отчет считается один раз на версию снимка прибыли.
+    """
+    return _memoized_profits(
+        session, 'orders', reports,
+        lambda stale: _calculate_profit_from_orders_batch(session, stale)
+    )
+
+def _calculate_profit_from_orders_batch(session: Session, reports: List) -> Dict[int, Dict[str, float]]:
+    """
+    Прибыль по ордерам без запоминания.
+    Ордера соединяются с окнами смен в SQL (сотрудник + shift_start_time..shift_end_time)
+    и агрегируются одним GROUP BY по отчету, статусу, стороне и флагам учета -
+    по запросу на каждые PROFIT_BATCH_SIZE отчетов вместо двух запросов на отчет.
+    """
+    from app import Order
+    from sqlalchemy import and_, func
+    
+    result = {}
+    timed_reports = {}
+    for report in reports:
+        if report.shift_start_time and report.shift_end_time and report.id is not None:
+            timed_reports[report.id] = report
+        else:
+            result[report.id] = _empty_order_profit()
+    if not timed_reports:
+        return result
+    
+    report_model = type(next(iter(timed_reports.values())))
+    totals = {report_id: {'buy': 0.0, 'sell': 0.0, 'special': []} for report_id in timed_reports}
+    report_ids = list(timed_reports)
+    for i in range(0, len(report_ids), PROFIT_BATCH_SIZE):
+        chunk = report_ids[i:i + PROFIT_BATCH_SIZE]
+        rows = session.query(
+            report_model.id,
+            Order.status,
+            Order.side,
+            Order.count_in_sales,
+            Order.count_in_purchases,
+            func.sum(Order.quantity)
+        ).join(
+            Order,
+            and_(
+                Order.employee_id == report_model.employee_id,
+                Order.executed_at >= report_model.shift_start_time,
+                Order.executed_at <= report_model.shift_end_time
+            )
+        ).filter(
+            report_model.id.in_(chunk),
+            Order.status.in_(('filled',) + SPECIAL_ORDER_STATUSES)
+        ).group_by(
+            report_model.id,
+            Order.status,
+            Order.side,
+            Order.count_in_sales,
+            Order.count_in_purchases
+        ).all()
+        for report_id, status, side, count_in_sales, count_in_purchases, amount in rows:
+            amount = float(amount or 0)
+            report_totals = totals[report_id]
+            if status == 'filled':
+                if side in ('buy', 'sell'):
+                    report_totals[side] += amount
+            else:
+                report_totals['special'].append((status, count_in_sales, count_in_purchases, amount))
+    
+    for report_id, report in timed_reports.items():
+        report_totals = totals[report_id]
+        result[report_id] = _profit_from_order_totals(
+            report, report_totals['buy'], report_totals['sell'], report_totals['special']
+        )
+    profit_log.debug("Прибыль по ордерам рассчитана для %s отчетов", len(timed_reports))
+    return result
+
+def calculate_profit_from_orders(session: Session, report) -> Dict[str, float]:
+    """
+    Рассчитывает прибыль только на основе ордеров, без использования балансов аккаунтов.
+    Возвращает словарь с profit, project_profit, salary_profit.
+    Для нескольких отчетов используйте calculate_profit_from_orders_batch.
+    """
+    if not report.shift_start_time or not report.shift_end_time:
+        return _empty_order_profit()
+    
+    if profit_log.isEnabledFor(logging.DEBUG):
+        profit_log.debug("report.id=%s, employee_id=%s, shift_start_time=%s, shift_end_time=%s", getattr(report, 'id', None), getattr(report, 'employee_id', None), getattr(report, 'shift_start_time', None), getattr(report, 'shift_end_time', None))
+        profit_log.debug("scam_count_in_sales=%s, scam_count_in_purchases=%s, dokidka_count_in_sales=%s, dokidka_count_in_purchases=%s, internal_count_in_sales=%s, internal_count_in_purchases=%s", getattr(report, 'scam_count_in_sales', None), getattr(report, 'scam_count_in_purchases', None), getattr(report, 'dokidka_count_in_sales', None), getattr(report, 'dokidka_count_in_purchases', None), getattr(report, 'internal_transfer_count_in_sales', None), getattr(report, 'internal_transfer_count_in_purchases', None))
+    return calculate_profit_from_orders_batch(session, [report])[report.id]
+
+def _snapshot_profits(session: Session, reports: List, field: str, compute) -> Dict[int, Dict[str, float]]:
+    """
+    Прибыль отчетов из shift_profit_snapshot.<field>: {report.id: прибыль}.
+    Отсутствующие и сброшенные значения считаются compute(reports, versions) и сохраняются
+    в отдельной транзакции условным UPDATE по version: если за время расчета
+    снимок успели сбросить, устаревшее значение не записывается.
+    """
+    from app import ShiftProfitSnapshot
+    from datetime import datetime
+    from sqlalchemy.exc import IntegrityError
+    
+    result = {}
+    stale = {}
+    versions = {}
+    report_ids = [r.id for r in reports if r.id is not None]
+    column = getattr(ShiftProfitSnapshot, field)
+    for i in range(0, len(report_ids), PROFIT_BATCH_SIZE):
+        chunk = report_ids[i:i + PROFIT_BATCH_SIZE]
+        for report_id, value, version in session.query(
+            ShiftProfitSnapshot.shift_report_id, column, ShiftProfitSnapshot.version
+        ).filter(ShiftProfitSnapshot.shift_report_id.in_(chunk)):
+            versions[report_id] = version
+            if value:
+                result[report_id] = json.loads(value)
+    for report in reports:
+        if report.id not in result:
+            stale[report.id] = report
+    if not stale:
+        return result
+    
+    computed = compute(list(stale.values()), versions)
+    result.update(computed)
+    table = ShiftProfitSnapshot.__table__
+    now = datetime.utcnow()
+    engine = session.get_bind()
+    with engine.begin() as connection:
+        for report_id, profit in computed.items():
+            if report_id in versions:
+                connection.execute(table.update().where(
+                    table.c.shift_report_id == report_id,
+                    table.c.version == versions[report_id]
+                ).values({field: json.dumps(profit), 'computed_at': now}))
+    # Отчеты без строки снимка (например, созданные до появления таблицы) - создаем строку
+    for report_id, profit in computed.items():
+        if report_id is None or report_id in versions:
+            continue
+        try:
+            with engine.begin() as connection:
+                connection.execute(table.insert().values(
+                    {'shift_report_id': report_id, field: json.dumps(profit), 'version': 0, 'computed_at': now}
+                ))
+        except IntegrityError:
+            # Строку уже создал параллельный запрос
+            pass
+    profit_log.debug("Снимки прибыли (%s) пересчитаны для %s отчетов", field, len(computed))
+    return result
+
+def get_order_profits(session: Session, reports: List) -> Dict[int, Dict[str, float]]:
+    """calculate_profit_from_orders для отчетов из снимков прибыли: {report.id: прибыль}"""
+    return _snapshot_profits(
+        session, reports, 'order_profit_json',
+        lambda stale, versions: _memoized_profits(
+            session, 'orders', stale, lambda rs: _calculate_profit_from_orders_batch(session, rs), versions
+        )
+    )
+
+def get_report_profits(session: Session, reports: List) -> Dict[int, Dict[str, float]]:
+    """calculate_report_profit для отчетов из снимков прибыли: {report.id: прибыль}"""
+    return _snapshot_profits(
+        session, reports, 'report_profit_json',
+        lambda stale, versions: _memoized_profits(
+            session, 'report', stale, lambda rs: {r.id: _calculate_report_profit(session, r) for r in rs}, versions
+        )
+    )
+
 def calculate_account_last_balance(session: Session, account_id: int, platform: str, reports: List) -> float:
     """
     Возвращает последний баланс аккаунта за период (или начальный баланс).
+    Ищет индексным запросом по shift_report_balance среди отчетов reports.
     """
-    from app import InitialBalance, Account
-    for r in sorted(reports, key=lambda x: (x.shift_date, 0 if x.shift_type=='morning' else 1), reverse=True):
-        try:
-            b = json.loads(r.balances_json or '{}')
-        except:
-            b = {}
-        if b.get(platform):
-            found = next((a for a in b[platform] if (a.get('account_id') or a.get('id')) == account_id), None)
-            if found and found.get('balance') not in (None, ''):
-                return float(found['balance'])
+    from app import InitialBalance, Account, ShiftReportBalance
+    from sqlalchemy import case
+    report_ids = [r.id for r in reports if r.id is not None]
+    if report_ids:
+        found = session.query(ShiftReportBalance.balance).filter(
+            ShiftReportBalance.account_id == account_id,
+            ShiftReportBalance.platform == platform,
+            ShiftReportBalance.shift_report_id.in_(report_ids),
+            ShiftReportBalance.balance.isnot(None)
+        ).order_by(
+            ShiftReportBalance.shift_date.desc(),
+            case((ShiftReportBalance.shift_type == 'morning', 0), else_=1).desc(),
+            ShiftReportBalance.shift_report_id
+        ).first()
+        if found:
+            return float(found.balance)
     # Если нет ни одного отчёта — берём начальный баланс
     ib = session.query(InitialBalance).filter_by(platform=platform).all()
     acc_obj = session.query(Account).filter_by(id=account_id).first()
@@ -526,10 +830,10 @@ def calculate_salary_based_on_daily_profit(employee_id: int, start_date: str, en
             return {'error': 'Сотрудник не найден'}
         
         # Рассчитываем общую прибыль за период
+        report_profits = get_report_profits(db_session, reports)
         total_profit = 0.0
         for report in reports:
-            profit_data = calculate_report_profit(db_session, report)
-            total_profit += profit_data['salary_profit']
+            total_profit += report_profits[report.id]['salary_profit']
         
         # Рассчитываем количество дней работы
         work_days = len(set(r.shift_date for r in reports))
@@ -565,5 +869,5 @@ def calculate_salary_based_on_daily_profit(employee_id: int, start_date: str, en
         }
         
     except Exception as e:
-        print(f"Ошибка при расчете зарплаты: {e}")
+        profit_log.error("Ошибка при расчете зарплаты: %s", e)
         return {'error': str(e)} 
\ No newline at end of file